@@ -0,0 +1,32 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0002_upload_sessions"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "upload_sessions",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("filename", sa.Text(), nullable=False),
+        sa.Column("total_size", sa.BigInteger(), nullable=False),
+        sa.Column("offset", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("received", postgresql.JSONB(), nullable=True),
+        sa.Column("status", sa.Text(), nullable=False, server_default="open"),
+        sa.Column("temp_path", sa.Text(), nullable=False),
+        sa.Column("video_id", sa.Integer(), sa.ForeignKey("videos.id"), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()")),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()")),
+    )
+    op.create_index("idx_upload_sessions_user_id", "upload_sessions", ["user_id"])
+    op.create_index("idx_upload_sessions_expires_at", "upload_sessions", ["expires_at"])
+
+def downgrade():
+    op.drop_index("idx_upload_sessions_expires_at", table_name="upload_sessions")
+    op.drop_index("idx_upload_sessions_user_id", table_name="upload_sessions")
+    op.drop_table("upload_sessions")
@@ -0,0 +1,40 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_media_blobs"
+down_revision = "0002_upload_sessions"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "media_blobs",
+        sa.Column("sha256", sa.String(64), primary_key=True),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("path", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()")),
+    )
+
+    op.create_table(
+        "user_media",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("sha256", sa.String(64), sa.ForeignKey("media_blobs.sha256"), nullable=False),
+        sa.Column("video_id", sa.Integer(), sa.ForeignKey("videos.id"), nullable=True),
+        sa.Column("original_filename", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()")),
+    )
+
+    op.add_column("videos", sa.Column("content_hash", sa.String(64), nullable=True))
+
+    op.create_index("idx_user_media_user_id", "user_media", ["user_id"])
+    op.create_index("idx_user_media_sha256", "user_media", ["sha256"])
+    op.create_index("ix_videos_content_hash", "videos", ["content_hash"])
+
+def downgrade():
+    op.drop_index("ix_videos_content_hash", table_name="videos")
+    op.drop_index("idx_user_media_sha256", table_name="user_media")
+    op.drop_index("idx_user_media_user_id", table_name="user_media")
+    op.drop_column("videos", "content_hash")
+    op.drop_table("user_media")
+    op.drop_table("media_blobs")
@@ -0,0 +1,14 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_ingest_file_size_bigint"
+down_revision = "0003_media_blobs"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # ingested videos are routinely > 2 GiB
+    op.alter_column("video_ingest_requests", "source_file_size", type_=sa.BigInteger(), existing_nullable=True)
+
+def downgrade():
+    op.alter_column("video_ingest_requests", "source_file_size", type_=sa.Integer(), existing_nullable=True)
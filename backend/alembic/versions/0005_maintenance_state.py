@@ -0,0 +1,19 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0005_maintenance_state"
+down_revision = "0004_ingest_file_size_bigint"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "maintenance_state",
+        sa.Column("name", sa.Text(), primary_key=True),
+        sa.Column("state", postgresql.JSONB(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()")),
+    )
+
+def downgrade():
+    op.drop_table("maintenance_state")
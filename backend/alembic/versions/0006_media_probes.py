@@ -0,0 +1,21 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0006_media_probes"
+down_revision = "0005_maintenance_state"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("videos", sa.Column("media_info", postgresql.JSONB(), nullable=True))
+    op.create_table(
+        "media_probes",
+        sa.Column("content_hash", sa.String(64), primary_key=True),
+        sa.Column("info", postgresql.JSONB(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()")),
+    )
+
+def downgrade():
+    op.drop_table("media_probes")
+    op.drop_column("videos", "media_info")
@@ -0,0 +1,21 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0007_media_derivatives"
+down_revision = "0006_media_probes"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "media_derivatives",
+        sa.Column("content_hash", sa.String(64), primary_key=True),
+        sa.Column("kind", sa.Text(), primary_key=True),
+        sa.Column("path", sa.Text(), nullable=False),
+        sa.Column("info", postgresql.JSONB(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()")),
+    )
+
+def downgrade():
+    op.drop_table("media_derivatives")
@@ -0,0 +1,14 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0008_video_renditions"
+down_revision = "0007_media_derivatives"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("videos", sa.Column("renditions", postgresql.JSONB(), nullable=True))
+
+def downgrade():
+    op.drop_column("videos", "renditions")
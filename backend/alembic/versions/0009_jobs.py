@@ -0,0 +1,38 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0009_jobs"
+down_revision = "0008_video_renditions"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.Text(), nullable=False),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("video_id", sa.Integer(), sa.ForeignKey("videos.id"), nullable=True),
+        sa.Column("payload", postgresql.JSONB(), nullable=True),
+        sa.Column("status", sa.Text(), nullable=False, server_default="queued"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_attempts", sa.Integer(), nullable=False, server_default="5"),
+        sa.Column("run_after", sa.DateTime(), nullable=False, server_default=sa.text("now()")),
+        sa.Column("locked_by", sa.Text(), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("result", postgresql.JSONB(), nullable=True),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()")),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()")),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+    )
+    # claim scans: queued jobs that are due, and running jobs whose lease ran out
+    op.create_index("idx_jobs_claim", "jobs", ["status", "run_after"])
+    op.create_index("idx_jobs_video_id", "jobs", ["video_id"])
+
+def downgrade():
+    op.drop_index("idx_jobs_video_id", table_name="jobs")
+    op.drop_index("idx_jobs_claim", table_name="jobs")
+    op.drop_table("jobs")
@@ -0,0 +1,30 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010_transcription_cache"
+down_revision = "0009_jobs"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "transcription_cache",
+        sa.Column("audio_hash", sa.String(64), primary_key=True),
+        sa.Column("language", sa.Text(), primary_key=True),
+        sa.Column("transcriber_version", sa.Text(), primary_key=True),
+        sa.Column("text", sa.Text(), nullable=True),
+        sa.Column("srt", sa.Text(), nullable=True),
+        sa.Column("hits", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()")),
+        sa.Column("last_hit_at", sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        "metric_counters",
+        sa.Column("name", sa.Text(), primary_key=True),
+        sa.Column("value", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()")),
+    )
+
+def downgrade():
+    op.drop_table("metric_counters")
+    op.drop_table("transcription_cache")
@@ -0,0 +1,50 @@
+"""Rewrite videos.captions into the versioned cue document (services/captions.py)."""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services import captions
+
+revision = "0011_captions_v2"
+down_revision = "0010_transcription_cache"
+branch_labels = None
+depends_on = None
+
+BATCH = 500
+
+def _rewrite(convert):
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(
+                "SELECT id, captions, language FROM videos "
+                "WHERE id > :last AND captions IS NOT NULL ORDER BY id LIMIT :n"
+            ),
+            {"last": last_id, "n": BATCH},
+        ).fetchall()
+        if not rows:
+            return
+        for vid, raw, language in rows:
+            doc = convert(raw, language)
+            if doc != raw:
+                conn.execute(
+                    sa.text("UPDATE videos SET captions = CAST(:doc AS jsonb) WHERE id = :id"),
+                    {"doc": json.dumps(doc) if doc is not None else None, "id": vid},
+                )
+        last_id = rows[-1][0]
+
+def upgrade():
+    _rewrite(captions.normalize)
+
+def _to_legacy(doc, language):
+    if not isinstance(doc, dict) or doc.get("version") != captions.SCHEMA_VERSION:
+        return doc
+    return {
+        c["language"]: {"format": c["format"], "content": c["content"], "url": c["url"]}
+        for c in captions.export_list(doc)
+    }
+
+def downgrade():
+    _rewrite(_to_legacy)
@@ -0,0 +1,79 @@
+"""Move captions from the videos.captions document into one video_captions row per language."""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.services import captions
+
+revision = "0012_video_captions"
+down_revision = "0011_captions_v2"
+branch_labels = None
+depends_on = None
+
+BATCH = 500
+
+def _batches(conn, sql):
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.text(sql), {"last": last_id, "n": BATCH}).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+def upgrade():
+    op.create_table(
+        "video_captions",
+        sa.Column("video_id", sa.Integer(), sa.ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("language", sa.Text(), primary_key=True),
+        sa.Column("format", sa.Text(), nullable=False, server_default="srt"),
+        sa.Column("cues", postgresql.JSONB(), nullable=True),
+        sa.Column("content", sa.Text(), nullable=True),
+        sa.Column("url", sa.Text(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()")),
+    )
+    conn = op.get_bind()
+    insert = sa.text(
+        "INSERT INTO video_captions (video_id, language, format, cues, content, url) "
+        "VALUES (:video_id, :language, :format, CAST(:cues AS jsonb), :content, :url)"
+    )
+    for rows in _batches(
+        conn,
+        "SELECT id, captions, language FROM videos WHERE id > :last AND captions IS NOT NULL ORDER BY id LIMIT :n",
+    ):
+        for vid, raw, language in rows:
+            doc = captions.normalize(raw, language)
+            for lang, track in ((doc or {}).get("tracks") or {}).items():
+                conn.execute(insert, {
+                    "video_id": vid,
+                    "language": lang,
+                    "format": "srt" if track.get("cues") else track.get("format") or "text",
+                    "cues": json.dumps(track["cues"]) if track.get("cues") else None,
+                    "content": track.get("text"),
+                    "url": track.get("url"),
+                })
+    op.drop_column("videos", "captions")
+
+def downgrade():
+    op.add_column("videos", sa.Column("captions", postgresql.JSONB(), nullable=True))
+    conn = op.get_bind()
+    for rows in _batches(
+        conn,
+        "SELECT DISTINCT video_id FROM video_captions WHERE video_id > :last ORDER BY video_id LIMIT :n",
+    ):
+        for (vid,) in rows:
+            tracks = {}
+            for lang, fmt, cues, content, url in conn.execute(
+                sa.text("SELECT language, format, cues, content, url FROM video_captions WHERE video_id = :id"),
+                {"id": vid},
+            ):
+                track = {"format": fmt, "cues": cues} if cues else {"format": fmt, "text": content}
+                if url:
+                    track["url"] = url
+                tracks[lang] = track
+            language = conn.execute(sa.text("SELECT language FROM videos WHERE id = :id"), {"id": vid}).scalar()
+            doc = {"version": captions.SCHEMA_VERSION, "primary": language if language in tracks else next(iter(tracks)), "tracks": tracks}
+            conn.execute(sa.text("UPDATE videos SET captions = CAST(:doc AS jsonb) WHERE id = :id"), {"doc": json.dumps(doc), "id": vid})
+    op.drop_table("video_captions")
@@ -0,0 +1,14 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0013_job_progress"
+down_revision = "0012_video_captions"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("jobs", sa.Column("progress", postgresql.JSONB(), nullable=True))
+
+def downgrade():
+    op.drop_column("jobs", "progress")
@@ -0,0 +1,25 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0014_translation_memory"
+down_revision = "0013_job_progress"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "translation_memory",
+        sa.Column("scope", sa.Text(), primary_key=True, server_default=""),
+        sa.Column("source_hash", sa.String(64), primary_key=True),
+        sa.Column("source_lang", sa.Text(), primary_key=True),
+        sa.Column("target_lang", sa.Text(), primary_key=True),
+        sa.Column("model", sa.Text(), primary_key=True),
+        sa.Column("source_text", sa.Text(), nullable=False),
+        sa.Column("target_text", sa.Text(), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()")),
+        sa.Column("last_hit_at", sa.DateTime(), nullable=True),
+    )
+
+def downgrade():
+    op.drop_table("translation_memory")
@@ -0,0 +1,23 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0015_llm_responses"
+down_revision = "0014_translation_memory"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "llm_responses",
+        sa.Column("key", sa.String(64), primary_key=True),
+        sa.Column("model", sa.Text(), nullable=False),
+        sa.Column("response", sa.Text(), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()")),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_llm_responses_expires_at", "llm_responses", ["expires_at"])
+
+def downgrade():
+    op.drop_index("ix_llm_responses_expires_at", table_name="llm_responses")
+    op.drop_table("llm_responses")
@@ -0,0 +1,20 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0016_retired_blob_objects"
+down_revision = "0015_llm_responses"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("media_blobs", sa.Column("stored_sha256", sa.String(64), nullable=True))
+    op.create_table(
+        "retired_blob_objects",
+        sa.Column("path", sa.Text(), primary_key=True),
+        sa.Column("sha256", sa.String(64), nullable=False),
+        sa.Column("retired_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table("retired_blob_objects")
+    op.drop_column("media_blobs", "stored_sha256")
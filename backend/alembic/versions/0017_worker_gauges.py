@@ -0,0 +1,19 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "0017_worker_gauges"
+down_revision = "0016_retired_blob_objects"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "worker_gauges",
+        sa.Column("worker_id", sa.Text(), primary_key=True),
+        sa.Column("gauges", JSONB(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table("worker_gauges")
@@ -1,49 +1,23 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List
 
+from app.config import settings
 from app.db import SessionLocal
 from app.security import require_user_id
 from app.models import Video
-from app.services.openrouter import chat_json
+from app.services import caption_store, captions
+from app.services.openrouter import cached_response, chat_json, evict
+from app.services.translation import SUPPORTED_LANGUAGES, translate_track
+from app.services.translation_memory import TRANSLATION_MEMORY_SCOPES
+from app.services.jobs import PermanentJobError, enqueue, job_handler, report_progress
 import json
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
-# Supported languages for caption translation
-SUPPORTED_LANGUAGES = {
-    "en": "English",
-    "es": "Spanish",
-    "fr": "French",
-    "de": "German",
-    "it": "Italian",
-    "pt": "Portuguese",
-    "nl": "Dutch",
-    "pl": "Polish",
-    "ru": "Russian",
-    "ja": "Japanese",
-    "ko": "Korean",
-    "zh": "Chinese (Simplified)",
-    "zh-TW": "Chinese (Traditional)",
-    "ar": "Arabic",
-    "hi": "Hindi",
-    "th": "Thai",
-    "vi": "Vietnamese",
-    "id": "Indonesian",
-    "ms": "Malay",
-    "tl": "Filipino/Tagalog",
-    "tr": "Turkish",
-    "sv": "Swedish",
-    "da": "Danish",
-    "no": "Norwegian",
-    "fi": "Finnish",
-    "el": "Greek",
-    "he": "Hebrew",
-    "cs": "Czech",
-    "ro": "Romanian",
-    "hu": "Hungarian",
-}
-
 def db_dep():
     db = SessionLocal()
     try:
@@ -63,14 +37,14 @@ USER_TMPL = """Using the transcript/captions below, generate:
 - hashtags (space-separated, include 3-8)
 - thumbnail_prompt (short, descriptive, no copyrighted characters)
 Return JSON:
-{
+{{
  "ai_summary": "...",
  "title": "...",
  "description": "...",
  "tags": "...",
  "hashtags": "...",
  "thumbnail_prompt": "..."
-}
+}}
 INPUT:
 {content}
 """
@@ -81,24 +55,45 @@ def _extract_json(raw: str) -> dict:
         raise ValueError("Model did not return JSON")
     return json.loads(raw[s:e+1])
 
-@router.post("/metadata/generate")
-async def generate_metadata(payload: dict, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+@router.post("/metadata/generate", status_code=202)
+def generate_metadata(payload: dict, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    """
+    Queue metadata generation (job kind "metadata"); poll GET /jobs/{job_id} for the result.
+    When the transcript has not changed since the last run, the cached answer
+    is applied at once and returned with 200 and cached=true, unless
+    "regenerate": true asks for a new one.
+    """
     video_id = payload.get("video_id")
     if not video_id:
         raise HTTPException(400, "video_id required")
+    regenerate = bool(payload.get("regenerate"))
 
     v = db.query(Video).filter(Video.id == int(video_id), Video.user_id == user_id).first()
     if not v:
         raise HTTPException(404, "Video not found")
-
-    content = None
-    if isinstance(v.captions, dict):
-        content = v.captions.get("srt") or v.captions.get("text")
-    content = content or v.transcript
+    content = _metadata_input(db, v)
     if not content:
         raise HTTPException(400, "No captions/transcript available. Run caption first.")
 
-    res = await chat_json(SYSTEM, USER_TMPL.format(content=content[:20000]))
+    prompt = _metadata_prompt(content)
+    cached = None if regenerate else cached_response(SYSTEM, prompt)
+    if cached:
+        try:
+            return JSONResponse(apply_metadata(db, v, cached))
+        except ValueError:
+            evict(SYSTEM, prompt)  # unusable cached answer: drop it and ask the model again
+
+    job = enqueue(db, "metadata", {"regenerate": regenerate}, user_id=user_id, video_id=v.id)
+    return {"job_id": job.id, "status": job.status, "video_id": v.id}
+
+def _metadata_input(db: Session, v: Video):
+    return captions.track_content(caption_store.get_track(db, v)) or v.transcript
+
+def _metadata_prompt(content: str) -> str:
+    return USER_TMPL.format(content=content[:20000])
+
+def apply_metadata(db: Session, v: Video, res: dict) -> dict:
+    """Save a model answer {"raw", "model"} onto the video; the metadata response."""
     obj = _extract_json(res["raw"])
 
     v.ai_summary = obj.get("ai_summary") or v.ai_summary
@@ -120,30 +115,31 @@ async def generate_metadata(payload: dict, user_id: str = Depends(require_user_i
         "hashtags": v.hashtags,
         "thumbnail_prompt": v.thumbnail_prompt,
         "model_used": res.get("model"),
+        "cached": bool(res.get("cached")),
     }
 
+@job_handler("metadata")
+async def run_metadata(db: Session, job) -> dict:
+    v = db.query(Video).filter(Video.id == job.video_id).first()
+    if not v:
+        raise PermanentJobError("Video not found")
+    content = _metadata_input(db, v)
+    if not content:
+        raise PermanentJobError("No captions/transcript available. Run caption first.")
+
+    regenerate = bool((job.payload or {}).get("regenerate"))
+    prompt = _metadata_prompt(content)
+    res = await chat_json(SYSTEM, prompt, cache=True, refresh=regenerate, validate=_extract_json)
+    try:
+        return apply_metadata(db, v, res)
+    except ValueError:
+        await run_in_threadpool(evict, SYSTEM, prompt)
+        raise
+
 # ============================================
 # CAPTION TRANSLATION
 # ============================================
 
-TRANSLATE_SYSTEM = """You are a professional translator specializing in video subtitles/captions.
-Translate the following SRT captions accurately while preserving:
-- All timing codes exactly as given
-- The structure and line breaks
-- Natural, conversational language
-- Cultural context where appropriate
-Return ONLY the translated SRT content, no explanations.
-"""
-
-TRANSLATE_PROMPT = """Translate the following SRT captions from {source_lang} to {target_lang}.
-Keep all timing codes (like "00:00:01,000 --> 00:00:05,000") exactly the same.
-Only translate the text content between timing codes.
-
-SRT CONTENT:
-{content}
-
-TRANSLATED SRT:"""
-
 @router.get("/caption-languages")
 def get_supported_languages():
     """Return list of supported languages for caption translation."""
@@ -154,30 +150,42 @@ def get_supported_languages():
         ]
     }
 
-@router.post("/captions/translate")
-async def translate_captions(
+@router.post("/captions/translate", status_code=202)
+def translate_captions(
     payload: dict,
     user_id: str = Depends(require_user_id),
     db: Session = Depends(db_dep)
 ):
     """
-    Translate captions to multiple languages using AI.
+    Translate captions to multiple languages using AI (job kind "translate").
 
     Payload:
     {
         "video_id": 123,
         "target_languages": ["es", "fr", "de"],  // list of language codes
-        "source_language": "en"  // optional, defaults to "en"
+        "source_language": "en",  // optional, defaults to "en"
+        "translation_memory": "global",  // optional: global | user | off (default TRANSLATION_MEMORY_SCOPE)
+        "retranslate": false  // optional: ignore the memory and replace its lines with the new answers
     }
 
-    Returns:
+    Cue lines already translated before (by anyone, or by this user with
+    "user") come from the translation memory; only the rest go to the model.
+
+    Returns 202 with job_id. Languages are translated concurrently, as
+    batches of cue text on the original timings, and each is saved as soon
+    as it is done; GET /jobs/{job_id} shows per-language
+    progress ({"es": {"status": "done"}, "fr": {"status": "running"}, ...}).
+    The final result:
     {
         "ok": true,
         "translations": {
-            "es": {"language": "Spanish", "captions": "..."},
-            "fr": {"language": "French", "captions": "..."},
+            "es": {"language": "Spanish", "status": "done"},
+            "fr": {"language": "French", "status": "failed", "error": "..."},
             ...
         },
+        "languages_added": ["es"],
+        "failed": ["fr"],
+        "total_languages": 2,
         "model_used": "..."
     }
     """
@@ -198,79 +206,86 @@ async def translate_captions(
     v = db.query(Video).filter(Video.id == int(video_id), Video.user_id == user_id).first()
     if not v:
         raise HTTPException(404, "Video not found")
-
-    # Get source captions
-    source_captions = None
-    if isinstance(v.captions, dict):
-        # Multi-language format - try to get source language
-        if source_language in v.captions:
-            cap_data = v.captions[source_language]
-            source_captions = cap_data.get("content") or cap_data.get("srt") or cap_data.get("text")
-        elif "en" in v.captions:
-            cap_data = v.captions["en"]
-            source_captions = cap_data.get("content") or cap_data.get("srt") or cap_data.get("text")
-        else:
-            # Try legacy format
-            source_captions = v.captions.get("srt") or v.captions.get("text") or v.captions.get("content")
-    elif isinstance(v.captions, str):
-        source_captions = v.captions
-
-    if not source_captions:
+    if not _translation_source(db, v, source_language):
         raise HTTPException(400, "No captions available to translate. Run caption generation first.")
 
-    source_lang_name = SUPPORTED_LANGUAGES.get(source_language, "English")
-    translations = {}
-    model_used = None
-
-    # Translate to each target language
-    for lang_code in target_languages:
-        if lang_code == source_language:
-            continue  # Skip translating to same language
-
-        target_lang_name = SUPPORTED_LANGUAGES[lang_code]
-
-        prompt = TRANSLATE_PROMPT.format(
-            source_lang=source_lang_name,
-            target_lang=target_lang_name,
-            content=source_captions[:30000]  # Limit content size
-        )
-
-        res = await chat_json(TRANSLATE_SYSTEM, prompt)
-        model_used = res.get("model")
-
-        translated_text = res.get("raw", "").strip()
-
-        translations[lang_code] = {
-            "language": target_lang_name,
-            "captions": translated_text
-        }
+    memory_scope = payload.get("translation_memory") or settings.TRANSLATION_MEMORY_SCOPE
+    if memory_scope not in TRANSLATION_MEMORY_SCOPES:
+        raise HTTPException(400, f"translation_memory must be one of {list(TRANSLATION_MEMORY_SCOPES)}")
 
-    # Update video captions with translations
-    existing_captions = v.captions if isinstance(v.captions, dict) else {}
-
-    # Handle legacy format conversion
-    if isinstance(v.captions, str) or (isinstance(v.captions, dict) and ("srt" in v.captions or "text" in v.captions)):
-        if isinstance(v.captions, str):
-            existing_captions = {source_language: {"format": "srt", "content": v.captions}}
+    targets = list(dict.fromkeys(l for l in target_languages if l != source_language))  # Skip translating to same language
+    job = enqueue(
+        db, "translate",
+        {
+            "source_language": source_language, "target_languages": targets, "translation_memory": memory_scope,
+            "retranslate": bool(payload.get("retranslate")),
+        },
+        user_id=user_id, video_id=v.id,
+    )
+    return {"job_id": job.id, "status": job.status, "video_id": v.id}
+
+def _translation_source(db: Session, v: Video, source_language: str):
+    track = (
+        caption_store.get_track(db, v, source_language)
+        or caption_store.get_track(db, v, "en")
+        or caption_store.get_track(db, v)
+    )
+    return track if captions.track_content(track) else None
+
+@job_handler("translate", max_attempts=3)
+async def run_translate(db: Session, job) -> dict:
+    """
+    Translate all languages concurrently (cue batches, bounded by
+    services/translation.py) and save each language when it finishes. A retry only redoes the
+    languages that have not succeeded; after the last attempt whatever
+    succeeded is kept and the rest reported as failed.
+    """
+    v = db.query(Video).filter(Video.id == job.video_id).first()
+    if not v:
+        raise PermanentJobError("Video not found")
+    payload = job.payload or {}
+    source_language = payload.get("source_language") or "en"
+    source_track = _translation_source(db, v, source_language)
+    if not source_track:
+        raise PermanentJobError("No captions available to translate. Run caption generation first.")
+    memory_scope = payload.get("translation_memory") or settings.TRANSLATION_MEMORY_SCOPE
+    retranslate = bool(payload.get("retranslate"))
+
+    progress = dict(job.progress or {})
+    todo = [l for l in payload.get("target_languages") or [] if (progress.get(l) or {}).get("status") != "done"]
+    for lang_code in todo:
+        progress[lang_code] = {"status": "pending"}
+    await run_in_threadpool(report_progress, job.id, dict(progress))
+
+    async def one(lang_code: str) -> None:
+        progress[lang_code] = {"status": "running"}
+        try:
+            track, model = await translate_track(
+                source_track, source_language, lang_code, job.user_id, memory_scope, retranslate,
+            )
+        except Exception as e:
+            progress[lang_code] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
         else:
-            legacy_content = v.captions.get("srt") or v.captions.get("text") or v.captions.get("content")
-            existing_captions = {source_language: {"format": "srt", "content": legacy_content}}
+            caption_store.put_track(db, v.id, lang_code, track)
+            db.commit()
+            progress[lang_code] = {"status": "done", "model": model}
+        await run_in_threadpool(report_progress, job.id, dict(progress))
 
-    # Add translations
-    for lang_code, trans_data in translations.items():
-        existing_captions[lang_code] = {
-            "format": "srt",
-            "content": trans_data["captions"]
-        }
+    await asyncio.gather(*(one(l) for l in todo))
 
-    v.captions = existing_captions
-    db.add(v)
-    db.commit()
+    failed = [l for l in payload.get("target_languages") or [] if progress[l]["status"] != "done"]
+    if failed and job.attempts < job.max_attempts:
+        raise RuntimeError(f"Translation failed for {', '.join(failed)}")
 
+    done = [l for l in payload.get("target_languages") or [] if progress[l]["status"] == "done"]
     return {
-        "ok": True,
-        "translations": translations,
-        "languages_added": list(translations.keys()),
-        "total_languages": len(existing_captions),
-        "model_used": model_used
+        "ok": not failed,
+        "translations": {
+            l: {"language": SUPPORTED_LANGUAGES[l], **{k: val for k, val in progress[l].items() if k != "model"}}
+            for l in payload.get("target_languages") or []
+        },
+        "languages_added": done,
+        "failed": failed,
+        "total_languages": len(caption_store.languages(db, v.id)),
+        "model_used": next((progress[l].get("model") for l in done if progress[l].get("model")), None),
     }
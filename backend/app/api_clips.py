@@ -0,0 +1,135 @@
+"""
+Trimming and clipping. Every cut becomes a new child Video (parent_video_id)
+rendered by a "clips" job (one per request, run by `python -m app.worker`);
+its status goes queued -> processing -> ready (or error).
+
+  POST /video/{id}/trim   {"trim_start_ms": 20000, "trim_end_ms": null}
+                          (defaults to the trim stored on the video)
+  POST /video/{id}/clips  {"clips": [{"start_ms": 0, "end_ms": 30000, "title": "..."}, ...]}
+  GET  /video/{id}/clips  -> every clip of the video with its status
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.security import require_user_id
+from app.models import Video
+from app.api_videos import serialize, serialize_many
+from app.services.clips import create_clip, fail_pending, render_clips
+from app.services.jobs import enqueue, job_handler
+
+MAX_CLIPS_PER_BATCH = 100
+
+router = APIRouter(prefix="/video", tags=["clips"])
+
+def db_dep():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_source_video(db: Session, video_id: int, user_id: str) -> Video:
+    v = db.query(Video).filter(Video.id == video_id, Video.user_id == user_id).first()
+    if not v:
+        raise HTTPException(404, "Video not found")
+    if not v.content_hash:
+        raise HTTPException(409, "Video is not stored yet")
+    return v
+
+def check_range(v: Video, start_ms, end_ms) -> tuple[int, Optional[int]]:
+    if not isinstance(start_ms, int) or start_ms < 0:
+        raise HTTPException(400, "start must be a non-negative integer (ms)")
+    if end_ms is not None and (not isinstance(end_ms, int) or end_ms <= start_ms):
+        raise HTTPException(400, "end must be an integer (ms) after start")
+    if v.duration_ms:
+        if start_ms >= v.duration_ms:
+            raise HTTPException(400, "start is past the end of the video")
+        if end_ms is not None and end_ms >= v.duration_ms:
+            end_ms = None
+    return start_ms, end_ms
+
+@router.post("/{video_id}/trim")
+def trim_video(
+    video_id: int,
+    payload: dict,
+    user_id: str = Depends(require_user_id),
+    db: Session = Depends(db_dep)
+):
+    v = get_source_video(db, video_id, user_id)
+    start_ms = payload.get("trim_start_ms", v.trim_start_ms) or 0
+    end_ms = payload.get("trim_end_ms", v.trim_end_ms)
+    v.trim_start_ms, v.trim_end_ms = start_ms, end_ms
+    start_ms, end_ms = check_range(v, start_ms, end_ms)
+    if start_ms == 0 and end_ms is None:
+        raise HTTPException(400, "Nothing to trim")
+
+    child = create_clip(db, v, start_ms, end_ms)
+    db.add(v)
+    db.commit()
+    db.refresh(child)
+
+    job = enqueue(db, "clips", {"clips": [[child.id, start_ms, end_ms]]}, user_id=user_id, video_id=v.id)
+    return {**serialize(child), "job_id": job.id}
+
+@router.post("/{video_id}/clips")
+def create_clips(
+    video_id: int,
+    payload: dict,
+    user_id: str = Depends(require_user_id),
+    db: Session = Depends(db_dep)
+):
+    """Cut several clips from one video; they are planned and rendered together."""
+    v = get_source_video(db, video_id, user_id)
+    items = payload.get("clips")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(400, "clips required (list of {start_ms, end_ms})")
+    if len(items) > MAX_CLIPS_PER_BATCH:
+        raise HTTPException(400, f"At most {MAX_CLIPS_PER_BATCH} clips per request")
+
+    ranges = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise HTTPException(400, "Each clip must be an object")
+        ranges.append(check_range(v, item.get("start_ms"), item.get("end_ms")))
+
+    # all children in one transaction
+    children = []
+    for item, (start_ms, end_ms) in zip(items, ranges):
+        child = create_clip(db, v, start_ms, end_ms)
+        child.title = item.get("title")
+        children.append(child)
+    db.commit()
+    for child in children:
+        db.refresh(child)
+
+    job = enqueue(
+        db, "clips", {"clips": [[c.id, s, e] for c, (s, e) in zip(children, ranges)]}, user_id=user_id, video_id=v.id,
+    )
+    return {"parent_video_id": v.id, "job_id": job.id, "clips": [serialize(c) for c in children]}
+
+def _clips_failed(db: Session, job, message: str) -> None:
+    fail_pending(db, [c[0] for c in (job.payload or {}).get("clips") or []], f"Clip failed: {message}")
+
+@job_handler("clips", on_failure=_clips_failed, max_attempts=3)
+async def run_clips(db: Session, job) -> dict:
+    clips = [(clip_id, start_ms, end_ms) for clip_id, start_ms, end_ms in (job.payload or {}).get("clips") or []]
+    return {"rendered": await render_clips(clips)}
+
+@router.get("/{video_id}/clips")
+def list_clips(video_id: int, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    v = db.query(Video).filter(Video.id == video_id, Video.user_id == user_id).first()
+    if not v:
+        raise HTTPException(404, "Video not found")
+    rows = (
+        db.query(Video)
+        .filter(Video.parent_video_id == v.id, Video.user_id == user_id)
+        .order_by(Video.start_sec, Video.id)
+        .all()
+    )
+    counts = {}
+    for c in rows:
+        counts[c.status] = counts.get(c.status, 0) + 1
+    return {"parent_video_id": v.id, "total": len(rows), "by_status": counts, "clips": serialize_many(db, rows)}
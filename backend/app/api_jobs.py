@@ -0,0 +1,32 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.security import require_user_id
+from app.models import Job
+from app.services.jobs import serialize_job
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+def db_dep():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@router.get("")
+def list_jobs(video_id: Optional[int] = None, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    q = db.query(Job).filter(Job.user_id == user_id)
+    if video_id is not None:
+        q = q.filter(Job.video_id == video_id)
+    return [serialize_job(j) for j in q.order_by(Job.id.desc()).limit(100).all()]
+
+@router.get("/{job_id}")
+def get_job(job_id: int, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    j = db.query(Job).filter(Job.id == job_id, Job.user_id == user_id).first()
+    if not j:
+        raise HTTPException(404, "Job not found")
+    return serialize_job(j)
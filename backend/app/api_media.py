@@ -0,0 +1,61 @@
+"""
+Public media files: /uploads/<path below UPLOAD_DIR>.
+
+n8n downloads whole videos from here and the editor seeks through them with
+Range requests. To keep the bytes off the API workers entirely, put nginx in
+front and set MEDIA_ACCEL_REDIRECT_PREFIX, e.g. with
+
+    location /_uploads_internal/ {
+        internal;
+        alias /data/uploads/;
+        sendfile on;
+        tcp_nopush on;
+    }
+
+and MEDIA_ACCEL_REDIRECT_PREFIX=/_uploads_internal/.
+
+With STORAGE_BACKEND=s3 the route redirects to a presigned GET instead, so
+the object store serves the bytes.
+"""
+import os
+import stat
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.services.blobs import current_blob_key
+from app.services.media import media_response, public_path_url, resolve_upload_path
+from app.services.storage import get_storage, sharded_key_for
+
+router = APIRouter(tags=["media"])
+
+@router.api_route("/uploads/{relpath:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_upload(relpath: str, request: Request):
+    full_path = resolve_upload_path(relpath)
+    if not full_path:
+        raise HTTPException(404, "Not found")
+    storage = get_storage()
+
+    # URLs handed out before the sharded layout keep working after the file moved
+    sharded = sharded_key_for(relpath)
+    if sharded and not await run_in_threadpool(storage.exists, relpath):
+        relpath = sharded
+        full_path = resolve_upload_path(relpath)
+
+    # A blob replaced in place (e.g. by the fast-start remux) moved to a new key.
+    # Locally exists() is a stat(); on S3, where it would cost a HEAD, the blob row is asked instead.
+    if relpath.startswith("blobs/"):
+        if storage.local_path(relpath) is None or not await run_in_threadpool(storage.exists, relpath):
+            moved = await run_in_threadpool(current_blob_key, relpath)
+            if moved:
+                return RedirectResponse(public_path_url(moved), status_code=301)
+
+    if storage.local_path(relpath) is None:
+        return RedirectResponse(storage.download_url(relpath), status_code=307)
+    try:
+        st = await run_in_threadpool(os.stat, full_path)
+    except OSError:
+        raise HTTPException(404, "Not found")
+    if not stat.S_ISREG(st.st_mode):
+        raise HTTPException(404, "Not found")
+    return media_response(relpath, full_path, st, request.headers, request.method)
@@ -14,7 +14,6 @@ Supports:
 """
 import os
 import tempfile
-import httpx
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import Optional
@@ -23,6 +22,10 @@ from app.db import SessionLocal
 from app.security import require_user_id
 from app.models import Video, CloudConnection
 from app.config import settings
+from app.services import caption_store, captions
+from app.services.storage import fetchable_url
+from app.services.http_clients import PUBLISH, get_client
+from app.services.jobs import PermanentJobError, enqueue, fail_video, job_handler
 
 router = APIRouter(prefix="/publish", tags=["publish"])
 
@@ -33,67 +36,18 @@ def db_dep():
     finally:
         db.close()
 
-def extract_captions(video: Video) -> list[dict]:
+def extract_captions(db: Session, video: Video) -> list[dict]:
     """
-    Extract captions from video.captions JSONB field.
-
-    Expected formats:
-    1. Single language (legacy): {"format": "srt", "srt": "content..."}
-    2. Multi-language: {
-         "en": {"format": "srt", "content": "...", "url": "..."},
-         "es": {"format": "srt", "content": "...", "url": "..."},
-         ...
-       }
-
-    Returns list of caption objects for n8n:
+    Captions of every language for n8n:
     [
         {"language": "en", "format": "srt", "content": "...", "url": "..."},
         {"language": "es", "format": "srt", "content": "...", "url": "..."},
     ]
     """
-    if not video.captions:
-        return []
-
-    captions = video.captions
-    result = []
-
-    # Check if it's the legacy single-language format
-    if "srt" in captions or "text" in captions or "format" in captions:
-        # Legacy format - use video.language as the language code
-        lang = video.language or "en"
-        content = captions.get("srt") or captions.get("text") or captions.get("content")
-        url = captions.get("url")
-        fmt = captions.get("format", "srt")
-        if content or url:
-            result.append({
-                "language": lang,
-                "format": fmt,
-                "content": content,
-                "url": url
-            })
-    else:
-        # Multi-language format - keys are language codes
-        for lang_code, caption_data in captions.items():
-            if isinstance(caption_data, dict):
-                result.append({
-                    "language": lang_code,
-                    "format": caption_data.get("format", "srt"),
-                    "content": caption_data.get("content") or caption_data.get("srt") or caption_data.get("text"),
-                    "url": caption_data.get("url")
-                })
-            elif isinstance(caption_data, str):
-                # Simple format: {"en": "caption content..."}
-                result.append({
-                    "language": lang_code,
-                    "format": "srt",
-                    "content": caption_data,
-                    "url": None
-                })
-
-    return result
-
-@router.post("/youtube")
-async def publish_to_youtube(
+    return caption_store.export_list(db, video.id)
+
+@router.post("/youtube", status_code=202)
+def publish_to_youtube(
     payload: dict,
     user_id: str = Depends(require_user_id),
     db: Session = Depends(db_dep)
@@ -138,6 +92,9 @@ async def publish_to_youtube(
         "youtube_id": "abc123",
         "youtube_url": "https://youtube.com/watch?v=abc123"
     }
+
+    The call to n8n runs as a background job (kind "publish_n8n"); this
+    returns 202 with job_id, and GET /jobs/{job_id} has the result.
     """
     if not settings.N8N_PUBLISH_URL:
         raise HTTPException(500, "N8N_PUBLISH_URL not configured. Set it in .env")
@@ -179,13 +136,12 @@ async def publish_to_youtube(
     # Captions - use override or extract from video
     captions = payload.get("captions")
     if captions is None:
-        captions = extract_captions(v)
+        captions = extract_captions(db, v)
 
     tags = [t.strip() for t in tags_str.split(",") if t.strip()] if isinstance(tags_str, str) else tags_str
 
     # Get video URL
-    video_url = v.storage_path
-    if not video_url:
+    if not v.storage_path:
         raise HTTPException(400, "Video has no storage_path")
 
     # Update status
@@ -194,55 +150,64 @@ async def publish_to_youtube(
     db.add(v)
     db.commit()
 
-    try:
-        # Call n8n webhook
-        n8n_payload = {
-            "video_url": video_url,
-            "title": title,
-            "description": description,
-            "tags": tags,
-            "privacy_status": privacy_status,
-            "channel_id": channel_id,
-            "thumbnail_url": thumbnail_url,
-            "captions": captions,
-            "user_id": user_id,
-            "video_id": v.id,
-        }
+    job = enqueue(db, "publish_n8n", {
+        "title": title,
+        "description": description,
+        "tags": tags,
+        "privacy_status": privacy_status,
+        "channel_id": channel_id,
+        "thumbnail_url": thumbnail_url,
+        "captions": captions,
+    }, user_id=user_id, video_id=v.id)
+    return {"ok": True, "job_id": job.id, "status": job.status, "video_id": v.id}
+
+# One attempt only: a retry after n8n timed out (having uploaded) would publish the video twice
+@job_handler("publish_n8n", on_failure=fail_video("Publish failed", status="failed"), max_attempts=1)
+async def run_publish_n8n(db: Session, job) -> dict:
+    v = db.query(Video).filter(Video.id == job.video_id).first()
+    if not v:
+        raise PermanentJobError("Video not found")
+    if not settings.N8N_PUBLISH_URL:
+        raise PermanentJobError("N8N_PUBLISH_URL not configured")
+    p = job.payload or {}
+    captions = p.get("captions")
+
+    # URLs are resolved at send time: presigned S3 URLs must not expire while the job waits
+    n8n_payload = {
+        "video_url": fetchable_url(v.storage_path),
+        "title": p.get("title"),
+        "description": p.get("description"),
+        "tags": p.get("tags"),
+        "privacy_status": p.get("privacy_status"),
+        "channel_id": p.get("channel_id"),
+        "thumbnail_url": fetchable_url(p.get("thumbnail_url")),
+        "captions": captions,
+        "user_id": job.user_id,
+        "video_id": v.id,
+    }
 
-        async with httpx.AsyncClient(timeout=600.0) as client:
-            r = await client.post(settings.N8N_PUBLISH_URL, json=n8n_payload)
-            r.raise_for_status()
-            result = r.json()
-
-        # Update video with YouTube info
-        v.youtube_id = result.get("youtube_id")
-        v.youtube_url = result.get("youtube_url")
-        v.status = "published"
-        v.privacy_status = privacy_status  # Store what was actually published
-        db.add(v)
-        db.commit()
-        db.refresh(v)
-
-        return {
-            "ok": True,
-            "youtube_id": v.youtube_id,
-            "youtube_url": v.youtube_url,
-            "status": v.status,
-            "captions_uploaded": len(captions) if captions else 0
-        }
+    r = await get_client(PUBLISH).post(settings.N8N_PUBLISH_URL, json=n8n_payload)
+    if r.is_error:
+        raise RuntimeError(f"n8n publish failed: HTTP {r.status_code}")
+    result = r.json()
+
+    # Update video with YouTube info
+    v.youtube_id = result.get("youtube_id")
+    v.youtube_url = result.get("youtube_url")
+    v.status = "published"
+    v.privacy_status = p.get("privacy_status")  # Store what was actually published
+    v.error_message = None
+    db.add(v)
+    db.commit()
+    db.refresh(v)
 
-    except httpx.HTTPStatusError as e:
-        v.status = "failed"
-        v.error_message = f"n8n publish failed: HTTP {e.response.status_code}"
-        db.add(v)
-        db.commit()
-        raise HTTPException(502, v.error_message)
-    except Exception as e:
-        v.status = "failed"
-        v.error_message = f"Publish failed: {str(e)}"
-        db.add(v)
-        db.commit()
-        raise HTTPException(500, v.error_message)
+    return {
+        "ok": True,
+        "youtube_id": v.youtube_id,
+        "youtube_url": v.youtube_url,
+        "status": v.status,
+        "captions_uploaded": len(captions) if captions else 0
+    }
 
 @router.get("/youtube/channels")
 def list_youtube_channels(
@@ -300,49 +265,20 @@ async def add_captions_to_video(
     if not v:
         raise HTTPException(404, "Video not found")
 
-    # Get existing captions or initialize
-    existing_captions = v.captions or {}
-
-    # Handle legacy format - convert to multi-language
-    if "srt" in existing_captions or "text" in existing_captions or "format" in existing_captions:
-        lang = v.language or "en"
-        legacy_content = existing_captions.get("srt") or existing_captions.get("text") or existing_captions.get("content")
-        existing_captions = {
-            lang: {
-                "format": existing_captions.get("format", "srt"),
-                "content": legacy_content
-            }
-        }
-
-    # Add new captions
+    # Add new captions, one row per language
     captions_list = payload.get("captions")
-    if captions_list:
-        for cap in captions_list:
-            lang = cap.get("language")
-            if lang:
-                existing_captions[lang] = {
-                    "format": cap.get("format", "srt"),
-                    "content": cap.get("content"),
-                    "url": cap.get("url")
-                }
-    else:
-        # Single caption
-        lang = payload.get("language")
+    if not captions_list and payload.get("language"):
+        captions_list = [payload]  # single caption
+    for cap in captions_list or []:
+        lang = cap.get("language")
         if lang:
-            existing_captions[lang] = {
-                "format": payload.get("format", "srt"),
-                "content": payload.get("content"),
-                "url": payload.get("url")
-            }
-
-    v.captions = existing_captions
-    db.add(v)
+            caption_store.put_track(db, v.id, lang, captions.make_track(cap.get("content"), cap.get("format"), cap.get("url")))
     db.commit()
-    db.refresh(v)
 
+    languages = caption_store.languages(db, v.id)
     return {
         "ok": True,
         "video_id": v.id,
-        "languages": list(existing_captions.keys()),
-        "caption_count": len(existing_captions)
+        "languages": languages,
+        "caption_count": len(languages)
     }
@@ -0,0 +1,215 @@
+"""
+Resumable uploads for large videos.
+
+Flow:
+  1. POST   /video/uploads                 {"filename": "...", "size": 1234}  -> {"upload_id", "offset"}
+  2. PUT    /video/uploads/{id}            raw bytes, header "Content-Range: bytes 0-1048575/1234"
+                                           (or ?offset=N); repeat, in any order, retrying as needed
+  3. GET    /video/uploads/{id}            -> {"offset", "received"} to find where to resume
+  4. POST   /video/uploads/{id}/complete   -> the new Video (stored in the content-addressed blob store)
+
+Sessions expire after UPLOAD_SESSION_TTL_HOURS without activity.
+"""
+import os
+import re
+import uuid
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+
+from app.config import settings
+from app.db import SessionLocal
+from app.security import require_user_id
+from app.models import UploadSession, Video
+from app.api_videos import ensure_user, safe_name, public_path_url, serialize
+from app.services.postprocess import run_postprocess
+from app.services.blobs import blob_ext, hash_file, store_blob, add_reference
+from app.services.upload_sessions import (
+    RangeWriter, create_part_file, contiguous_offset, merge_range, session_expiry, sessions_dir
+)
+
+router = APIRouter(prefix="/video/uploads", tags=["uploads"])
+
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+def db_dep():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def serialize_session(s: UploadSession) -> dict:
+    return {
+        "upload_id": s.id,
+        "filename": s.filename,
+        "size": s.total_size,
+        "offset": s.offset,
+        "received": s.received or [],
+        "status": s.status,
+        "video_id": s.video_id,
+        "expires_at": s.expires_at.isoformat() if s.expires_at else None,
+    }
+
+def get_session(db: Session, upload_id: str, user_id: str, for_update: bool = False) -> UploadSession:
+    q = db.query(UploadSession).filter(UploadSession.id == upload_id, UploadSession.user_id == user_id)
+    if for_update:
+        q = q.with_for_update()
+    s = q.first()
+    if not s:
+        raise HTTPException(404, "Upload session not found")
+    return s
+
+@router.post("")
+def create_upload(payload: dict, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    ensure_user(db, user_id)
+    filename = payload.get("filename")
+    size = payload.get("size")
+    if not filename:
+        raise HTTPException(400, "filename required")
+    if not isinstance(size, int) or size <= 0:
+        raise HTTPException(400, "size required (bytes, > 0)")
+    if size > settings.MAX_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(413, f"Upload exceeds {settings.MAX_UPLOAD_MB} MB limit")
+
+    upload_id = uuid.uuid4().hex
+    temp_path = os.path.join(sessions_dir(), f"{upload_id}.part")
+    create_part_file(temp_path, size)
+
+    s = UploadSession(
+        id=upload_id,
+        user_id=user_id,
+        filename=safe_name(filename),
+        total_size=size,
+        offset=0,
+        received=[],
+        status="open",
+        temp_path=temp_path,
+        expires_at=session_expiry(),
+    )
+    db.add(s)
+    db.commit()
+    db.refresh(s)
+    return serialize_session(s)
+
+@router.get("/{upload_id}")
+def get_upload(upload_id: str, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    return serialize_session(get_session(db, upload_id, user_id))
+
+@router.put("/{upload_id}")
+async def put_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int | None = None,
+    user_id: str = Depends(require_user_id),
+    db: Session = Depends(db_dep)
+):
+    s = get_session(db, upload_id, user_id)
+    if s.status != "open":
+        raise HTTPException(409, f"Upload session is {s.status}")
+
+    content_range = request.headers.get("content-range")
+    if content_range:
+        m = CONTENT_RANGE_RE.match(content_range.strip())
+        if not m:
+            raise HTTPException(400, "Invalid Content-Range, expected 'bytes start-end/total'")
+        start, end = int(m.group(1)), int(m.group(2)) + 1
+        if m.group(3) != "*" and int(m.group(3)) != s.total_size:
+            raise HTTPException(400, "Content-Range total does not match the session size")
+    elif offset is not None:
+        start, end = offset, s.total_size
+    else:
+        raise HTTPException(400, "Content-Range header or offset query parameter required")
+    if start < 0 or start >= end or end > s.total_size:
+        raise HTTPException(416, f"Range outside 0-{s.total_size - 1}")
+
+    temp_path = s.temp_path
+    # Release the connection while the body streams in; it is reacquired below
+    db.rollback()
+
+    writer = RangeWriter(temp_path, start, end - start)
+    try:
+        await writer.run(request.stream())
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except ClientDisconnect:
+        pass
+    finally:
+        # Record whatever reached the disk so a dropped connection resumes mid-chunk
+        if writer.written:
+            s = get_session(db, upload_id, user_id, for_update=True)
+            s.received = merge_range(s.received, start, start + writer.written)
+            s.offset = contiguous_offset(s.received)
+            s.expires_at = session_expiry()
+            db.add(s)
+            db.commit()
+            db.refresh(s)
+
+    return serialize_session(s)
+
+@router.post("/{upload_id}/complete")
+def complete_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    user_id: str = Depends(require_user_id),
+    db: Session = Depends(db_dep),
+):
+    s = get_session(db, upload_id, user_id, for_update=True)
+    if s.status == "complete" and s.video_id:
+        v = db.query(Video).filter(Video.id == s.video_id).first()
+        if v:
+            return serialize(v)
+    if s.status != "open":
+        raise HTTPException(409, f"Upload session is {s.status}")
+    if s.offset != s.total_size:
+        raise HTTPException(409, f"Upload incomplete: {s.offset} of {s.total_size} bytes received")
+
+    # Claim the session so concurrent completes / chunk PUTs back off while the file moves
+    s.status = "finalizing"
+    db.add(s)
+    db.commit()
+
+    try:
+        # Chunks may arrive out of order, so the hash is taken once here rather than while streaming
+        sha256 = hash_file(s.temp_path)
+        blob = store_blob(db, s.temp_path, sha256, s.total_size, blob_ext(s.filename))
+    except Exception:
+        db.rollback()
+        s.status = "open"
+        db.add(s)
+        db.commit()
+        raise
+
+    v = Video(
+        user_id=user_id,
+        original_filename=s.filename,
+        storage_path=public_path_url(blob.path),
+        content_hash=blob.sha256,
+        status="ready",
+        language="en",
+        privacy_status="private",
+    )
+    db.add(v)
+    db.flush()
+
+    s.status = "complete"
+    s.video_id = v.id
+    db.add(s)
+    db.commit()
+    db.refresh(v)
+    add_reference(db, user_id, blob.sha256, v.id, v.original_filename)
+    background_tasks.add_task(run_postprocess, v.id)
+    return serialize(v)
+
+@router.delete("/{upload_id}")
+def abort_upload(upload_id: str, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    s = get_session(db, upload_id, user_id)
+    if s.status != "complete":
+        try:
+            os.remove(s.temp_path)
+        except OSError:
+            pass
+    db.delete(s)
+    db.commit()
+    return Response(status_code=204)
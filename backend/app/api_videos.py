@@ -1,14 +1,27 @@
 import os
 import uuid
-import shutil
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, BackgroundTasks
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.config import settings
 from app.db import SessionLocal
 from app.security import require_user_id
-from app.models import User, Video, VideoIngestRequest
-from app.services.n8n import transcribe_via_n8n
+from app.models import Job, User, Video, VideoIngestRequest
+from app.services.transcription import transcribe_video
+from app.services import caption_store, captions, transcription_cache
+from app.services.streaming_upload import receive_upload
+from app.services.media import public_path_url
+from app.services.storage import get_storage, user_key
+from app.services.ingest import BlockedURL, IngestError, check_scheme, mark_failed as mark_ingest_failed, run_ingest
+from app.services.postprocess import run_postprocess
+from app.services.timeline import timeline_manifest
+from app.services.renditions import playback_url
+from app.services.jobs import PermanentJobError, WaitForCallback, complete_waiting, enqueue, fail_video, job_handler
+from app.services.callbacks import signed_url, verify
+from app.services.blobs import incoming_dir, blob_ext, store_blob, add_reference, find_transcribed_duplicate
 
 router = APIRouter(prefix="/video", tags=["video"])
 
@@ -30,17 +43,18 @@ def safe_name(name: str) -> str:
     return "".join(ch for ch in name if ch.isalnum() or ch in ("-", "_", ".", " ")).strip() or "video.mp4"
 
 def public_upload_url(user_id: str, filename: str) -> str:
-    return f"{settings.PUBLIC_BASE_URL.rstrip('/')}/uploads/{user_id}/{filename}"
+    return public_path_url(user_key(user_id, filename))
 
-def serialize(v: Video) -> dict:
-    caps_str = None
-    if isinstance(v.captions, dict):
-        caps_str = v.captions.get("srt") or v.captions.get("text")
+def serialize(v: Video, caption_track: Optional[dict] = None) -> dict:
+    """`caption_track`: the primary caption track (caption_store), shown as "captions"."""
+    caps_str = captions.track_content(caption_track)
     return {
         "id": v.id,
         "user_id": v.user_id,
         "original_filename": v.original_filename,
         "storage_path": v.storage_path,
+        "playback_url": playback_url(v),
+        "renditions": v.renditions,
         "status": v.status,
         "transcript": v.transcript,
         "captions": caps_str,
@@ -56,6 +70,12 @@ def serialize(v: Video) -> dict:
         "youtube_url": v.youtube_url,
         "error_message": v.error_message,
         "duration_ms": v.duration_ms,
+        "media_info": v.media_info,
+        "parent_video_id": v.parent_video_id,
+        "start_sec": v.start_sec,
+        "end_sec": v.end_sec,
+        "trim_start_ms": v.trim_start_ms,
+        "trim_end_ms": v.trim_end_ms,
         "confidentiality_status": v.confidentiality_status,
     }
 
@@ -63,14 +83,18 @@ def serialize(v: Video) -> dict:
 def list_videos(user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
     ensure_user(db, user_id)
     rows = db.query(Video).filter(Video.user_id == user_id).order_by(Video.id.desc()).all()
-    return [serialize(v) for v in rows]
+    return serialize_many(db, rows)
+
+def serialize_many(db: Session, videos: list[Video]) -> list[dict]:
+    tracks = caption_store.primary_tracks(db, videos)
+    return [serialize(v, tracks.get(v.id)) for v in videos]
 
 @router.get("/{video_id}")
 def get_video(video_id: int, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
     v = db.query(Video).filter(Video.id == video_id, Video.user_id == user_id).first()
     if not v:
         raise HTTPException(404, "Video not found")
-    return serialize(v)
+    return serialize(v, caption_store.get_track(db, v))
 
 @router.get("/{video_id}/status")
 def get_video_status(video_id: int, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
@@ -87,6 +111,19 @@ def get_video_status(video_id: int, user_id: str = Depends(require_user_id), db:
         "confidentiality_status": v.confidentiality_status,
     }
 
+@router.get("/{video_id}/timeline")
+def get_timeline(video_id: int, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    """
+    Scrub data for the caption editor: a sprite sheet (one tile every
+    interval_s seconds, `columns` tiles per row) and a binary keyframe index
+    (see index_format). status is "pending" until post-upload processing
+    has built them.
+    """
+    v = db.query(Video).filter(Video.id == video_id, Video.user_id == user_id).first()
+    if not v:
+        raise HTTPException(404, "Video not found")
+    return timeline_manifest(db, v)
+
 @router.patch("/{video_id}")
 def patch_video(video_id: int, payload: dict, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
     v = db.query(Video).filter(Video.id == video_id, Video.user_id == user_id).first()
@@ -94,39 +131,69 @@ def patch_video(video_id: int, payload: dict, user_id: str = Depends(require_use
         raise HTTPException(404, "Video not found")
 
     allowed = {
-        "status", "transcript", "captions", "title", "description", "tags", "hashtags",
-        "thumbnail_url", "thumbnail_prompt", "privacy_status", "language", "error_message"
+        "status", "transcript", "title", "description", "tags", "hashtags",
+        "thumbnail_url", "thumbnail_prompt", "privacy_status", "language", "error_message",
+        "trim_start_ms", "trim_end_ms",
     }
     for k, val in payload.items():
         if k in allowed:
             setattr(v, k, val)
+    if "captions" in payload:
+        raw = payload["captions"]
+        try:
+            doc = captions.normalize(raw, v.language)
+        except captions.CaptionError as e:
+            raise HTTPException(400, str(e))
+        tracks = (doc or {}).get("tracks") or {}
+        if isinstance(raw, dict) and raw.get("version") == captions.SCHEMA_VERSION:
+            # An explicit version 2 document is the whole set: languages it leaves out are removed
+            caption_store.replace_all(db, v.id, tracks)
+        elif tracks:
+            # An SRT string or legacy track (the editor's save) only updates the languages it carries
+            for language, track in tracks.items():
+                caption_store.put_track(db, v.id, language, track)
+        else:
+            caption_store.delete_track(db, v.id, v.language or "en")
 
     db.add(v)
     db.commit()
     db.refresh(v)
-    return serialize(v)
+    return serialize(v, caption_store.get_track(db, v))
 
 @router.post("/upload")
 async def upload(
-    file: UploadFile = File(...),
+    request: Request,
+    background_tasks: BackgroundTasks,
     user_id: str = Depends(require_user_id),
     db: Session = Depends(db_dep)
 ):
+    """
+    Multipart upload (field name "file").
+
+    The body is parsed as it arrives and written straight to disk while its
+    sha256 is computed; MAX_UPLOAD_MB is enforced mid-stream. The file is then
+    renamed into the content-addressed store, or dropped if those bytes are
+    already stored.
+    """
     ensure_user(db, user_id)
-    if not file.filename:
-        raise HTTPException(400, "Missing filename")
 
-    os.makedirs(os.path.join(settings.UPLOAD_DIR, user_id), exist_ok=True)
-    fname = f"{uuid.uuid4().hex}_{safe_name(file.filename)}"
-    local_path = os.path.join(settings.UPLOAD_DIR, user_id, fname)
+    dest_dir = incoming_dir()
+    os.makedirs(dest_dir, exist_ok=True)
 
-    with open(local_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    up = await receive_upload(
+        request,
+        dest_dir,
+        make_name=lambda filename: f"{uuid.uuid4().hex}_{safe_name(filename)}",
+        max_bytes=settings.MAX_UPLOAD_MB * 1024 * 1024,
+    )
+    filename = safe_name(up.filename)
+    blob = await run_in_threadpool(store_blob, db, up.path, up.sha256, up.size, blob_ext(filename))
 
     v = Video(
         user_id=user_id,
-        original_filename=safe_name(file.filename),
-        storage_path=public_upload_url(user_id, fname),
+        original_filename=filename,
+        storage_path=public_path_url(blob.path),
+        content_hash=blob.sha256,
         status="ready",
         language="en",
         privacy_status="private",
@@ -134,6 +201,8 @@ async def upload(
     db.add(v)
     db.commit()
     db.refresh(v)
+    add_reference(db, user_id, blob.sha256, v.id, filename)
+    background_tasks.add_task(run_postprocess, v.id)
     return serialize(v)
 
 @router.post("/{video_id}/speaker-image")
@@ -150,13 +219,9 @@ async def upload_speaker_image(
     if not file.filename:
         raise HTTPException(400, "Missing filename")
 
-    os.makedirs(os.path.join(settings.UPLOAD_DIR, user_id), exist_ok=True)
     ext = os.path.splitext(file.filename)[1] or ".jpg"
     fname = f"speaker_{video_id}_{uuid.uuid4().hex}{ext}"
-    local_path = os.path.join(settings.UPLOAD_DIR, user_id, fname)
-
-    with open(local_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    await run_in_threadpool(get_storage().put_fileobj, user_key(user_id, fname), file.file, file.content_type)
 
     v.speaker_image_url = public_upload_url(user_id, fname)
     db.add(v)
@@ -179,13 +244,9 @@ async def upload_thumbnail(
     if not file.filename:
         raise HTTPException(400, "Missing filename")
 
-    os.makedirs(os.path.join(settings.UPLOAD_DIR, user_id), exist_ok=True)
     ext = os.path.splitext(file.filename)[1] or ".jpg"
     fname = f"thumb_{video_id}_{uuid.uuid4().hex}{ext}"
-    local_path = os.path.join(settings.UPLOAD_DIR, user_id, fname)
-
-    with open(local_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    await run_in_threadpool(get_storage().put_fileobj, user_key(user_id, fname), file.file, file.content_type)
 
     v.thumbnail_url = public_upload_url(user_id, fname)
     db.add(v)
@@ -194,20 +255,64 @@ async def upload_thumbnail(
 
     return {"thumbnail_url": v.thumbnail_url}
 
+def serialize_ingest(r: VideoIngestRequest) -> dict:
+    return {
+        "id": r.id,
+        "video_id": r.video_id,
+        "source_path": r.source_path,
+        "source_file_name": r.source_file_name,
+        "source_file_size": r.source_file_size,
+        "status": r.status,
+        "progress": r.progress,
+        "error_message": r.error_message,
+        "started_at": r.started_at.isoformat() if r.started_at else None,
+        "completed_at": r.completed_at.isoformat() if r.completed_at else None,
+    }
+
 @router.post("/ingest")
-def ingest(payload: dict, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+def ingest(
+    payload: dict,
+    user_id: str = Depends(require_user_id),
+    db: Session = Depends(db_dep)
+):
+    """
+    Register a remote video and download it into local storage in the background.
+    The returned video has status "ingesting" until the download finishes;
+    poll GET /video/ingest/{ingest_request_id} for byte progress. The
+    download runs as an "ingest" job (job_id), retried if it is interrupted.
+    """
     ensure_user(db, user_id)
     url = (payload.get("video_url") or "").strip()
     if not url:
         raise HTTPException(400, "video_url required")
+    try:
+        check_scheme(url)
+    except BlockedURL as e:
+        raise HTTPException(400, str(e))
 
     filename = safe_name(payload.get("filename") or "ingested.mp4")
 
+    # Re-ingesting a URL this user already registered returns the existing video
+    prev = (
+        db.query(VideoIngestRequest)
+        .filter(
+            VideoIngestRequest.user_id == user_id,
+            VideoIngestRequest.source_path == url,
+            VideoIngestRequest.status != "failed",
+            VideoIngestRequest.video_id.isnot(None),
+        )
+        .order_by(VideoIngestRequest.id.desc())
+        .first()
+    )
+    existing = db.query(Video).filter(Video.id == prev.video_id).first() if prev else None
+    if existing:
+        return {**serialize(existing), "ingest_request_id": prev.id}
+
     v = Video(
         user_id=user_id,
         original_filename=filename,
-        storage_path=url,
-        status="ready",
+        storage_path=url,  # remote until the download completes
+        status="ingesting",
         language="en",
         privacy_status="private",
     )
@@ -215,26 +320,52 @@ def ingest(payload: dict, user_id: str = Depends(require_user_id), db: Session =
     db.commit()
     db.refresh(v)
 
-    db.add(VideoIngestRequest(
+    req = VideoIngestRequest(
         user_id=user_id,
         provider="url",
         source_path=url,
         source_file_name=filename,
-        status="done",
+        status="queued",
         video_id=v.id
-    ))
+    )
+    db.add(req)
     db.commit()
+    db.refresh(req)
 
-    return serialize(v)
+    job = enqueue(db, "ingest", {"ingest_request_id": req.id}, user_id=user_id, video_id=v.id)
+    return {**serialize(v), "ingest_request_id": req.id, "job_id": job.id}
+
+def _ingest_failed(db: Session, job, message: str) -> None:
+    mark_ingest_failed(db, (job.payload or {}).get("ingest_request_id"), f"Ingest failed: {message}")
 
-@router.post("/caption")
-async def caption(payload: dict, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+@job_handler("ingest", on_failure=_ingest_failed, max_attempts=3)
+async def run_ingest_job(db: Session, job) -> dict:
+    ingest_id = (job.payload or {}).get("ingest_request_id")
+    try:
+        video_id = await run_ingest(ingest_id)
+    except IngestError as e:
+        raise PermanentJobError(str(e))
+    return {"ingest_request_id": ingest_id, "video_id": video_id}
+
+@router.get("/ingest/{ingest_id}")
+def get_ingest(ingest_id: int, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    r = db.query(VideoIngestRequest).filter(
+        VideoIngestRequest.id == ingest_id, VideoIngestRequest.user_id == user_id
+    ).first()
+    if not r:
+        raise HTTPException(404, "Ingest request not found")
+    return serialize_ingest(r)
+
+@router.post("/caption", status_code=202)
+def caption(payload: dict, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
     """
-    Calls n8n:
-      POST N8N_TRANSCRIBE_URL
-      Content-Type: application/x-www-form-urlencoded
-      params: video_url, language_code
-    Response: { "text": "...", "srt": "..." }
+    Queue transcription of a video (job kind "caption"); returns 202 at once
+    with job_id and status "captioning". Poll GET /jobs/{job_id}: its result
+    is {"captions_format", "captions"} once done.
+
+    If the same audio was already transcribed in this language (transcription
+    cache, or another video with the same bytes) the captions are applied and
+    returned directly (200). "force": true skips both and calls the transcriber.
     """
     ensure_user(db, user_id)
 
@@ -243,59 +374,155 @@ async def caption(payload: dict, user_id: str = Depends(require_user_id), db: Se
         raise HTTPException(400, "video_id required")
 
     language_code = payload.get("language_code") or settings.DEFAULT_LANGUAGE_CODE
+    force = bool(payload.get("force"))
 
     v = db.query(Video).filter(Video.id == int(vid), Video.user_id == user_id).first()
     if not v:
         raise HTTPException(404, "Video not found")
 
     # n8n needs a public URL
-    video_url = v.storage_path
-    if not video_url:
+    if not v.storage_path:
         raise HTTPException(400, "Video storage_path is empty")
 
+    cached = None if force else transcription_cache.get_cached(db, v, language_code)
+    if cached:
+        out = apply_transcription(db, v, language_code, cached)
+        return JSONResponse({**out, "cached": True})
+
+    # Same bytes were already transcribed in this language: reuse instead of calling n8n
+    donor = None if force else find_transcribed_duplicate(db, v, language_code)
+    if donor:
+        caption_store.copy_tracks(db, donor.id, v.id)
+        v.transcript = donor.transcript
+        v.language = language_code
+        v.status = "metadata_ready"
+        v.error_message = None
+        db.add(v)
+        db.commit()
+        track = caption_store.get_track(db, donor, language_code) or caption_store.get_track(db, donor)
+        return JSONResponse({
+            "captions_format": captions.track_format(track),
+            "captions": captions.track_content(track) or donor.transcript or "",
+            "reused_from_video_id": donor.id,
+        })
+
     v.status = "captioning"
+    v.error_message = None
     db.add(v)
     db.commit()
 
+    job = enqueue(db, "caption", {"language_code": language_code, "force": force}, user_id=user_id, video_id=v.id)
+    return {"job_id": job.id, "status": v.status, "video_id": v.id}
+
+def caption_callback_path(video_id: int) -> str:
+    return f"/video/{video_id}/caption/callback"
+
+@job_handler("caption", on_failure=fail_video("Transcribe failed"))
+async def run_caption(db: Session, job) -> dict:
+    """
+    Calls n8n:
+      POST N8N_TRANSCRIBE_URL
+      Content-Type: application/x-www-form-urlencoded
+      params: video_url, language_code (+ callback_url in callback mode)
+    Response: { "text": "...", "srt": "..." }
+    Long videos are sent as parallel segments and stitched (services/transcription.py).
+
+    With TRANSCRIBE_CALLBACK_MODE n8n only acknowledges; the job waits until
+    it POSTs the result to caption_callback below.
+    """
+    v = db.query(Video).filter(Video.id == job.video_id).first()
+    if not v:
+        raise PermanentJobError("Video not found")
+    payload = job.payload or {}
+    language_code = payload.get("language_code") or settings.DEFAULT_LANGUAGE_CODE
+
+    callback_url = None
+    if settings.TRANSCRIBE_CALLBACK_MODE:
+        callback_url = signed_url(
+            caption_callback_path(v.id), settings.TRANSCRIBE_CALLBACK_TIMEOUT_SECONDS,
+            job=job.id, language_code=language_code,
+        )
+    res = await transcribe_video(db, v, language_code, force=bool(payload.get("force")), callback_url=callback_url)
+    if res is None:
+        raise WaitForCallback(settings.TRANSCRIBE_CALLBACK_TIMEOUT_SECONDS)
+    out = apply_transcription(db, v, language_code, res)
+    await save_srt_file(v, res.get("srt"))
+    return {**out, "cached": bool(res.get("cached"))}
+
+@router.post("/{video_id}/caption/callback", include_in_schema=False)
+async def caption_callback(video_id: int, request: Request, db: Session = Depends(db_dep)):
+    """
+    n8n posts the transcription here in callback mode: {"text", "srt"} as
+    JSON or form fields, or {"error": "..."} if it failed. Authenticated by
+    the signed URL handed out in run_caption, not by X-User-Id.
+    """
+    query = dict(request.query_params)
+    if not verify(caption_callback_path(video_id), query):
+        raise HTTPException(403, "Invalid or expired signature")
     try:
-        res = await transcribe_via_n8n(video_url=video_url, language_code=language_code)
-    except Exception as e:
-        v.status = "error"
-        v.error_message = f"Transcribe failed: {e}"
-        db.add(v)
-        db.commit()
-        raise HTTPException(502, v.error_message)
+        job_id = int(query.get("job") or 0)
+    except ValueError:
+        raise HTTPException(400, "job required")
+    language_code = query.get("language_code") or settings.DEFAULT_LANGUAGE_CODE
+
+    if (request.headers.get("content-type") or "").startswith("application/json"):
+        res = await request.json()
+    else:
+        res = dict(await request.form())
+    if not isinstance(res, dict):
+        raise HTTPException(400, "Expected a JSON object")
 
+    v = db.query(Video).filter(Video.id == video_id).first()
+    if not v:
+        raise HTTPException(404, "Video not found")
+
+    if res.get("error") or not (res.get("srt") or res.get("text")):
+        error = str(res.get("error") or "Transcriber returned no text")
+        if not complete_waiting(db, job_id, error=f"Transcriber: {error}"):
+            raise HTTPException(409, "Job already settled")
+        return {"ok": True}
+
+    # A duplicate or late callback still carries a valid transcription: keep it in the cache either way
+    transcription_cache.store(db, v, language_code, res)
+    job = db.query(Job).filter(Job.id == job_id, Job.video_id == video_id).first()
+    if not job or job.status not in ("waiting", "running"):
+        raise HTTPException(409, "Job already settled")
+    out = apply_transcription(db, v, language_code, res)
+    await save_srt_file(v, res.get("srt"))
+    complete_waiting(db, job_id, result={**out, "cached": False})
+    return {"ok": True}
+
+async def save_srt_file(v: Video, srt: Optional[str]) -> None:
+    """Optional: keep an .srt side file next to the uploads."""
+    if not srt:
+        return
+    try:
+        await run_in_threadpool(
+            get_storage().put_bytes, user_key(v.user_id, f"video_{v.id}.srt"), srt.encode("utf-8"), "application/x-subrip"
+        )
+    except Exception:
+        pass
+
+def apply_transcription(db: Session, v: Video, language_code: str, res: dict) -> dict:
+    """Store transcriber output {"text", "srt"} on the video; returns the caption response body."""
     srt = res.get("srt")
     text = res.get("text")
 
-    # Store in DB (JSONB)
-    if srt:
-        v.captions = {"format": "srt", "srt": srt}
-    elif text:
-        v.captions = {"format": "text", "text": text}
-    else:
-        v.captions = None
+    # A new transcription replaces the video's captions (translations of the old one included)
+    tracks = {}
+    if srt or text:
+        tracks[language_code] = captions.make_track(srt, "srt") if srt else captions.make_track(text, "text")
+    caption_store.replace_all(db, v.id, tracks)
 
     v.transcript = text or v.transcript
+    v.language = language_code
     v.status = "metadata_ready"
+    v.error_message = None
     db.add(v)
     db.commit()
     db.refresh(v)
 
-    # Optional: write an .srt file so you can see it on disk
-    if srt:
-        try:
-            out_dir = os.path.join(settings.UPLOAD_DIR, user_id)
-            os.makedirs(out_dir, exist_ok=True)
-            srt_path = os.path.join(out_dir, f"video_{v.id}.srt")
-            with open(srt_path, "w", encoding="utf-8") as f:
-                f.write(srt)
-        except Exception:
-            pass
-
     return {
         "captions_format": "srt" if srt else "text",
         "captions": srt if srt else (text or "")
     }
-
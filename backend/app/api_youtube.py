@@ -1,6 +1,5 @@
 import os
 import tempfile
-import httpx
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
@@ -8,6 +7,9 @@ from sqlalchemy.orm import Session
 from app.db import SessionLocal
 from app.security import require_user_id
 from app.models import Video
+from app.services.storage import get_storage, key_from_url
+from app.services.http_clients import MEDIA, get_sync_client
+from app.services.jobs import PermanentJobError, enqueue, fail_video, job_handler
 from app.services.youtube import (
     create_auth_url, exchange_code, youtube_connected, upload_video_to_youtube
 )
@@ -55,8 +57,9 @@ def auth_callback(payload: dict, user_id: str = Depends(require_user_id), db: Se
     except Exception as e:
         raise HTTPException(400, f"OAuth exchange failed: {e}")
 
-@router.post("/publish")
+@router.post("/publish", status_code=202)
 def publish(payload: dict, user_id: str = Depends(require_user_id), db: Session = Depends(db_dep)):
+    """Queue an upload to the user's YouTube channel (job kind "publish_youtube"); poll GET /jobs/{job_id}."""
     video_id = payload.get("video_id")
     if not video_id:
         raise HTTPException(400, "video_id required")
@@ -65,39 +68,63 @@ def publish(payload: dict, user_id: str = Depends(require_user_id), db: Session
     if not v:
         raise HTTPException(404, "Video not found")
 
-    title = payload.get("title") or v.title or v.original_filename
-    description = payload.get("description") or v.description or ""
-    tags_str = payload.get("tags") or v.tags or ""
-    privacy_status = payload.get("privacy_status") or v.privacy_status or "private"
+    job_payload = {
+        "title": payload.get("title") or v.title or v.original_filename,
+        "description": payload.get("description") or v.description or "",
+        "tags": payload.get("tags") or v.tags or "",
+        "privacy_status": payload.get("privacy_status") or v.privacy_status or "private",
+    }
+
+    v.status = "processing"
+    v.error_message = None
+    db.add(v); db.commit()
+
+    job = enqueue(db, "publish_youtube", job_payload, user_id=user_id, video_id=v.id)
+    return {"job_id": job.id, "status": job.status, "video_id": v.id}
+
+# One attempt only: the upload is not idempotent, and a failed or lost attempt may still have
+# created the YouTube video; publishing again is left to the user
+@job_handler("publish_youtube", on_failure=fail_video("Publish failed"), max_attempts=1)
+def run_publish(db: Session, job) -> dict:
+    v = db.query(Video).filter(Video.id == job.video_id).first()
+    if not v:
+        raise PermanentJobError("Video not found")
 
-    tags = [t.strip() for t in tags_str.split(",") if t.strip()]
+    p = job.payload or {}
+    tags = [t.strip() for t in p.get("tags", "").split(",") if t.strip()]
 
-    # Need a local file to upload. If storage_path is a public URL, download it first.
+    # Need a local file to upload: use our stored copy directly when we have one,
+    # otherwise download it to a temp file first.
     local_path = None
+    is_temp = False
     try:
-        if v.storage_path.startswith("http://") or v.storage_path.startswith("https://"):
-            # download to temp
+        storage = get_storage()
+        key = key_from_url(v.storage_path)
+        if key and storage.local_path(key):
+            local_path = storage.local_path(key)
+        elif key or v.storage_path.startswith("http://") or v.storage_path.startswith("https://"):
             with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
                 local_path = tmp.name
-            with httpx.stream("GET", v.storage_path, timeout=300.0) as r:
-                r.raise_for_status()
-                with open(local_path, "wb") as f:
-                    for chunk in r.iter_bytes():
-                        f.write(chunk)
+            is_temp = True
+            if key:
+                storage.fetch_to(key, local_path)
+            else:
+                with get_sync_client(MEDIA).stream("GET", v.storage_path) as r:
+                    r.raise_for_status()
+                    with open(local_path, "wb") as f:
+                        for chunk in r.iter_bytes():
+                            f.write(chunk)
         else:
             local_path = v.storage_path
 
-        v.status = "processing"
-        db.add(v); db.commit()
-
         res = upload_video_to_youtube(
             db=db,
-            user_id=user_id,
+            user_id=job.user_id,
             file_path=local_path,
-            title=title,
-            description=description,
+            title=p.get("title"),
+            description=p.get("description", ""),
             tags=tags,
-            privacy_status=privacy_status,
+            privacy_status=p.get("privacy_status", "private"),
         )
 
         v.youtube_id = res.get("youtube_id")
@@ -107,13 +134,8 @@ def publish(payload: dict, user_id: str = Depends(require_user_id), db: Session
         db.refresh(v)
 
         return {"youtube_id": v.youtube_id, "youtube_url": v.youtube_url, "status": v.status}
-    except Exception as e:
-        v.status = "error"
-        v.error_message = f"Publish failed: {e}"
-        db.add(v); db.commit()
-        raise HTTPException(500, v.error_message)
     finally:
-        if local_path and (local_path.startswith("/tmp") or "tmp" in local_path):
+        if local_path and is_temp:
             try:
                 os.remove(local_path)
             except Exception:
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import AnyHttpUrl
+from pydantic import AnyHttpUrl, field_validator
 from typing import List, Optional
 
 class Settings(BaseSettings):
@@ -16,10 +16,105 @@ class Settings(BaseSettings):
     N8N_CLOUD_SYNC_URL: Optional[str] = None  # n8n webhook for cloud file operations
     DEFAULT_LANGUAGE_CODE: str = "en"
 
-    # Upload storage
+    # OpenRouter (metadata, confidentiality, translation)
+    OPENROUTER_API_KEY: Optional[str] = None
+    OPENROUTER_MODEL: str = "openai/gpt-4o-mini"
+    OPENROUTER_SITE_URL: str = "http://localhost:8088"
+    OPENROUTER_APP_NAME: str = "Video Studio"
+    # Response cache for metadata/confidentiality prompts: in-process LRU entries, then Postgres rows kept this long
+    LLM_CACHE_SIZE: int = 256
+    LLM_CACHE_TTL_SECONDS: int = 7 * 86400
+
+    # Shared outbound HTTP clients (services/http_clients.py): negotiate HTTP/2 with TLS upstreams
+    HTTP2_ENABLED: bool = True
+
+    # Upload storage. With STORAGE_BACKEND=s3, UPLOAD_DIR is only local scratch space
+    # (incoming uploads, resumable upload part files).
+    STORAGE_BACKEND: str = "local"  # local | s3
     UPLOAD_DIR: str = "/data/uploads"
     MAX_UPLOAD_MB: int = 2000
 
+    # Resumable upload sessions (/video/uploads)
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    UPLOAD_SESSION_SWEEP_SECONDS: int = 600
+
+    # S3-compatible object storage (AWS S3, MinIO, ...); used when STORAGE_BACKEND=s3
+    S3_BUCKET: Optional[str] = None
+    S3_ENDPOINT_URL: Optional[str] = None  # e.g. http://minio:9000; unset for AWS
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_PRESIGN_SECONDS: int = 3600
+    # Objects replaced by the fast-start remux are deleted this long after the swap (handed-out URLs expire first)
+    RETIRED_BLOB_GRACE_HOURS: int = 24
+    S3_MULTIPART_CHUNK_MB: int = 16
+    S3_MAX_CONCURRENCY: int = 8
+
+    # Background move of legacy flat <user_id>/<file> uploads into the sharded layout
+    LAYOUT_MIGRATION_ENABLED: bool = True
+    LAYOUT_MIGRATION_BATCH_SIZE: int = 200
+    LAYOUT_MIGRATION_PAUSE_SECONDS: float = 0.5
+
+    # Server-side ingest (/video/ingest): parallel HTTP Range download when the origin supports it
+    INGEST_PARALLEL_PARTS: int = 4
+    INGEST_MIN_PART_MB: int = 8
+
+    # Media processing (ffprobe/ffmpeg) process pool; 0 = one worker per CPU core
+    MEDIA_WORKERS: int = 0
+    FFMPEG_BIN: str = "ffmpeg"
+    FFPROBE_BIN: str = "ffprobe"
+
+    # Audio track sent to the transcriber instead of the full video: opus | flac
+    TRANSCRIBE_AUDIO_FORMAT: str = "opus"
+
+    # Segmented transcription: media longer than 1.5x this is split at silences and the
+    # chunks transcribed in parallel (0 = always one call)
+    TRANSCRIBE_SEGMENT_SECONDS: int = 600
+    TRANSCRIBE_SEGMENT_OVERLAP_SECONDS: float = 2.0
+    TRANSCRIBE_PARALLELISM: int = 4
+    TRANSCRIBE_SILENCE_DB: float = -35.0
+    TRANSCRIBE_SILENCE_MIN_SECONDS: float = 0.4
+    # Part of the transcription cache key; bump when the n8n transcription workflow/model changes
+    TRANSCRIBER_VERSION: str = "1"
+    # Callback mode: n8n gets a signed callback_url, acknowledges at once and POSTs {text, srt}
+    # to /video/{id}/caption/callback when done; no connection is held meanwhile.
+    # Needs CALLBACK_SECRET. Segmented transcription (short chunks) still waits for each chunk.
+    TRANSCRIBE_CALLBACK_MODE: bool = False
+    TRANSCRIBE_CALLBACK_TIMEOUT_SECONDS: int = 3 * 3600  # no callback by then = failed attempt, resubmitted
+    CALLBACK_SECRET: Optional[str] = None  # HMAC key for signed callback URLs
+    # Where external services reach the API (the proxy's /api prefix included); default PUBLIC_BASE_URL
+    CALLBACK_BASE_URL: Optional[str] = None
+
+    # Low-bitrate preview proxies for editing/review (heights; sources at or below a height skip it)
+    PREVIEW_RENDITIONS: str = "480,720"
+
+    # Timeline sprite sheets for the caption editor (one tile every N seconds, fewer on long files)
+    TIMELINE_INTERVAL_SECONDS: float = 5.0
+    TIMELINE_MAX_FRAMES: int = 400
+    TIMELINE_TILE_WIDTH: int = 160
+
+    # Background jobs (caption, metadata, publish), run by `python -m app.worker`
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_POLL_SECONDS: float = 1.0
+    JOB_LEASE_SECONDS: int = 60
+    JOB_RETRY_BASE_SECONDS: int = 10
+    JOB_RETRY_MAX_SECONDS: int = 600
+
+    # Caption translation fan-out, per worker process (not cluster-wide): model calls in flight overall and per user
+    TRANSLATE_WORKER_CONCURRENCY: int = 8
+    TRANSLATE_PER_USER_WORKER_CONCURRENCY: int = 4
+    # Cues per model call are packed up to about this many input tokens; a rejected batch is retried alone
+    TRANSLATE_BATCH_TOKENS: int = 1500
+    TRANSLATE_BATCH_RETRIES: int = 2
+    # 429/5xx/timeouts from OpenRouter are retried per call with exponential backoff this many times
+    TRANSLATE_TRANSIENT_RETRIES: int = 4
+    # Translation memory default scope: "global" (shared), "user" (per owner) or "off"; a request may override it
+    TRANSLATION_MEMORY_SCOPE: str = "global"
+
+    # /uploads serving: when set (e.g. "/_uploads_internal/"), respond with X-Accel-Redirect
+    # to this internal nginx location instead of streaming the file from Python
+    MEDIA_ACCEL_REDIRECT_PREFIX: Optional[str] = None
+
     # CORS
     CORS_ORIGINS: str = "*"  # comma-separated or "*"
 
@@ -32,4 +127,12 @@ class Settings(BaseSettings):
     YOUTUBE_REDIRECT_URI: Optional[str] = None
     YOUTUBE_SCOPES: str = "https://www.googleapis.com/auth/youtube.upload https://www.googleapis.com/auth/youtube.readonly"
 
+    @field_validator("*", mode="before")
+    @classmethod
+    def _blank_means_unset(cls, value, info):
+        # docker-compose passes unset variables as "" (${VAR:-}); for optional settings that means "not configured"
+        if value == "" and cls.model_fields[info.field_name].default is None:
+            return None
+        return value
+
 settings = Settings()
@@ -1,15 +1,28 @@
+import asyncio
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
 from app.db import init_engine
+from app.metrics import snapshot, worker_gauges
+from app.api_uploads import router as uploads_router
 from app.api_videos import router as video_router
+from app.api_clips import router as clips_router
 from app.api_youtube import router as youtube_router
 from app.api_ai import router as ai_router
 from app.api_cloud import router as cloud_router
 from app.api_publish import router as publish_router
+from app.api_media import router as media_router
+from app.api_jobs import router as jobs_router
+from app.services.upload_sessions import run_sweeper as run_upload_session_sweeper
+from app.services.storage import get_storage
+from app.services.media_pool import shutdown_pool as shutdown_media_pool
+from app.services.layout_migration import run_in_background as run_layout_migration
+from app.services.faststart import run_retired_sweeper
+from app.services.openrouter import run_cache_sweeper as run_llm_cache_sweeper
+from app.services.callbacks import check_config as check_callback_config
+from app.services.http_clients import close_clients, open_clients, pool_stats
 
 app = FastAPI(title="Video Studio API", version="1.0.0")
 
@@ -17,19 +30,53 @@ app = FastAPI(title="Video Studio API", version="1.0.0")
 def startup():
     init_engine(settings.DATABASE_URL)
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    get_storage()  # fail fast on a misconfigured backend
+    check_callback_config()
+
+@app.on_event("startup")
+async def open_http_clients():
+    await open_clients()
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # keep references so the tasks are not garbage collected
+    app.state.background_tasks = [
+        asyncio.create_task(run_upload_session_sweeper()),
+    ]
+    app.state.background_tasks.append(asyncio.create_task(run_retired_sweeper()))
+    app.state.background_tasks.append(asyncio.create_task(run_llm_cache_sweeper()))
+    if settings.LAYOUT_MIGRATION_ENABLED:
+        app.state.background_tasks.append(asyncio.create_task(run_layout_migration()))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
+    shutdown_media_pool()
+    await close_clients()
 
 origins = ["*"] if settings.CORS_ORIGINS.strip() == "*" else [x.strip() for x in settings.CORS_ORIGINS.split(",") if x.strip()]
 app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
+app.include_router(uploads_router)
 app.include_router(video_router)
+app.include_router(clips_router)
 app.include_router(youtube_router)
 app.include_router(ai_router)
 app.include_router(cloud_router)
 app.include_router(publish_router)
+app.include_router(jobs_router)
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
-# public files for n8n: /uploads/<user_id>/<file>
-app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+@app.get("/metrics")
+def metrics():
+    return {
+        "counters": snapshot(),
+        "http_pools": {"api": pool_stats(), "workers": worker_gauges()},
+    }
+
+# public files for n8n and the editor: /uploads/<path> (Range, ETag, sendfile / X-Accel-Redirect)
+app.include_router(media_router)
@@ -0,0 +1,97 @@
+"""
+Counters shared by the API and worker processes.
+
+Values live in the metric_counters table, so a hit counted by a worker and
+one counted by an API replica end up in the same number. Only for
+per-request events (cache hits, upstream calls), not per-byte hot paths.
+GET /metrics returns them all.
+
+Gauges (HTTP connection pools) only make sense per process. Each worker
+publishes its own every GAUGE_PUBLISH_SECONDS into worker_gauges, one row
+per worker id; rows not refreshed for a few intervals belong to workers
+that are gone and are no longer served.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+
+from app.db import SessionLocal
+from app.models import MetricCounter, WorkerGauges
+
+log = logging.getLogger(__name__)
+
+GAUGE_PUBLISH_SECONDS = 15
+_GAUGE_STALE_INTERVALS = 4
+_GAUGE_DROP_INTERVALS = 240
+
+def incr(name: str, n: int = 1) -> None:
+    """Add n to counter `name`. Never raises: a lost increment must not fail the request."""
+    if n <= 0:
+        return
+    db = SessionLocal()
+    try:
+        stmt = insert(MetricCounter).values(name=name, value=n)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[MetricCounter.name],
+            set_={"value": MetricCounter.value + n, "updated_at": func.now()},
+        ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        log.warning("Could not update counter %s", name, exc_info=True)
+    finally:
+        db.close()
+
+def snapshot() -> dict[str, int]:
+    db = SessionLocal()
+    try:
+        return {c.name: c.value for c in db.query(MetricCounter).order_by(MetricCounter.name).all()}
+    finally:
+        db.close()
+
+def publish_gauges(worker_id: str, gauges: dict) -> None:
+    """Store this worker's current gauges and drop rows of workers long gone. Never raises."""
+    db = SessionLocal()
+    try:
+        stmt = insert(WorkerGauges).values(worker_id=worker_id, gauges=gauges)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[WorkerGauges.worker_id],
+            set_={"gauges": gauges, "updated_at": func.now()},
+        ))
+        cutoff = datetime.utcnow() - timedelta(seconds=GAUGE_PUBLISH_SECONDS * _GAUGE_DROP_INTERVALS)
+        db.query(WorkerGauges).filter(WorkerGauges.updated_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        log.warning("Could not publish gauges for %s", worker_id, exc_info=True)
+    finally:
+        db.close()
+
+def withdraw_gauges(worker_id: str) -> None:
+    """Remove a stopping worker's row. Never raises."""
+    db = SessionLocal()
+    try:
+        db.query(WorkerGauges).filter(WorkerGauges.worker_id == worker_id).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        log.warning("Could not withdraw gauges for %s", worker_id, exc_info=True)
+    finally:
+        db.close()
+
+def worker_gauges() -> dict[str, dict]:
+    """{worker_id: {"updated_at", **gauges}} for workers that published recently."""
+    cutoff = datetime.utcnow() - timedelta(seconds=GAUGE_PUBLISH_SECONDS * _GAUGE_STALE_INTERVALS)
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(WorkerGauges)
+            .filter(WorkerGauges.updated_at >= cutoff)
+            .order_by(WorkerGauges.worker_id)
+            .all()
+        )
+        return {r.worker_id: {"updated_at": r.updated_at.isoformat() + "Z", **r.gauges} for r in rows}
+    finally:
+        db.close()
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Text, Boolean, ForeignKey, DateTime, JSON
+    Column, Integer, BigInteger, String, Text, Boolean, ForeignKey, DateTime, JSON
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.sql import func
@@ -75,11 +75,12 @@ class Video(Base):
 
     original_filename = Column(Text, nullable=False)
     storage_path = Column(Text, nullable=False)  # public URL or internal path; we also expose /uploads publicly
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 of the stored file (media_blobs.sha256)
     status = Column(Text, nullable=False, default="uploading")
 
     # transcription
     transcript = Column(Text, nullable=True)
-    captions = Column(JSONB, nullable=True)  # keep JSONB for compatibility (can also store SRT in JSONB as {srt:...})
+    # captions live in video_captions, one row per language; `language` is the primary one
     # metadata
     title = Column(Text, nullable=True)
     description = Column(Text, nullable=True)
@@ -96,6 +97,8 @@ class Video(Base):
 
     # editing
     duration_ms = Column(Integer, nullable=True)
+    media_info = Column(JSONB, nullable=True)  # ffprobe summary: codecs, resolution, bitrate, keyframe interval
+    renditions = Column(JSONB, nullable=True)  # low-bitrate preview proxies: {"480p": {"url", "width", "height", ...}}
     suggested_start_ms = Column(Integer, nullable=True)
     trim_start_ms = Column(Integer, nullable=True)
     trim_end_ms = Column(Integer, nullable=True)
@@ -114,6 +117,20 @@ class Video(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+class VideoCaption(Base):
+    """
+    One caption track of a video. Timed tracks keep their cues in the compact
+    array form of services/captions.py; untimed ones a plain text.
+    """
+    __tablename__ = "video_captions"
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), primary_key=True)
+    language = Column(Text, primary_key=True)
+    format = Column(Text, nullable=False, default="srt")  # srt (timed cues) | text
+    cues = Column(JSONB, nullable=True)  # {"start_ms", "end_ms", "offsets", "text"}
+    content = Column(Text, nullable=True)  # untimed text
+    url = Column(Text, nullable=True)  # externally hosted caption file
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
 class VideoIngestRequest(Base):
     __tablename__ = "video_ingest_requests"
     id = Column(Integer, primary_key=True)
@@ -121,7 +138,7 @@ class VideoIngestRequest(Base):
     provider = Column(Text, nullable=False)
     source_path = Column(Text, nullable=False)
     source_file_name = Column(Text, nullable=False)
-    source_file_size = Column(Integer, nullable=True)
+    source_file_size = Column(BigInteger, nullable=True)
 
     status = Column(Text, nullable=False, default="queued")
     progress = Column(JSONB, nullable=True)
@@ -134,3 +151,173 @@ class VideoIngestRequest(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
+
+class UploadSession(Base):
+    """
+    Resumable upload in progress. Chunks are written in place into temp_path;
+    `received` holds the merged [start, end) byte ranges and `offset` the
+    contiguous prefix, which is what clients resume from.
+    """
+    __tablename__ = "upload_sessions"
+    id = Column(String, primary_key=True)  # random hex token, also used in URLs
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    filename = Column(Text, nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    offset = Column(BigInteger, nullable=False, default=0)
+    received = Column(JSONB, nullable=True)
+    status = Column(Text, nullable=False, default="open")  # open|complete
+    temp_path = Column(Text, nullable=False)
+    video_id = Column(Integer, ForeignKey("videos.id"), nullable=True)
+
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class MediaBlob(Base):
+    """A stored file, addressed by the sha256 of its content. Shared by every upload of the same bytes."""
+    __tablename__ = "media_blobs"
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    path = Column(Text, nullable=False)  # relative to UPLOAD_DIR, e.g. blobs/ab/cd/<sha256>.mp4
+    # sha256 of the bytes at `path` when they differ from the upload's (fast-start remux)
+    stored_sha256 = Column(String(64), nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+class RetiredBlobObject(Base):
+    """
+    A stored object replaced by a new one (fast-start remux). Kept for
+    RETIRED_BLOB_GRACE_HOURS so URLs already handed out keep working, then
+    deleted once no video points at it.
+    """
+    __tablename__ = "retired_blob_objects"
+    path = Column(Text, primary_key=True)
+    sha256 = Column(String(64), nullable=False)  # the blob it belonged to
+    retired_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+class UserMedia(Base):
+    """Per-user reference to a blob; one row per video that points at it."""
+    __tablename__ = "user_media"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    sha256 = Column(String(64), ForeignKey("media_blobs.sha256"), nullable=False)
+    video_id = Column(Integer, ForeignKey("videos.id"), nullable=True)
+    original_filename = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+class MaintenanceState(Base):
+    """Progress of long-running background maintenance tasks (e.g. the upload layout migration), keyed by task name."""
+    __tablename__ = "maintenance_state"
+    name = Column(Text, primary_key=True)
+    state = Column(JSONB, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class MediaProbe(Base):
+    """Cached ffprobe results per blob, so a re-uploaded file is never probed twice."""
+    __tablename__ = "media_probes"
+    content_hash = Column(String(64), primary_key=True)
+    info = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+class MediaDerivative(Base):
+    """
+    A file generated from a blob (timeline sprite, keyframe index, preview
+    rendition, audio track). Keyed by content hash, so it is built once and
+    shared by every video with the same bytes.
+    """
+    __tablename__ = "media_derivatives"
+    content_hash = Column(String(64), primary_key=True)
+    kind = Column(Text, primary_key=True)  # e.g. timeline_sprite, keyframe_index
+    path = Column(Text, nullable=False)  # storage key
+    info = Column(JSONB, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+class Job(Base):
+    """
+    Durable background job (caption, metadata, publish). Claimed by workers
+    with SELECT ... FOR UPDATE SKIP LOCKED; a running job holds a lease that
+    its worker keeps extending, so jobs of a crashed worker are picked up
+    again once the lease runs out.
+    """
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(Text, nullable=False)
+    user_id = Column(String, ForeignKey("users.id"), nullable=True)
+    video_id = Column(Integer, ForeignKey("videos.id"), nullable=True)
+    payload = Column(JSONB, nullable=True)
+
+    status = Column(Text, nullable=False, default="queued")  # queued|running|waiting|done|failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False, server_default=func.now())
+    locked_by = Column(Text, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
+    result = Column(JSONB, nullable=True)
+    progress = Column(JSONB, nullable=True)  # handler-defined, updated while running (jobs.report_progress)
+    error_message = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+class TranscriptionCache(Base):
+    """
+    Transcriber output for one audio track and language. Keyed by the hash of
+    the audio actually sent (so re-uploads and duplicate videos share it) and
+    TRANSCRIBER_VERSION, which is bumped when the n8n workflow/model changes.
+    """
+    __tablename__ = "transcription_cache"
+    audio_hash = Column(String(64), primary_key=True)
+    language = Column(Text, primary_key=True)
+    transcriber_version = Column(Text, primary_key=True)
+    text = Column(Text, nullable=True)
+    srt = Column(Text, nullable=True)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    last_hit_at = Column(DateTime, nullable=True)
+
+class MetricCounter(Base):
+    """Monotonic counter shared by API and worker processes (see app/metrics.py)."""
+    __tablename__ = "metric_counters"
+    name = Column(Text, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class WorkerGauges(Base):
+    """Latest point-in-time gauges (HTTP pools) published by one worker process (see app/metrics.py)."""
+    __tablename__ = "worker_gauges"
+    worker_id = Column(Text, primary_key=True)
+    gauges = Column(JSONB, nullable=False)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+class TranslationMemory(Base):
+    """
+    A caption line translated before. Keyed by the sha256 of the normalized
+    source line, the language pair and the model; scope is "" for the shared
+    memory or a user id for a per-user one.
+    """
+    __tablename__ = "translation_memory"
+    scope = Column(Text, primary_key=True, default="")
+    source_hash = Column(String(64), primary_key=True)
+    source_lang = Column(Text, primary_key=True)
+    target_lang = Column(Text, primary_key=True)
+    model = Column(Text, primary_key=True)
+    source_text = Column(Text, nullable=False)
+    target_text = Column(Text, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    last_hit_at = Column(DateTime, nullable=True)
+
+class LLMResponse(Base):
+    """
+    A cached chat completion, keyed by the sha256 of (model, system prompt,
+    user prompt, temperature). Rows past expires_at are never served.
+    """
+    __tablename__ = "llm_responses"
+    key = Column(String(64), primary_key=True)
+    model = Column(Text, nullable=False)
+    response = Column(Text, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,96 @@
+"""
+Audio-only track for transcription.
+
+The transcriber only needs the speech, so instead of the full video it is
+handed a mono 16 kHz Opus/FLAC file (TRANSCRIBE_AUDIO_FORMAT), typically a
+few percent of the video's size. The track is extracted once per blob in
+the media process pool and stored as a derived file; it does not depend on
+the caption language, so every transcription of those bytes reuses it.
+"""
+import logging
+import os
+import shutil
+import uuid
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Video
+from app.services import ffmpeg
+from app.services.blobs import hash_file, incoming_dir
+from app.services.derivatives import get_derivatives, save_derivative
+from app.services.media import public_path_url
+from app.services.media_pool import run_in_pool
+from app.services.storage import media_source
+
+log = logging.getLogger(__name__)
+
+def audio_kind() -> str:
+    return f"transcribe_audio_{settings.TRANSCRIBE_AUDIO_FORMAT}"
+
+def _load(video_id: int):
+    db = SessionLocal()
+    try:
+        v = db.query(Video).filter(Video.id == video_id).first()
+        if not v or not v.content_hash:
+            return None
+        existing = get_derivatives(db, v.content_hash, [audio_kind()]).get(audio_kind())
+        return v.content_hash, v.storage_path, v.media_info or {}, existing.path if existing else None
+    finally:
+        db.close()
+
+def _save(sha256: str, path: str, info: dict) -> str:
+    ext, _ = ffmpeg.TRANSCRIBE_AUDIO_CODECS[settings.TRANSCRIBE_AUDIO_FORMAT]
+    info = {**info, "sha256": hash_file(path)}  # transcription cache key (services/transcription_cache.py)
+    db = SessionLocal()
+    try:
+        return save_derivative(db, sha256, audio_kind(), path, f"audio.{ext}", info).path
+    finally:
+        db.close()
+
+async def ensure_audio(video_id: int) -> Optional[str]:
+    """
+    Public URL of the video's transcription audio, extracting it first if
+    needed. None when the video is not stored yet or has no audio stream.
+    """
+    ctx = await run_in_threadpool(_load, video_id)
+    if not ctx:
+        return None
+    sha256, storage_path, media_info, key = ctx
+    if key:
+        return public_path_url(key)
+    if media_info and not media_info.get("audio"):
+        return None
+
+    ext, _ = ffmpeg.TRANSCRIBE_AUDIO_CODECS[settings.TRANSCRIBE_AUDIO_FORMAT]
+    workdir = os.path.join(incoming_dir(), f"audio_{video_id}_{uuid.uuid4().hex}")
+    await run_in_threadpool(os.makedirs, workdir, exist_ok=True)
+    try:
+        out = os.path.join(workdir, f"audio.{ext}")
+        info = await run_in_pool(ffmpeg.extract_audio, media_source(storage_path), out, settings.TRANSCRIBE_AUDIO_FORMAT)
+        key = await run_in_threadpool(_save, sha256, out, info)
+    finally:
+        await run_in_threadpool(shutil.rmtree, workdir, True)
+    return public_path_url(key)
+
+def audio_hash(db: Session, v: Video) -> Optional[str]:
+    """Hash of what the transcriber hears: the extracted track if there is one, else the video's own bytes."""
+    if not v.content_hash:
+        return None
+    existing = get_derivatives(db, v.content_hash, [audio_kind()]).get(audio_kind())
+    return ((existing.info or {}).get("sha256") if existing else None) or v.content_hash
+
+async def build_audio(video_id: int) -> None:
+    await ensure_audio(video_id)
+
+async def transcription_source_url(v: Video) -> str:
+    """What to hand the transcriber: the audio track when we can make one, else the video itself."""
+    try:
+        url = await ensure_audio(v.id)
+    except Exception:
+        log.exception("Audio extraction failed for video %s; sending the video", v.id)
+        url = None
+    return url or v.storage_path
@@ -0,0 +1,118 @@
+"""
+Content-addressed media store.
+
+Uploaded files are kept once under the storage key blobs/<aa>/<bb>/<sha256><ext>
+and shared by every video with the same bytes; per-user ownership lives in
+user_media. Files arrive in UPLOAD_DIR/.incoming first; with local storage
+that is the same filesystem, so moving them into place is a rename.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import MediaBlob, UserMedia, Video
+from app.services import caption_store
+from app.services.storage import get_storage
+
+HASH_READ_BYTES = 4 * 1024 * 1024
+
+_BLOB_KEY_RE = re.compile(r"^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.[^/]*$")
+
+def incoming_dir() -> str:
+    return os.path.join(settings.UPLOAD_DIR, ".incoming")
+
+def blob_relpath(sha256: str, ext: str) -> str:
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+def blob_ext(filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    return ext if ext and len(ext) <= 8 else ".mp4"
+
+def hash_file(path: str) -> str:
+    """sha256 of a file, for data that was not hashed while streaming (e.g. resumable uploads)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_BYTES), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def store_blob(db: Session, tmp_path: str, sha256: str, size: int, ext: str) -> MediaBlob:
+    """
+    Move `tmp_path` into the store under its hash, or drop it if the blob is
+    already there. Returns the (committed) MediaBlob row.
+    """
+    storage = get_storage()
+    # Locked: a fast-start swap in progress commits its new path before we read it
+    blob = db.query(MediaBlob).filter(MediaBlob.sha256 == sha256).with_for_update().first()
+    if blob and storage.exists(blob.path):
+        os.remove(tmp_path)
+        return blob
+
+    relpath = blob.path if blob else blob_relpath(sha256, ext)
+    storage.put_file(relpath, tmp_path, mimetypes.guess_type(relpath)[0])
+
+    if blob:
+        return blob
+    blob = MediaBlob(sha256=sha256, size=size, path=relpath)
+    db.add(blob)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent upload of the same bytes won the insert; the object we
+        # stored over theirs has identical content.
+        db.rollback()
+        blob = db.query(MediaBlob).filter(MediaBlob.sha256 == sha256).one()
+    return blob
+
+def current_blob_key(relpath: str) -> Optional[str]:
+    """
+    Current key of the blob a (possibly outdated) blobs/... key named, e.g.
+    after the fast-start stage replaced the file. None if it is not a blob key.
+    """
+    m = _BLOB_KEY_RE.match(relpath)
+    if not m:
+        return None
+    db = SessionLocal()
+    try:
+        blob = db.query(MediaBlob).filter(MediaBlob.sha256 == m.group(1)).first()
+        return blob.path if blob and blob.path != relpath else None
+    finally:
+        db.close()
+
+def add_reference(db: Session, user_id: str, sha256: str, video_id: int, filename: str) -> None:
+    db.add(UserMedia(user_id=user_id, sha256=sha256, video_id=video_id, original_filename=filename))
+    db.commit()
+
+def find_transcribed_duplicate(db: Session, v: Video, language_code: str) -> Optional[Video]:
+    """
+    Another video of the same user with the same content (same blob hash, or
+    the same remote URL for ingests that were never hashed) that already has
+    captions in `language_code`. Copies carry edited captions, so they are
+    never taken from other users; the transcription cache shares the
+    transcriber's unedited output across users instead.
+    """
+    if v.content_hash:
+        same_content = Video.content_hash == v.content_hash
+    elif v.storage_path and v.storage_path.startswith(("http://", "https://")):
+        same_content = Video.storage_path == v.storage_path
+    else:
+        return None
+    return (
+        db.query(Video)
+        .filter(
+            same_content,
+            Video.user_id == v.user_id,
+            Video.id != v.id,
+            Video.language == language_code,
+            caption_store.has_track(language_code),
+        )
+        .order_by(Video.updated_at.desc())
+        .first()
+    )
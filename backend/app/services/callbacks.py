@@ -0,0 +1,46 @@
+"""
+Signed callback URLs for external services (n8n) that report results later.
+
+The URL carries an expiry and an HMAC-SHA256 over the path and all query
+parameters, keyed with CALLBACK_SECRET, so only the service we handed the
+URL to can post to it, only for that video/job, and only until it expires.
+"""
+import hashlib
+import hmac
+import time
+from urllib.parse import urlencode
+
+from app.config import settings
+
+def _sign(path: str, params: dict) -> str:
+    if not settings.CALLBACK_SECRET:
+        raise RuntimeError("CALLBACK_SECRET is not set")
+    message = f"{path}?{urlencode(sorted((k, str(v)) for k, v in params.items()))}"
+    return hmac.new(settings.CALLBACK_SECRET.encode("utf-8"), message.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def check_config() -> None:
+    """Fail at startup, not per job, when callback mode cannot sign its URLs."""
+    if settings.TRANSCRIBE_CALLBACK_MODE and not settings.CALLBACK_SECRET:
+        raise RuntimeError("TRANSCRIBE_CALLBACK_MODE needs CALLBACK_SECRET")
+
+def signed_url(path: str, ttl_seconds: int, **params) -> str:
+    """
+    Absolute URL for the API route `path` with params, expires and sig. The
+    signature covers the API-side path; the URL starts with CALLBACK_BASE_URL
+    (e.g. https://host/api behind the reverse proxy), default PUBLIC_BASE_URL.
+    """
+    params["expires"] = int(time.time()) + ttl_seconds
+    base = (settings.CALLBACK_BASE_URL or settings.PUBLIC_BASE_URL).rstrip("/")
+    return f"{base}{path}?{urlencode({**params, 'sig': _sign(path, params)})}"
+
+def verify(path: str, query: dict) -> bool:
+    """Check a callback request's query parameters (including expires and sig) against its path."""
+    params = {k: v for k, v in query.items() if k != "sig"}
+    sig = query.get("sig")
+    try:
+        expires = int(params.get("expires") or 0)
+    except ValueError:
+        return False
+    if not settings.CALLBACK_SECRET or not sig or expires < time.time():
+        return False
+    return hmac.compare_digest(_sign(path, params), sig)
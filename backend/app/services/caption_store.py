@@ -0,0 +1,111 @@
+"""
+Per-language caption rows (video_captions).
+
+Every write touches one (video, language) row, so adding a translation does
+not rewrite the other languages and two writers adding different languages
+do not overwrite each other. Reads ask for the languages they need; lists
+fetch the primary track (Video.language, else any) of all videos in one
+query. Tracks are the dicts of services/captions.py.
+"""
+from typing import Iterable, Optional
+
+from sqlalchemy import exists
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.models import Video, VideoCaption
+from app.services import captions
+
+def _to_track(row: VideoCaption) -> dict:
+    track: dict = {"format": row.format}
+    if row.cues:
+        track["cues"] = row.cues
+    elif row.content is not None:
+        track["text"] = row.content
+    if row.url:
+        track["url"] = row.url
+    return track
+
+def _columns(track: dict) -> dict:
+    return {
+        "format": "srt" if track.get("cues") else "text" if track.get("text") is not None else track.get("format") or "srt",
+        "cues": track.get("cues"),
+        "content": track.get("text"),
+        "url": track.get("url"),
+    }
+
+def get_tracks(db: Session, video_id: int, languages: Optional[Iterable[str]] = None) -> dict[str, dict]:
+    q = db.query(VideoCaption).filter(VideoCaption.video_id == video_id)
+    if languages is not None:
+        q = q.filter(VideoCaption.language.in_(list(languages)))
+    return {row.language: _to_track(row) for row in q.order_by(VideoCaption.language).all()}
+
+def get_track(db: Session, v: Video, language: Optional[str] = None) -> Optional[dict]:
+    """The track for `language`, or the primary track (Video.language, else the first stored)."""
+    wanted = language or v.language
+    if wanted:
+        row = db.query(VideoCaption).filter(VideoCaption.video_id == v.id, VideoCaption.language == wanted).first()
+        if row or language:
+            return _to_track(row) if row else None
+    row = db.query(VideoCaption).filter(VideoCaption.video_id == v.id).order_by(VideoCaption.language).first()
+    return _to_track(row) if row else None
+
+def primary_tracks(db: Session, videos: list[Video]) -> dict[int, dict]:
+    """{video_id: primary track} for many videos with one query (plus one for videos without a Video.language track)."""
+    if not videos:
+        return {}
+    ids = [v.id for v in videos]
+    rows = (
+        db.query(VideoCaption)
+        .join(Video, Video.id == VideoCaption.video_id)
+        .filter(VideoCaption.video_id.in_(ids), VideoCaption.language == Video.language)
+        .all()
+    )
+    out = {row.video_id: _to_track(row) for row in rows}
+    missing = [i for i in ids if i not in out]
+    if missing:
+        rows = (
+            db.query(VideoCaption)
+            .filter(VideoCaption.video_id.in_(missing))
+            .order_by(VideoCaption.video_id, VideoCaption.language)
+            .distinct(VideoCaption.video_id)
+            .all()
+        )
+        out.update({row.video_id: _to_track(row) for row in rows})
+    return out
+
+def languages(db: Session, video_id: int) -> list[str]:
+    return [l for (l,) in db.query(VideoCaption.language).filter(VideoCaption.video_id == video_id).order_by(VideoCaption.language)]
+
+def put_track(db: Session, video_id: int, language: str, track: dict) -> None:
+    """Insert or replace one language (not committed)."""
+    values = _columns(track)
+    stmt = insert(VideoCaption).values(video_id=video_id, language=language, **values)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[VideoCaption.video_id, VideoCaption.language],
+        set_={**values, "updated_at": func.now()},
+    ))
+
+def replace_all(db: Session, video_id: int, tracks: dict[str, dict]) -> None:
+    """Make `tracks` the video's only captions (not committed)."""
+    db.query(VideoCaption).filter(VideoCaption.video_id == video_id).delete(synchronize_session=False)
+    for language, track in tracks.items():
+        put_track(db, video_id, language, track)
+
+def delete_track(db: Session, video_id: int, language: str) -> None:
+    """Remove one language (not committed)."""
+    db.query(VideoCaption).filter(
+        VideoCaption.video_id == video_id, VideoCaption.language == language
+    ).delete(synchronize_session=False)
+
+def copy_tracks(db: Session, src_video_id: int, dest_video_id: int) -> None:
+    replace_all(db, dest_video_id, get_tracks(db, src_video_id))
+
+def has_track(language: str):
+    """SQL condition: the Video has captions in `language`."""
+    return exists().where(VideoCaption.video_id == Video.id, VideoCaption.language == language)
+
+def export_list(db: Session, video_id: int) -> list[dict]:
+    """[{"language", "format", "content", "url"}] per language, for n8n publishing."""
+    return captions.export_list({"tracks": get_tracks(db, video_id)})
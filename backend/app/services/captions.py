@@ -0,0 +1,266 @@
+"""
+Caption cues and caption documents.
+
+Cues are held as parallel arrays: start_ms, end_ms and offsets into one
+text string (cue i is text[offsets[i]:offsets[i + 1]]). That is what is
+stored, so reading captions never means re-scanning SRT, and rendering SRT
+or WebVTT is a single join.
+
+A track is {"format": "srt", "cues": {...}} (timed) or {"format": "text",
+"text": ...} (untimed), optionally with a "url". Tracks are stored one row
+per language in video_captions (services/caption_store.py). A whole set of
+languages travels as a versioned document:
+
+    {
+      "version": 2,
+      "primary": "en",
+      "tracks": {
+        "en": {"format": "srt", "cues": {"start_ms": [...], "end_ms": [...], "offsets": [...], "text": "..."}},
+        "fr": {"format": "text", "text": "untimed transcript"}
+      }
+    }
+
+normalize() turns every older shape ({"srt": ...}, {"en": {"content": ...}},
+plain strings) into that document, and rebuilds version 2 documents from
+their parts, so malformed input raises CaptionError instead of being
+stored. Stdlib only: migrations import this module.
+"""
+import re
+from array import array
+from typing import Iterable, Iterator, Optional, Union
+
+SCHEMA_VERSION = 2
+
+_TS = r"(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})"
+_TIMING_RE = re.compile(rf"^\s*{_TS}\s*-->\s*{_TS}")
+_VTT_BLOCKS = ("WEBVTT", "NOTE", "STYLE", "REGION")
+
+class CaptionError(ValueError):
+    """Caption input that cannot be stored (bad cue arrays, wrong types)."""
+
+def _ms(h: Optional[str], m: str, s: str, frac: str) -> int:
+    return ((int(h or 0) * 60 + int(m)) * 60 + int(s)) * 1000 + int(frac.ljust(3, "0"))
+
+def _stamp(ms: int, sep: str) -> str:
+    h, ms = divmod(max(0, ms), 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}{sep}{ms:03d}"
+
+class Cues:
+    """An immutable run of timed caption cues in parallel arrays."""
+    __slots__ = ("start_ms", "end_ms", "offsets", "text")
+
+    def __init__(self, start_ms: array, end_ms: array, offsets: array, text: str):
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.offsets = offsets
+        self.text = text
+
+    @classmethod
+    def build(cls, cues: Iterable[tuple[int, int, str]]) -> "Cues":
+        start, end, offsets, parts, pos = array("q"), array("q"), array("q", [0]), [], 0
+        for s, e, t in cues:
+            start.append(int(s))
+            end.append(int(e))
+            parts.append(t)
+            pos += len(t)
+            offsets.append(pos)
+        return cls(start, end, offsets, "".join(parts))
+
+    def __len__(self) -> int:
+        return len(self.start_ms)
+
+    def __iter__(self) -> Iterator[tuple[int, int, str]]:
+        t, o = self.text, self.offsets
+        for i in range(len(self.start_ms)):
+            yield self.start_ms[i], self.end_ms[i], t[o[i]:o[i + 1]]
+
+    def texts(self) -> list[str]:
+        t, o = self.text, self.offsets
+        return [t[o[i]:o[i + 1]] for i in range(len(self.start_ms))]
+
+    def with_texts(self, texts: list[str]) -> "Cues":
+        """Same timings, new text per cue (translation)."""
+        if len(texts) != len(self):
+            raise ValueError(f"expected {len(self)} cue texts, got {len(texts)}")
+        return Cues.build(zip(self.start_ms, self.end_ms, texts))
+
+    def to_srt(self) -> str:
+        return "\n".join(
+            f"{i}\n{_stamp(s, ',')} --> {_stamp(e, ',')}\n{t}\n" for i, (s, e, t) in enumerate(self, 1)
+        )
+
+    def to_vtt(self) -> str:
+        return "WEBVTT\n\n" + "\n".join(f"{_stamp(s, '.')} --> {_stamp(e, '.')}\n{t}\n" for s, e, t in self)
+
+    def plain_text(self) -> str:
+        return " ".join(t.replace("\n", " ") for _, _, t in self)
+
+    def to_json(self) -> dict:
+        return {
+            "start_ms": self.start_ms.tolist(),
+            "end_ms": self.end_ms.tolist(),
+            "offsets": self.offsets.tolist(),
+            "text": self.text,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Cues":
+        return cls(array("q", data["start_ms"]), array("q", data["end_ms"]), array("q", data["offsets"]), data["text"])
+
+    @classmethod
+    def validated(cls, data) -> "Cues":
+        """from_json for untrusted input: CaptionError unless the arrays and offsets agree with the text."""
+        try:
+            cues = cls.from_json(data)
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            raise CaptionError(f"Invalid cues: {e!r}")
+        n, o = len(cues.start_ms), cues.offsets
+        if not isinstance(cues.text, str) or len(cues.end_ms) != n or len(o) != n + 1:
+            raise CaptionError("Invalid cues: start_ms, end_ms and offsets lengths do not match")
+        if o[0] != 0 or o[-1] != len(cues.text) or any(o[i] > o[i + 1] for i in range(n)):
+            raise CaptionError("Invalid cues: offsets do not index the text")
+        return cues
+
+def parse(source: Union[str, Iterable[str]]) -> Cues:
+    """
+    Parse SRT or WebVTT in one pass over its lines (a string, or any iterable
+    of lines such as an open file). Indexes, VTT identifiers, cue settings,
+    NOTE/STYLE/REGION blocks and blank padding are skipped; a
+    missing blank line between cues is tolerated.
+    """
+    lines = source.splitlines() if isinstance(source, str) else (l.rstrip("\r\n") for l in source)
+    start, end, offsets, parts, pos = array("q"), array("q"), array("q", [0]), [], 0
+    cur: Optional[tuple[int, int]] = None
+    text: list[str] = []
+    skipping = False
+
+    def flush():
+        nonlocal pos
+        body = "\n".join(text).strip()
+        if body:
+            start.append(cur[0])
+            end.append(cur[1])
+            parts.append(body)
+            pos += len(body)
+            offsets.append(pos)
+
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            if cur is not None:
+                flush()
+                cur = None
+            skipping = False
+            continue
+        m = _TIMING_RE.match(line)
+        if m:
+            if cur is not None:
+                if text and text[-1] == str(len(start) + 2):
+                    text.pop()  # index of this cue, glued to the previous one (a cue that is just a number stays)
+                flush()
+            g = m.groups()
+            cur, text = (_ms(*g[:4]), _ms(*g[4:])), []
+            continue
+        if cur is not None:
+            text.append(stripped)
+        elif skipping or stripped.startswith(_VTT_BLOCKS):
+            skipping = True  # header or metadata block, until the next blank line
+        # else: cue index / identifier line
+    if cur is not None:
+        flush()
+    return Cues(start, end, offsets, "".join(parts))
+
+# -- Caption documents ------------------------------------------------------
+
+def make_track(content: Optional[str], fmt: Optional[str] = None, url: Optional[str] = None) -> dict:
+    """Track from caption text: timed SRT/VTT becomes cues, anything else an untimed text track."""
+    track: dict = {}
+    if content:
+        cues = parse(content) if fmt != "text" else None
+        if cues is not None and len(cues):
+            track = {"format": "srt", "cues": cues.to_json()}
+        else:
+            track = {"format": "text", "text": content}
+    else:
+        track = {"format": fmt or "srt"}
+    if url:
+        track["url"] = url
+    return track
+
+def cues_track(cues: Cues, url: Optional[str] = None) -> dict:
+    track = {"format": "srt", "cues": cues.to_json()}
+    if url:
+        track["url"] = url
+    return track
+
+def _optional_str(value, what: str) -> Optional[str]:
+    if value is not None and not isinstance(value, str):
+        raise CaptionError(f"{what} must be a string")
+    return value
+
+def _legacy_entry(data) -> dict:
+    if isinstance(data, str):
+        return make_track(data)
+    return make_track(
+        _optional_str(data.get("content") or data.get("srt") or data.get("text"), "Caption content"),
+        "text" if data.get("format") == "text" else _optional_str(data.get("format"), "Caption format"),
+        _optional_str(data.get("url"), "Caption url"),
+    )
+
+def _v2_track(track) -> dict:
+    """A version 2 track rebuilt from its parts (untrusted input)."""
+    if not isinstance(track, dict):
+        raise CaptionError("Caption track must be an object")
+    url = _optional_str(track.get("url"), "Caption url")
+    if track.get("cues"):
+        return cues_track(Cues.validated(track["cues"]), url)
+    return make_track(_optional_str(track.get("text"), "Caption text"), "text", url)
+
+def normalize(raw, default_language: Optional[str] = None) -> Optional[dict]:
+    """Any shape videos.captions has had (or a client sends) -> the version 2 document."""
+    lang = default_language or "en"
+    if raw is None or raw == {} or raw == "":
+        return None
+    if isinstance(raw, str):
+        return {"version": SCHEMA_VERSION, "primary": lang, "tracks": {lang: make_track(raw)}}
+    if not isinstance(raw, dict):
+        return None
+    if raw.get("version") == SCHEMA_VERSION:
+        if not isinstance(raw.get("tracks"), dict):
+            raise CaptionError("Caption document has no tracks object")
+        tracks = {str(k): _v2_track(t) for k, t in raw["tracks"].items()}
+        if not tracks:
+            return None
+        primary = raw.get("primary")
+        return {"version": SCHEMA_VERSION, "primary": primary if primary in tracks else next(iter(tracks)), "tracks": tracks}
+    if any(k in raw for k in ("srt", "text", "format", "content")):
+        tracks = {lang: _legacy_entry(raw)}
+    else:
+        tracks = {k: _legacy_entry(d) for k, d in raw.items() if isinstance(d, (str, dict))}
+    if not tracks:
+        return None
+    return {"version": SCHEMA_VERSION, "primary": lang if lang in tracks else next(iter(tracks)), "tracks": tracks}
+
+def track_cues(track: Optional[dict]) -> Optional[Cues]:
+    return Cues.from_json(track["cues"]) if track and track.get("cues") else None
+
+def track_content(track: Optional[dict], fmt: str = "srt") -> Optional[str]:
+    """SRT (or VTT) for a timed track, the text for an untimed one."""
+    if not track:
+        return None
+    cues = track_cues(track)
+    if cues is not None:
+        return cues.to_vtt() if fmt == "vtt" else cues.to_srt()
+    return track.get("text")
+
+def track_format(track: Optional[dict]) -> str:
+    return "srt" if track and track.get("cues") else "text"
+
+def export_list(doc: Optional[dict]) -> list[dict]:
+    """[{"language", "format", "content", "url"}] per track, for n8n publishing."""
+    return [
+        {"language": lang, "format": track_format(t), "content": track_content(t), "url": t.get("url")}
+        for lang, t in ((doc or {}).get("tracks") or {}).items()
+    ]
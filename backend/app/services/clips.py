@@ -0,0 +1,212 @@
+"""
+Trim/clip engine: renders time ranges of a video into child Videos.
+
+Child rows (parent_video_id, start_sec/end_sec) are created up front with
+status "queued" and move through "processing" to "ready" or "error", which
+is the per-clip progress clients poll. A batch of clips from one source is
+planned together:
+
+- h264/hevc sources are cut with ffmpeg.smart_cut (stream copy, boundary
+  GOPs re-encoded); the keyframes around every cut point are found in one
+  scan, and the cuts fan out across the media process pool.
+- other sources are re-encoded; overlapping clips are grouped into regions
+  and each region is decoded once for all clips inside it.
+
+Results are stored as blobs like any upload and then go through the
+post-upload pipeline. A batch runs as one "clips" job (api_clips.py): if a
+worker dies mid-batch the next attempt renders the clips not yet ready, and
+once the job has failed for good fail_pending() marks them as errors.
+"""
+import asyncio
+import logging
+import math
+import os
+import shutil
+import uuid
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.db import SessionLocal
+from app.models import Video
+from app.services import ffmpeg
+from app.services.blobs import add_reference, hash_file, incoming_dir, store_blob
+from app.services.media import public_path_url
+from app.services.media_pool import run_in_pool
+from app.services.postprocess import run_postprocess
+from app.services.probe import probe_video
+from app.services.storage import media_source
+
+log = logging.getLogger(__name__)
+
+def clip_filename(parent: Video, start_ms: int, end_ms: Optional[int]) -> str:
+    stem = os.path.splitext(parent.original_filename)[0] or "video"
+    end = f"{end_ms / 1000:g}" if end_ms is not None else "end"
+    return f"{stem}_{start_ms / 1000:g}-{end}.mp4"
+
+def create_clip(db: Session, parent: Video, start_ms: int, end_ms: Optional[int]) -> Video:
+    """Add (not commit) the child Video for [start_ms, end_ms) of `parent`; end_ms None = to the end."""
+    child = Video(
+        user_id=parent.user_id,
+        original_filename=clip_filename(parent, start_ms, end_ms),
+        storage_path=parent.storage_path,  # replaced once the cut is stored
+        status="queued",
+        parent_video_id=parent.id,
+        start_sec=start_ms // 1000,
+        end_sec=math.ceil(end_ms / 1000) if end_ms is not None else None,
+        language=parent.language,
+        privacy_status="private",
+    )
+    db.add(child)
+    return child
+
+def plan_regions(clips: list[tuple[int, int, Optional[int]]]) -> list[list[tuple[int, int, Optional[int]]]]:
+    """Group (clip_id, start_ms, end_ms) clips into runs of overlapping ranges, in source order."""
+    regions = []
+    region_end = -1
+    for clip in sorted(clips, key=lambda c: c[1]):
+        _, start_ms, end_ms = clip
+        if regions and (region_end is None or start_ms < region_end):
+            regions[-1].append(clip)
+            region_end = None if (region_end is None or end_ms is None) else max(region_end, end_ms)
+        else:
+            regions.append([clip])
+            region_end = end_ms
+    return regions
+
+def _load_source(clip_id: int):
+    db = SessionLocal()
+    try:
+        child = db.query(Video).filter(Video.id == clip_id).first()
+        parent = db.query(Video).filter(Video.id == child.parent_video_id).first() if child else None
+        if not parent:
+            return None
+        return parent.id, parent.storage_path, parent.media_info
+    finally:
+        db.close()
+
+def _pending(clip_ids: list[int]) -> set[int]:
+    db = SessionLocal()
+    try:
+        rows = db.query(Video.id).filter(Video.id.in_(clip_ids), Video.status != "ready").all()
+        return {clip_id for (clip_id,) in rows}
+    finally:
+        db.close()
+
+def fail_pending(db: Session, clip_ids: list[int], message: str) -> None:
+    """Mark the clips that did not render as errors (not committed)."""
+    db.query(Video).filter(Video.id.in_(clip_ids), Video.status != "ready").update(
+        {Video.status: "error", Video.error_message: message}, synchronize_session=False
+    )
+
+def _set_status(clip_ids: list[int], status: str, message: Optional[str] = None) -> None:
+    db = SessionLocal()
+    try:
+        db.query(Video).filter(Video.id.in_(clip_ids)).update(
+            {Video.status: status, Video.error_message: message}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def _finish_clip(clip_id: int, path: str, stats: dict) -> None:
+    size = os.path.getsize(path)
+    sha256 = hash_file(path)
+    db = SessionLocal()
+    try:
+        blob = store_blob(db, path, sha256, size, ".mp4")
+        v = db.query(Video).filter(Video.id == clip_id).one()
+        v.storage_path = public_path_url(blob.path)
+        v.content_hash = blob.sha256
+        v.status = "ready"
+        v.error_message = None
+        db.add(v)
+        db.commit()
+        add_reference(db, v.user_id, blob.sha256, v.id, v.original_filename)
+        log.info("Clip %s rendered: %s", clip_id, stats)
+    finally:
+        db.close()
+
+def _seconds(ms: Optional[int]) -> Optional[float]:
+    return ms / 1000 if ms is not None else None
+
+async def _smart_cut_one(source: str, media_info: dict, workdir: str, keyframes: list[float], clip) -> list[int]:
+    clip_id, start_ms, end_ms = clip
+    clip_dir = os.path.join(workdir, str(clip_id))
+    out = os.path.join(clip_dir, "clip.mp4")
+    try:
+        await run_in_threadpool(os.makedirs, clip_dir, exist_ok=True)
+        stats = await run_in_pool(
+            ffmpeg.smart_cut, source, out, start_ms / 1000, _seconds(end_ms), media_info, clip_dir, keyframes
+        )
+        await run_in_threadpool(_finish_clip, clip_id, out, stats)
+    except Exception as e:
+        log.exception("Clip %s failed", clip_id)
+        await run_in_threadpool(_set_status, [clip_id], "error", f"Clip failed: {e}")
+        return []
+    return [clip_id]
+
+async def _reencode_region(source: str, media_info: dict, workdir: str, region) -> list[int]:
+    start_ms = min(c[1] for c in region)
+    end_ms = None if any(c[2] is None for c in region) else max(c[2] for c in region)
+    outputs = [(os.path.join(workdir, f"{clip_id}.mp4"), s / 1000, _seconds(e)) for clip_id, s, e in region]
+    try:
+        await run_in_pool(ffmpeg.reencode_region, source, start_ms / 1000, _seconds(end_ms), outputs, media_info)
+    except Exception as e:
+        log.exception("Clip region %s-%s failed", start_ms, end_ms)
+        await run_in_threadpool(_set_status, [c[0] for c in region], "error", f"Clip failed: {e}")
+        return []
+
+    done = []
+    stats = {"mode": "reencode", "region_clips": len(region)}
+    for (clip_id, _, _), (out, _, _) in zip(region, outputs):
+        try:
+            await run_in_threadpool(_finish_clip, clip_id, out, stats)
+            done.append(clip_id)
+        except Exception as e:
+            log.exception("Storing clip %s failed", clip_id)
+            await run_in_threadpool(_set_status, [clip_id], "error", f"Clip failed: {e}")
+    return done
+
+async def render_clips(clips: list[tuple[int, int, Optional[int]]]) -> list[int]:
+    """
+    Cut (clip_id, start_ms, end_ms) clips of one source video, store them
+    and run the post-upload pipeline on each one that succeeded; returns
+    their ids. Clips already ready are skipped. A clip that fails is marked
+    as an error; a failure of the whole batch (probing, keyframe scan) is
+    raised for the job to retry.
+    """
+    if clips:
+        pending = await run_in_threadpool(_pending, [c[0] for c in clips])
+        clips = [c for c in clips if c[0] in pending]
+    if not clips:
+        return []
+    src = await run_in_threadpool(_load_source, clips[0][0])
+    if not src:
+        return []
+    parent_id, parent_url, media_info = src
+    clip_ids = [c[0] for c in clips]
+
+    await run_in_threadpool(_set_status, clip_ids, "processing")
+    workdir = os.path.join(incoming_dir(), f"clips_{parent_id}_{uuid.uuid4().hex}")
+    try:
+        await run_in_threadpool(os.makedirs, workdir, exist_ok=True)
+        if not media_info:
+            # codec and keyframe interval decide how the cuts are made
+            media_info = await probe_video(parent_id)
+        source = media_source(parent_url)
+
+        if ffmpeg.can_smart_cut(media_info):
+            points = sorted({p / 1000 for _, s, e in clips for p in (s, e) if p is not None})
+            keyframes = await run_in_pool(ffmpeg.keyframes_near, source, points, ffmpeg.keyframe_window(media_info))
+            jobs = [_smart_cut_one(source, media_info, workdir, keyframes, c) for c in clips]
+        else:
+            jobs = [_reencode_region(source, media_info, workdir, r) for r in plan_regions(clips)]
+        done = [clip_id for ids in await asyncio.gather(*jobs) for clip_id in ids]
+    finally:
+        await run_in_threadpool(shutil.rmtree, workdir, True)
+
+    for clip_id in done:
+        await run_postprocess(clip_id)
+    return done
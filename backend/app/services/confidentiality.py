@@ -1,6 +1,8 @@
 import json
 from datetime import datetime
-from app.services.openrouter import chat_json
+from starlette.concurrency import run_in_threadpool
+
+from app.services.openrouter import chat_json, evict
 
 SYSTEM = """You are a confidentiality and compliance checker for video transcripts.
 Return STRICT JSON only. No markdown. No commentary.
@@ -13,14 +15,14 @@ USER_TEMPLATE = """Analyze this transcript for confidentiality risks:
 - client private info
 - regulated data
 Return JSON:
-{
+{{
   "overall_status": "pass|warn|fail",
   "summary": "short summary",
-  "counts": {"high": 0, "medium": 0, "low": 0},
+  "counts": {{"high": 0, "medium": 0, "low": 0}},
   "segments": [
-    {"risk":"high|medium|low","reason":"...","snippet":"..."}
+    {{"risk":"high|medium|low","reason":"...","snippet":"..."}}
   ]
-}
+}}
 Transcript:
 {transcript}
 """
@@ -33,7 +35,13 @@ def _extract_json(raw: str) -> dict:
         raise ValueError("No JSON object found in model output")
     return json.loads(raw[start:end+1])
 
-async def run_confidentiality(transcript: str) -> tuple[dict, str]:
-    res = await chat_json(SYSTEM, USER_TEMPLATE.format(transcript=transcript[:20000]))
-    obj = _extract_json(res["raw"])
+async def run_confidentiality(transcript: str, regenerate: bool = False) -> tuple[dict, str]:
+    """Check a transcript; an unchanged transcript reuses the cached answer unless `regenerate`."""
+    prompt = USER_TEMPLATE.format(transcript=transcript[:20000])
+    res = await chat_json(SYSTEM, prompt, cache=True, refresh=regenerate, validate=_extract_json)
+    try:
+        obj = _extract_json(res["raw"])
+    except ValueError:
+        await run_in_threadpool(evict, SYSTEM, prompt)  # a cached answer that no longer parses
+        raise
     return obj, res["model"]
@@ -0,0 +1,41 @@
+"""
+Files derived from stored blobs: timeline sprites, keyframe indexes, preview
+renditions, audio tracks.
+
+Each is stored once per content hash under derived/<aa>/<bb>/<sha256>/<name>
+and recorded in media_derivatives, so re-uploads of the same bytes (and
+every video sharing the blob) reuse it.
+"""
+import mimetypes
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import MediaDerivative
+from app.services.storage import get_storage
+
+def derived_key(sha256: str, name: str) -> str:
+    return f"derived/{sha256[:2]}/{sha256[2:4]}/{sha256}/{name}"
+
+def get_derivatives(db: Session, sha256: str, kinds: Optional[list[str]] = None) -> dict[str, MediaDerivative]:
+    q = db.query(MediaDerivative).filter(MediaDerivative.content_hash == sha256)
+    if kinds:
+        q = q.filter(MediaDerivative.kind.in_(kinds))
+    return {d.kind: d for d in q.all()}
+
+def save_derivative(db: Session, sha256: str, kind: str, tmp_path: str, name: str, info: Optional[dict] = None) -> MediaDerivative:
+    """Move `tmp_path` into the store as derived file `name` of blob `sha256` and record it (committed)."""
+    key = derived_key(sha256, name)
+    get_storage().put_file(key, tmp_path, mimetypes.guess_type(name)[0])
+    row = MediaDerivative(content_hash=sha256, kind=kind, path=key, info=info)
+    db.add(row)
+    try:
+        db.commit()
+    except IntegrityError:
+        # built concurrently for another video with the same bytes; same content, same key
+        db.rollback()
+        row = db.query(MediaDerivative).filter(
+            MediaDerivative.content_hash == sha256, MediaDerivative.kind == kind
+        ).one()
+    return row
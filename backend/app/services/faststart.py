@@ -0,0 +1,178 @@
+"""
+Fast-start stage: move the MP4/MOV `moov` atom in front of `mdat`.
+
+Cameras and screen recorders write the index at the end, so players (and
+the n8n transcriber) must fetch the whole file, or make extra Range round
+trips, before the first frame. Files whose top-level atoms already put moov
+first are left alone; checking takes a few small reads.
+
+The remux is a stream copy (all streams) in the media process pool, and
+files without a video stream are left alone. The result is stored under its
+own hash and swapped in atomically under the blob's row lock: the blob row
+(path, size, stored_sha256) and every video URL pointing at the old file
+are repointed in one transaction. content_hash and the blob's sha256 keep
+identifying the uploaded bytes, so duplicate detection and cached results
+are unaffected, and old URLs redirect to the new file (see api_media).
+
+The old object is not deleted at once: URLs to it may already be out
+(presigned S3 links given to n8n, running jobs). It is recorded in
+retired_blob_objects and removed by run_retired_sweeper after
+RETIRED_BLOB_GRACE_HOURS, once no video row points at it.
+"""
+import asyncio
+import logging
+import os
+import struct
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import MediaBlob, RetiredBlobObject, Video
+from app.services import ffmpeg
+from app.services.blobs import blob_relpath, hash_file, incoming_dir
+from app.services.media import public_path_url
+from app.services.media_pool import run_in_pool
+from app.services.storage import get_storage, media_source
+
+log = logging.getLogger(__name__)
+
+_MAX_TOP_LEVEL_BOXES = 64
+RETIRED_SWEEP_SECONDS = 3600
+
+def needs_faststart(read_range, size: int) -> bool:
+    """
+    True when an ISO BMFF (MP4/MOV) file has mdat before moov.
+    `read_range(start, length)` reads bytes of the file; only top-level box headers are read.
+    """
+    pos = 0
+    for _ in range(_MAX_TOP_LEVEL_BOXES):
+        if pos + 8 > size:
+            return False
+        header = read_range(pos, 16)
+        if len(header) < 8:
+            return False
+        box_size, box_type = struct.unpack(">I4s", header[:8])
+        if pos == 0 and box_type not in (b"ftyp", b"wide", b"free", b"skip"):
+            return False  # not an MP4/MOV
+        if box_type == b"moov":
+            return False
+        if box_type == b"mdat":
+            return True
+        if box_size == 1:
+            if len(header) < 16:
+                return False
+            box_size = struct.unpack(">Q", header[8:16])[0]
+        if box_size < 8:
+            return False  # size 0 ("to end of file") or corrupt, before either atom
+        pos += box_size
+    return False
+
+def _load(video_id: int):
+    db = SessionLocal()
+    try:
+        v = db.query(Video).filter(Video.id == video_id).first()
+        blob = db.query(MediaBlob).filter(MediaBlob.sha256 == v.content_hash).first() if v and v.content_hash else None
+        if not blob:
+            return None
+        return blob.sha256, blob.path, blob.size
+    finally:
+        db.close()
+
+def _check(key: str, size: int) -> bool:
+    storage = get_storage()
+    return needs_faststart(lambda start, length: storage.read_range(key, start, length), size)
+
+def _swap(sha256: str, old_key: str, tmp_path: str) -> Optional[str]:
+    """Publish the remuxed file and repoint the blob and its videos; returns the new key (None if already swapped)."""
+    new_sha = hash_file(tmp_path)
+    new_size = os.path.getsize(tmp_path)
+    new_key = blob_relpath(new_sha, os.path.splitext(old_key)[1])
+    storage = get_storage()
+    db = SessionLocal()
+    try:
+        blob = db.query(MediaBlob).filter(MediaBlob.sha256 == sha256).with_for_update().one()
+        if blob.path != old_key:
+            os.remove(tmp_path)
+            return None
+        storage.put_file(new_key, tmp_path, None)
+        blob.path = new_key
+        blob.size = new_size
+        blob.stored_sha256 = new_sha
+        db.add(blob)
+        db.add(RetiredBlobObject(path=old_key, sha256=sha256))
+        db.query(Video).filter(
+            Video.content_hash == sha256, Video.storage_path == public_path_url(old_key)
+        ).update({Video.storage_path: public_path_url(new_key)}, synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return new_key
+
+def sweep_retired() -> int:
+    """Delete replaced objects past the grace period; videos still pointing at one are repointed first."""
+    storage = get_storage()
+    cutoff = datetime.utcnow() - timedelta(hours=settings.RETIRED_BLOB_GRACE_HOURS)
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(RetiredBlobObject)
+            .filter(RetiredBlobObject.retired_at < cutoff)
+            .with_for_update(skip_locked=True)
+            .limit(100)
+            .all()
+        )
+        done = 0
+        for row in rows:
+            blob = db.query(MediaBlob).filter(MediaBlob.sha256 == row.sha256).with_for_update().first()
+            if blob and blob.path != row.path:
+                # e.g. created by an upload that read the blob just before the swap
+                db.query(Video).filter(Video.storage_path == public_path_url(row.path)).update(
+                    {Video.storage_path: public_path_url(blob.path)}, synchronize_session=False
+                )
+            if db.query(Video.id).filter(Video.storage_path == public_path_url(row.path)).first():
+                continue
+            storage.delete(row.path)
+            db.delete(row)
+            db.commit()
+            done += 1
+        db.commit()
+        return done
+    finally:
+        db.close()
+
+async def run_retired_sweeper() -> None:
+    while True:
+        try:
+            n = await run_in_threadpool(sweep_retired)
+            if n:
+                log.info("Deleted %d replaced media object(s)", n)
+        except Exception:
+            log.exception("Retired media sweep failed")
+        await asyncio.sleep(RETIRED_SWEEP_SECONDS)
+
+async def make_faststart(video_id: int) -> None:
+    ctx = await run_in_threadpool(_load, video_id)
+    if not ctx:
+        return
+    sha256, key, size = ctx
+    if not await run_in_threadpool(_check, key, size):
+        return
+
+    src = media_source(public_path_url(key))
+    if not (await run_in_pool(ffmpeg.probe, src)).get("video"):
+        return  # audio-only MP4/M4A: players do not need the index up front, and there is nothing to gain
+
+    tmp_path = os.path.join(incoming_dir(), f"faststart_{uuid.uuid4().hex}{os.path.splitext(key)[1]}")
+    try:
+        await run_in_pool(ffmpeg.faststart_remux, src, tmp_path)
+        await run_in_threadpool(_swap, sha256, key, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,458 @@
+"""
+ffmpeg / ffprobe wrappers.
+
+Everything here is a plain top-level function of picklable arguments so it
+can run inside the media process pool (services/media_pool.py). Keep app
+imports out of this module beyond settings: pool workers import it.
+"""
+import json
+import math
+import os
+import re
+import statistics
+import struct
+import subprocess
+from typing import Optional
+
+from app.config import settings
+
+PROBE_TIMEOUT_SECONDS = 120
+CUT_TIMEOUT_SECONDS = 3600
+# Keyframe interval is estimated from the first minutes; walking every packet of a 2 h file is not worth it
+KEYFRAME_SAMPLE_SECONDS = 120
+
+class FFmpegError(RuntimeError):
+    pass
+
+def run(args: list[str], timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+    try:
+        res = subprocess.run(args, capture_output=True, timeout=timeout, check=False)
+    except subprocess.TimeoutExpired:
+        raise FFmpegError(f"{args[0]} timed out after {timeout}s")
+    if res.returncode != 0:
+        tail = res.stderr.decode("utf-8", errors="replace").strip().splitlines()[-3:]
+        raise FFmpegError(f"{args[0]} exited with {res.returncode}: {' | '.join(tail)}")
+    return res
+
+def _ratio(value: Optional[str]) -> Optional[float]:
+    if not value or value in ("0/0", "N/A"):
+        return None
+    num, _, den = value.partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _keyframes(src: str, read_intervals: str) -> list[float]:
+    res = run([
+        settings.FFPROBE_BIN, "-v", "error",
+        "-select_streams", "v:0",
+        "-read_intervals", read_intervals,
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        src,
+    ], timeout=PROBE_TIMEOUT_SECONDS)
+    times = set()
+    for line in res.stdout.decode("utf-8", errors="replace").splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                times.add(float(pts))
+            except ValueError:
+                pass
+    return sorted(times)
+
+def keyframe_times(src: str, sample_seconds: float = KEYFRAME_SAMPLE_SECONDS) -> list[float]:
+    """Presentation times (s) of video keyframes in the first `sample_seconds`, read from packet flags only."""
+    return _keyframes(src, f"%+{sample_seconds}")
+
+def keyframes_near(src: str, points: list[float], window: float) -> list[float]:
+    """Keyframe times within `window` seconds of each of `points` (one small demux per point, no decoding)."""
+    return _keyframes(src, ",".join(f"{max(0.0, p - window):.3f}%{p + window:.3f}" for p in points))
+
+def probe(src: str) -> dict:
+    """
+    Container/stream metadata for a local path or URL: duration, codecs,
+    resolution, bitrate and keyframe interval.
+    """
+    res = run([
+        settings.FFPROBE_BIN, "-v", "error",
+        "-print_format", "json",
+        "-show_format", "-show_streams",
+        src,
+    ], timeout=PROBE_TIMEOUT_SECONDS)
+    data = json.loads(res.stdout or b"{}")
+    fmt = data.get("format") or {}
+    streams = data.get("streams") or []
+    video = next((s for s in streams if s.get("codec_type") == "video" and not (s.get("disposition") or {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    duration = _ratio(fmt.get("duration")) or (video and _ratio(video.get("duration"))) or None
+    info = {
+        "duration_ms": int(duration * 1000) if duration else None,
+        "format": fmt.get("format_name"),
+        "bit_rate": _int(fmt.get("bit_rate")),
+        "size": _int(fmt.get("size")),
+        "video": None,
+        "audio": None,
+        "keyframe_interval_s": None,
+    }
+    if video:
+        info["video"] = {
+            "codec": video.get("codec_name"),
+            "profile": video.get("profile"),
+            "width": _int(video.get("width")),
+            "height": _int(video.get("height")),
+            "fps": round(_ratio(video.get("avg_frame_rate")) or _ratio(video.get("r_frame_rate")) or 0, 3) or None,
+            "bit_rate": _int(video.get("bit_rate")),
+            "pix_fmt": video.get("pix_fmt"),
+        }
+        kf = keyframe_times(src)
+        if len(kf) >= 2:
+            info["keyframe_interval_s"] = round(statistics.median(b - a for a, b in zip(kf, kf[1:])), 3)
+    if audio:
+        info["audio"] = {
+            "codec": audio.get("codec_name"),
+            "sample_rate": _int(audio.get("sample_rate")),
+            "channels": _int(audio.get("channels")),
+            "bit_rate": _int(audio.get("bit_rate")),
+        }
+    return info
+
+# Codecs we can re-encode boundary GOPs for and splice back into the copied stream
+SMART_CUT_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+H264_PROFILES = {"baseline": "baseline", "constrained baseline": "baseline", "main": "main", "high": "high"}
+# A cut this close to a keyframe is treated as being on it
+KEYFRAME_TOLERANCE_S = 0.05
+AUDIO_ARGS = ["-c:a", "aac", "-b:a", "192k"]
+
+def _video_encode_args(video: Optional[dict]) -> list[str]:
+    video = video or {}
+    codec = video.get("codec")
+    args = ["-c:v", SMART_CUT_ENCODERS.get(codec, "libx264"), "-preset", "veryfast", "-crf", "18"]
+    if video.get("pix_fmt"):
+        args += ["-pix_fmt", video["pix_fmt"]]
+    if codec == "h264" and H264_PROFILES.get((video.get("profile") or "").lower()):
+        args += ["-profile:v", H264_PROFILES[video["profile"].lower()]]
+    return args
+
+# Stream parameters that live in the SPS/PPS. The MP4 carries one sample
+# description (avcC/hvcC) for the whole clip, so the re-encoded head/tail
+# GOPs must agree with the copied middle on all of them or strict decoders
+# (Safari, hardware) glitch at the joins.
+SPLICE_PARAMS = ("codec_name", "profile", "level", "pix_fmt", "width", "height", "field_order", "refs")
+
+def stream_params(src: str) -> dict:
+    """The first video stream's SPLICE_PARAMS (plus has_b_frames), as ffprobe reports them."""
+    res = run([
+        settings.FFPROBE_BIN, "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=" + ",".join(SPLICE_PARAMS + ("has_b_frames",)),
+        "-of", "json",
+        src,
+    ], timeout=PROBE_TIMEOUT_SECONDS)
+    streams = json.loads(res.stdout or b"{}").get("streams") or [{}]
+    return streams[0]
+
+def _splice_args(params: dict) -> list[str]:
+    """Encoder options that make libx264's SPS match the source's where it allows."""
+    if params.get("codec_name") != "h264":
+        return []
+    args = []
+    if _int(params.get("level")):
+        args += ["-level:v", f"{int(params['level']) / 10:.1f}"]
+    if _int(params.get("refs")):
+        args += ["-refs", str(params["refs"])]
+    if _int(params.get("has_b_frames")) == 0:
+        args += ["-bf", "0"]
+    return args
+
+def _splice_mismatch(source: dict, segment: dict) -> Optional[str]:
+    for key in SPLICE_PARAMS:
+        if source.get(key) != segment.get(key):
+            return f"{key} {segment.get(key)!r} != source {source.get(key)!r}"
+    return None
+
+def _ffmpeg(*args: str) -> None:
+    run([settings.FFMPEG_BIN, "-v", "error", "-y", *args], timeout=CUT_TIMEOUT_SECONDS)
+
+def reencode_cut(src: str, dest: str, start_s: float, end_s: Optional[float], video: Optional[dict] = None) -> None:
+    """Frame-accurate cut of [start_s, end_s) by re-encoding it (end_s None = to the end)."""
+    duration = ["-t", f"{end_s - start_s:.3f}"] if end_s is not None else []
+    _ffmpeg(
+        "-ss", f"{start_s:.3f}", "-i", src, *duration,
+        "-map", "0:v:0?", "-map", "0:a:0?",
+        *_video_encode_args(video), *AUDIO_ARGS,
+        "-movflags", "+faststart", dest,
+    )
+
+def can_smart_cut(media_info: Optional[dict]) -> bool:
+    return ((media_info or {}).get("video") or {}).get("codec") in SMART_CUT_ENCODERS
+
+def keyframe_window(media_info: Optional[dict]) -> float:
+    """How far around a cut point to look for keyframes: two GOPs, at least 10 s."""
+    return max(10.0, 2 * ((media_info or {}).get("keyframe_interval_s") or 0))
+
+def smart_cut(
+    src: str,
+    dest: str,
+    start_s: float,
+    end_s: Optional[float],
+    media_info: Optional[dict],
+    workdir: str,
+    keyframes: Optional[list[float]] = None,
+) -> dict:
+    """
+    Cut [start_s, end_s) of `src` into the mp4 `dest` (end_s None = to the end).
+
+    Only the partial GOPs before the first and after the last keyframe inside
+    the range are re-encoded; everything between is stream-copied, so dropping
+    a 20 s intro from a 90 min file re-encodes a couple of seconds. Audio is
+    re-encoded for the clip in one pass: it is cheap, and avoids gaps at the
+    segment joins. Falls back to re-encoding the clip when the codec is not
+    one we can splice or there is no keyframe inside the range, and when
+    the re-encoded boundary GOPs do not come out with the source's
+    parameter sets (SPLICE_PARAMS).
+
+    `keyframes` may be passed in when the caller already scanned around the
+    cut points (batch clips scan once for all of them).
+
+    Returns {"mode": "smart" | "reencode", "copied_s", "reencoded_s"}, plus
+    "fallback" (the reason) when a smart cut was abandoned.
+    """
+    media_info = media_info or {}
+    video = media_info.get("video")
+    duration = (media_info.get("duration_ms") or 0) / 1000 or None
+    if end_s is not None and duration and end_s >= duration - KEYFRAME_TOLERANCE_S:
+        end_s = None
+    clip_len = (end_s if end_s is not None else (duration or start_s)) - start_s
+
+    k1 = k2 = None
+    if can_smart_cut(media_info):
+        points = [start_s] if end_s is None else [start_s, end_s]
+        kf = keyframes if keyframes is not None else keyframes_near(src, points, keyframe_window(media_info))
+        k1 = next((t for t in kf if t >= start_s - KEYFRAME_TOLERANCE_S), None)
+        if end_s is not None:
+            k2 = next((t for t in reversed(kf) if t <= end_s + KEYFRAME_TOLERANCE_S), None)
+    if k1 is None or (end_s is not None and (k2 is None or k2 - k1 <= KEYFRAME_TOLERANCE_S)):
+        reencode_cut(src, dest, start_s, end_s, video)
+        return {"mode": "reencode", "copied_s": 0.0, "reencoded_s": round(clip_len, 3)}
+
+    source_params = stream_params(src)
+    enc = _video_encode_args(video) + _splice_args(source_params)
+    segments = []
+    encoded = []
+    reencoded = 0.0
+    if k1 - start_s > KEYFRAME_TOLERANCE_S:
+        head = os.path.join(workdir, "head.ts")
+        _ffmpeg("-ss", f"{start_s:.3f}", "-i", src, "-t", f"{k1 - start_s:.3f}", "-map", "0:v:0", "-an", *enc, head)
+        segments.append(head)
+        encoded.append(head)
+        reencoded += k1 - start_s
+
+    # Input-side seek with stream copy lands on the keyframe at or before the
+    # position; nudge past k1 so rounding cannot select the previous one.
+    middle = os.path.join(workdir, "middle.ts")
+    mid_len = ["-t", f"{k2 - k1:.3f}"] if end_s is not None else []
+    _ffmpeg("-ss", f"{k1 + 0.001:.3f}", "-i", src, *mid_len, "-map", "0:v:0", "-an", "-c", "copy", middle)
+    segments.append(middle)
+
+    if end_s is not None and end_s - k2 > KEYFRAME_TOLERANCE_S:
+        tail = os.path.join(workdir, "tail.ts")
+        _ffmpeg("-ss", f"{k2:.3f}", "-i", src, "-t", f"{end_s - k2:.3f}", "-map", "0:v:0", "-an", *enc, tail)
+        segments.append(tail)
+        encoded.append(tail)
+        reencoded += end_s - k2
+
+    for segment in encoded:
+        mismatch = _splice_mismatch(source_params, stream_params(segment))
+        if mismatch:
+            reencode_cut(src, dest, start_s, end_s, video)
+            return {"mode": "reencode", "copied_s": 0.0, "reencoded_s": round(clip_len, 3), "fallback": mismatch}
+
+    concat_list = os.path.join(workdir, "segments.txt")
+    with open(concat_list, "w") as f:
+        f.writelines(f"file '{p}'\n" for p in segments)
+    audio_len = ["-t", f"{end_s - start_s:.3f}"] if end_s is not None else []
+    _ffmpeg(
+        "-f", "concat", "-safe", "0", "-i", concat_list,
+        "-ss", f"{start_s:.3f}", *audio_len, "-i", src,
+        "-map", "0:v:0", "-map", "1:a:0?",
+        "-c:v", "copy", *AUDIO_ARGS,
+        "-movflags", "+faststart", dest,
+    )
+    return {"mode": "smart", "copied_s": round(clip_len - reencoded, 3), "reencoded_s": round(reencoded, 3)}
+
+def reencode_region(
+    src: str,
+    start_s: float,
+    end_s: Optional[float],
+    clips: list[tuple[str, float, Optional[float]]],
+    media_info: Optional[dict],
+) -> None:
+    """
+    Re-encode several clips that lie inside [start_s, end_s) while decoding
+    that region once: the decoded frames are split and trimmed per clip in a
+    single filter graph. `clips` are (dest, clip_start_s, clip_end_s) in
+    source time; an end of None means the end of the region.
+    """
+    media_info = media_info or {}
+    n = len(clips)
+    has_audio = bool(media_info.get("audio"))
+    graph = ["[0:v]split=%d%s" % (n, "".join(f"[v{i}]" for i in range(n)))]
+    if has_audio:
+        graph.append("[0:a]asplit=%d%s" % (n, "".join(f"[a{i}]" for i in range(n))))
+    outputs = []
+    for i, (dest, clip_start, clip_end) in enumerate(clips):
+        bounds = f"start={clip_start - start_s:.3f}"
+        if clip_end is not None:
+            bounds += f":end={clip_end - start_s:.3f}"
+        graph.append(f"[v{i}]trim={bounds},setpts=PTS-STARTPTS[vo{i}]")
+        outputs += ["-map", f"[vo{i}]"]
+        if has_audio:
+            graph.append(f"[a{i}]atrim={bounds},asetpts=PTS-STARTPTS[ao{i}]")
+            outputs += ["-map", f"[ao{i}]", *AUDIO_ARGS]
+        outputs += [*_video_encode_args(media_info.get("video")), "-movflags", "+faststart", dest]
+
+    duration = ["-t", f"{end_s - start_s:.3f}"] if end_s is not None else []
+    _ffmpeg("-ss", f"{start_s:.3f}", "-i", src, *duration, "-filter_complex", ";".join(graph), *outputs)
+
+# Keyframe index file: header (magic, version, count) then one
+# (pts_ms uint32, byte_offset uint64) record per video keyframe, little-endian
+KEYFRAME_INDEX_MAGIC = b"VSKI"
+KEYFRAME_INDEX_HEADER = struct.Struct("<4sBI")
+KEYFRAME_INDEX_RECORD = struct.Struct("<IQ")
+
+def keyframe_index(src: str, dest: str) -> int:
+    """Write the keyframe index of `src` to `dest`; returns the number of keyframes. Demux only, no decoding."""
+    res = run([
+        settings.FFPROBE_BIN, "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,pos,flags",
+        "-of", "csv=p=0",
+        src,
+    ], timeout=CUT_TIMEOUT_SECONDS)
+    records = []
+    for line in res.stdout.decode("utf-8", errors="replace").splitlines():
+        fields = line.split(",")
+        if len(fields) < 3 or "K" not in fields[2]:
+            continue
+        try:
+            records.append((int(float(fields[0]) * 1000), int(fields[1])))
+        except ValueError:
+            continue  # N/A pts or pos
+    records.sort()
+    with open(dest, "wb") as f:
+        f.write(KEYFRAME_INDEX_HEADER.pack(KEYFRAME_INDEX_MAGIC, 1, len(records)))
+        for pts_ms, pos in records:
+            f.write(KEYFRAME_INDEX_RECORD.pack(pts_ms, pos))
+    return len(records)
+
+def timeline_sprite(src: str, dest: str, duration_s: float, interval_s: float, tile_width: int, columns: int) -> dict:
+    """
+    Render one JPEG sprite sheet with a frame every `interval_s` seconds,
+    `columns` tiles per row. Only keyframes are decoded (-skip_frame nokey),
+    so each tile shows the nearest keyframe at or before its time; that is
+    plenty for scrubbing and costs a fraction of a full decode.
+    """
+    frames = max(1, math.ceil(duration_s / interval_s))
+    rows = math.ceil(frames / columns)
+    _ffmpeg(
+        "-skip_frame", "nokey", "-i", src,
+        "-an", "-sn", "-dn",
+        "-vf", f"fps=1/{interval_s:g},scale={tile_width}:-2,tile={columns}x{rows}",
+        "-frames:v", "1", "-q:v", "5",
+        dest,
+    )
+    return {"interval_s": interval_s, "frames": frames, "columns": columns, "rows": rows}
+
+# Preview proxies: small enough to scrub over a slow link, good enough to edit captions against
+PREVIEW_CRF = 28
+PREVIEW_MAXRATE = {480: "1M", 720: "2500k"}
+
+def render_preview(src: str, dest: str, height: int, threads: int) -> dict:
+    """Low-bitrate H.264/AAC proxy of `src` scaled to `height`, fast-start mp4."""
+    maxrate = PREVIEW_MAXRATE.get(height, f"{max(1, height * 3)}k")
+    _ffmpeg(
+        "-i", src,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", f"scale=-2:{height}",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", str(PREVIEW_CRF),
+        "-maxrate", maxrate, "-bufsize", maxrate, "-pix_fmt", "yuv420p",
+        "-threads", str(threads),
+        "-c:a", "aac", "-b:a", "96k", "-ac", "2",
+        "-movflags", "+faststart",
+        dest,
+    )
+    info = probe(dest)
+    return {
+        "height": height,
+        "width": (info.get("video") or {}).get("width"),
+        "size": info.get("size"),
+        "bit_rate": info.get("bit_rate"),
+    }
+
+# Speech-recognition audio: mono 16 kHz is what transcribers resample to anyway
+TRANSCRIBE_AUDIO_CODECS = {
+    "opus": ("ogg", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"]),
+    "flac": ("flac", ["-c:a", "flac", "-compression_level", "5"]),
+}
+
+def extract_audio(src: str, dest: str, fmt: str) -> dict:
+    """
+    Downmix the first audio stream of `src` to mono 16 kHz Opus (.ogg) or
+    FLAC; the video is never decoded. The output is bit-exact (no random Ogg
+    serial, encoder tag or copied metadata), so the same audio always gives
+    the same file and hash, whatever container it came in.
+    """
+    _, codec_args = TRANSCRIBE_AUDIO_CODECS[fmt]
+    _ffmpeg(
+        "-i", src, "-vn", "-sn", "-dn", "-map", "0:a:0", "-map_metadata", "-1", "-map_chapters", "-1",
+        "-ac", "1", "-ar", "16000", *codec_args,
+        "-fflags", "+bitexact", "-flags:a", "+bitexact", dest,
+    )
+    return {"format": fmt, "size": os.path.getsize(dest), "channels": 1, "sample_rate": 16000}
+
+_SILENCE_RE = re.compile(r"silence_(start|end): (-?[0-9.]+)")
+
+def detect_silences(src: str, noise_db: float, min_silence_s: float) -> list[tuple[float, float]]:
+    """(start, end) of every stretch of `src`'s audio quieter than noise_db for at least min_silence_s."""
+    res = run(
+        [settings.FFMPEG_BIN, "-hide_banner", "-nostats", "-i", src, "-vn", "-sn", "-dn", "-map", "0:a:0",
+         "-af", f"silencedetect=noise={noise_db}dB:d={min_silence_s}", "-f", "null", "-"],
+        timeout=CUT_TIMEOUT_SECONDS,
+    )
+    silences, start = [], None
+    for kind, value in _SILENCE_RE.findall(res.stderr.decode("utf-8", errors="replace")):
+        if kind == "start":
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    return silences
+
+def split_audio(src: str, workdir: str, spans: list[tuple[float, float]], fmt: str) -> list[str]:
+    """Cut transcription audio into one file per (start, end) span; re-encoding mono 16 kHz speech is cheap."""
+    ext, codec_args = TRANSCRIBE_AUDIO_CODECS[fmt]
+    paths = []
+    for i, (start_s, end_s) in enumerate(spans):
+        dest = os.path.join(workdir, f"segment_{i:03d}.{ext}")
+        _ffmpeg("-ss", f"{start_s:.3f}", "-i", src, "-t", f"{end_s - start_s:.3f}", "-map", "0:a:0", *codec_args, dest)
+        paths.append(dest)
+    return paths
+
+def faststart_remux(src: str, dest: str) -> None:
+    """Rewrite an MP4/MOV with the moov atom in front. Stream copy only, so this is I/O-bound."""
+    _ffmpeg(
+        "-i", src,
+        "-map", "0",  # every stream: timecode/data tracks included
+        "-c", "copy", "-map_metadata", "0",
+        "-movflags", "+faststart",
+        dest,
+    )
@@ -0,0 +1,145 @@
+"""
+Shared HTTP clients, one per upstream.
+
+Every outbound call to OpenRouter, the n8n transcriber, the n8n publish
+webhook and media downloads for YouTube uploads goes through a long-lived
+client for that upstream. The client keeps connections alive between calls,
+so DNS, TCP and TLS are paid once per connection, not once per request, and
+translation fan-out reuses a handful of HTTP/2 connections.
+
+Each upstream has its own profile: connection limits, keep-alive and a
+default timeout. Calls whose expected duration differs (a quick n8n submit
+vs. a synchronous transcription) pass their own timeout per request.
+HTTP/2 is negotiated over TLS when the `h2` package is installed; plain
+http:// upstreams (e.g. n8n on the private network) stay on HTTP/1.1.
+
+The API opens the clients at startup and closes them at shutdown
+(main.py); `python -m app.worker` does the same. get_client() also opens a
+client on first use, for scripts. pool_stats() describes the calling
+process only: GET /metrics serves the API's own under http_pools.api, and
+each worker publishes its own (app/worker.py), served under
+http_pools.workers by worker id.
+"""
+import importlib.util
+import logging
+from typing import Union
+
+import httpx
+
+from app.config import settings
+
+log = logging.getLogger(__name__)
+
+OPENROUTER = "openrouter"
+N8N = "n8n"
+PUBLISH = "publish"
+MEDIA = "media"
+
+def _profiles() -> dict[str, dict]:
+    return {
+        # Translation fan-out: TRANSLATE_WORKER_CONCURRENCY calls at once, plus metadata/confidentiality
+        OPENROUTER: {
+            "timeout": httpx.Timeout(120.0, connect=10.0),
+            "limits": httpx.Limits(
+                max_connections=settings.TRANSLATE_WORKER_CONCURRENCY + 8,
+                max_keepalive_connections=settings.TRANSLATE_WORKER_CONCURRENCY,
+                keepalive_expiry=60.0,
+            ),
+        },
+        # Whole-file transcription holds a request open for minutes; segments run TRANSCRIBE_PARALLELISM at once
+        N8N: {
+            "timeout": httpx.Timeout(180.0, connect=10.0),
+            "limits": httpx.Limits(
+                max_connections=settings.TRANSCRIBE_PARALLELISM + 8,
+                max_keepalive_connections=settings.TRANSCRIBE_PARALLELISM,
+                keepalive_expiry=30.0,
+            ),
+        },
+        # The publish webhook uploads to YouTube before it answers
+        PUBLISH: {
+            "timeout": httpx.Timeout(600.0, connect=10.0),
+            "limits": httpx.Limits(max_connections=16, max_keepalive_connections=4, keepalive_expiry=30.0),
+        },
+        # Source downloads for the YouTube upload job (sync: the job runs in a worker thread)
+        MEDIA: {
+            "timeout": httpx.Timeout(300.0, connect=15.0),
+            "limits": httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=30.0),
+            "sync": True,
+        },
+    }
+
+_clients: dict[str, Union[httpx.AsyncClient, httpx.Client]] = {}
+_requests: dict[str, int] = {}
+
+def http2_available() -> bool:
+    return settings.HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+def _open(name: str) -> Union[httpx.AsyncClient, httpx.Client]:
+    profile = _profiles()[name]
+    http2 = http2_available()
+
+    def count(request) -> None:
+        _requests[name] = _requests.get(name, 0) + 1
+
+    async def acount(request) -> None:
+        count(request)
+
+    kwargs = {"timeout": profile["timeout"], "limits": profile["limits"], "http2": http2}
+    if profile.get("sync"):
+        client = httpx.Client(event_hooks={"request": [count]}, **kwargs)
+    else:
+        client = httpx.AsyncClient(event_hooks={"request": [acount]}, **kwargs)
+    _clients[name] = client
+    return client
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """The shared async client for upstream `name`."""
+    return _clients.get(name) or _open(name)
+
+def get_sync_client(name: str) -> httpx.Client:
+    """The shared blocking client for upstream `name` (for code running in worker threads)."""
+    return _clients.get(name) or _open(name)
+
+async def open_clients() -> None:
+    for name in _profiles():
+        if name not in _clients:
+            _open(name)
+    if settings.HTTP2_ENABLED and not http2_available():
+        log.warning("HTTP2_ENABLED but the h2 package is not installed; shared clients use HTTP/1.1")
+
+async def close_clients() -> None:
+    while _clients:
+        name, client = _clients.popitem()
+        try:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                client.close()
+        except Exception:
+            log.warning("Closing HTTP client %s failed", name, exc_info=True)
+
+def _pool_counts(client) -> dict:
+    # httpcore's pool is not public API in httpx; report what it exposes and nothing if that changes
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", None) or [])
+    idle = 0
+    for c in connections:
+        try:
+            idle += bool(c.is_idle())
+        except Exception:
+            pass
+    return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+def pool_stats() -> dict[str, dict]:
+    """Per upstream: connection limit, open/idle/active connections and requests sent, for this process."""
+    out = {}
+    for name, profile in _profiles().items():
+        client = _clients.get(name)
+        stats = {
+            "max_connections": profile["limits"].max_connections,
+            "http2": http2_available(),
+            "requests": _requests.get(name, 0),
+        }
+        stats.update(_pool_counts(client) if client is not None else {"open": 0, "idle": 0, "active": 0})
+        out[name] = stats
+    return out
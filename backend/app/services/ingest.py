@@ -0,0 +1,365 @@
+"""
+Server-side ingest: download a remote video into the local blob store.
+
+When the origin honours byte ranges (checked with a one-byte Range GET, since
+HEAD's Accept-Ranges is often wrong behind CDNs and signed URLs) and reports
+a size, the file is fetched as INGEST_PARALLEL_PARTS concurrent Range
+requests that pwrite() into a preallocated file; otherwise, or when a part
+comes back without a 206 after all, it is streamed with a single GET.
+Progress is reported through VideoIngestRequest.progress while the
+request moves queued -> downloading -> done (or failed). run_ingest runs
+as an "ingest" job (api_videos.py), so a download cut short by a restart
+or a network error is started again by the next attempt.
+
+The URL comes from a user, so only http(s) is fetched, and every request
+(redirect hops included) is checked against the resolved address: private,
+loopback, link-local and other non-public hosts are refused. The connection
+then goes to exactly the address that was checked (Host header and TLS SNI
+keep the name), so a second DNS answer cannot rebind it to an internal one. Downloads are
+capped at MAX_UPLOAD_MB, by Content-Length and by the bytes received.
+"""
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Video, VideoIngestRequest
+from app.services.blobs import add_reference, blob_ext, hash_file, incoming_dir, store_blob
+from app.services.media import public_path_url
+from app.services.postprocess import run_postprocess
+from app.services.upload_sessions import pwrite_all
+
+log = logging.getLogger(__name__)
+
+STREAM_CHUNK_BYTES = 1024 * 1024
+PROGRESS_INTERVAL_SECONDS = 1.0
+DOWNLOAD_TIMEOUT = httpx.Timeout(60.0, connect=15.0)
+MAX_REDIRECTS = 5
+
+class IngestError(RuntimeError):
+    status_code = 400
+
+class BlockedURL(IngestError):
+    pass
+
+class TooLarge(IngestError):
+    status_code = 413
+
+class RangeIgnored(RuntimeError):
+    """A part request got the whole file back: the origin does not really do ranges."""
+
+def check_scheme(url: str) -> None:
+    """Only absolute http(s) URLs with a host are fetched."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise BlockedURL("Only http(s) URLs can be ingested")
+
+async def check_url(url: str) -> str:
+    """
+    Refuse URLs whose host resolves to a non-public address (metadata
+    endpoints, localhost, the LAN); returns the address to connect to.
+    """
+    check_scheme(url)
+    parts = urlsplit(url)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parts.hostname, parts.port or (443 if parts.scheme == "https" else 80), type=socket.SOCK_STREAM
+        )
+    except socket.gaierror:
+        raise BlockedURL(f"Cannot resolve {parts.hostname}")
+    addresses = [ipaddress.ip_address(info[4][0].split("%", 1)[0]) for info in infos]
+    if not addresses or not all(ip.is_global for ip in addresses):
+        raise BlockedURL(f"{parts.hostname} resolves to a non-public address")
+    return str(addresses[0])
+
+class _PinnedTransport(httpx.AsyncHTTPTransport):
+    """Vets every request's host (redirect hops included) and connects to the vetted address only."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        address = await check_url(str(request.url))
+        host = request.url.host
+        if address != host:
+            # The request keeps its Host header; TLS still verifies the certificate against the name
+            request = httpx.Request(
+                request.method, request.url.copy_with(host=address), headers=request.headers,
+                stream=request.stream, extensions={**request.extensions, "sni_hostname": host},
+            )
+        return await super().handle_async_request(request)
+
+def max_download_bytes() -> int:
+    return settings.MAX_UPLOAD_MB * 1024 * 1024
+
+def _check_size(size: Optional[int], limit: int) -> None:
+    if size is not None and size > limit:
+        raise TooLarge(f"Download exceeds {limit // (1024 * 1024)} MB limit")
+
+def open_client() -> httpx.AsyncClient:
+    """Client for user-supplied URLs: every request, redirect hops included, goes through check_url."""
+    return httpx.AsyncClient(timeout=DOWNLOAD_TIMEOUT, max_redirects=MAX_REDIRECTS, transport=_PinnedTransport())
+
+async def probe_remote(client: httpx.AsyncClient, url: str) -> tuple[Optional[int], bool]:
+    """
+    Return (size, supports_ranges) for `url`; size is None when the origin
+    does not say. HEAD's Accept-Ranges is not trusted: only a 206 to a
+    one-byte Range GET proves range support (the body is not read otherwise).
+    """
+    async with client.stream("GET", url, headers={"Range": "bytes=0-0"}, follow_redirects=True) as r:
+        r.raise_for_status()
+        total = r.headers.get("content-range", "").rpartition("/")[2]
+        if r.status_code == 206 and total.isdigit():
+            return int(total), True
+        size = r.headers.get("content-length")
+        return (int(size) if size and size.isdigit() else None), False
+
+async def _fetch_part(client: httpx.AsyncClient, url: str, fd: int, start: int, end: int, on_bytes: Callable[[int], None]):
+    async with client.stream("GET", url, headers={"Range": f"bytes={start}-{end}"}, follow_redirects=True) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise RangeIgnored(f"Origin ignored Range request (HTTP {r.status_code})")
+        pos = start
+        async for chunk in r.aiter_bytes(STREAM_CHUNK_BYTES):
+            if pos + len(chunk) > end + 1:
+                raise RuntimeError("Origin sent more bytes than requested")
+            await run_in_threadpool(pwrite_all, fd, chunk, pos)
+            pos += len(chunk)
+            on_bytes(len(chunk))
+        if pos != end + 1:
+            raise RuntimeError(f"Short read for bytes {start}-{end}")
+
+async def _download_ranged(client, url, dest, size, parts, on_bytes) -> None:
+    fd = await run_in_threadpool(os.open, dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        await run_in_threadpool(os.ftruncate, fd, size)
+        step = -(-size // parts)
+        ranges = [(s, min(s + step, size) - 1) for s in range(0, size, step)]
+        # TaskGroup cancels and awaits the other parts when one fails, so none still writes to fd below
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for s, e in ranges:
+                    tg.create_task(_fetch_part(client, url, fd, s, e, on_bytes))
+        except BaseExceptionGroup as eg:
+            raise eg.exceptions[0]
+    finally:
+        os.close(fd)
+
+def _write_and_hash(fh, hasher, data: bytes) -> None:
+    hasher.update(data)
+    fh.write(data)
+
+async def _download_single(client, url, dest, on_bytes, limit: int) -> str:
+    hasher = hashlib.sha256()
+    received = 0
+    fh = await run_in_threadpool(open, dest, "wb")
+    try:
+        async with client.stream("GET", url, follow_redirects=True) as r:
+            r.raise_for_status()
+            declared = r.headers.get("content-length")
+            _check_size(int(declared) if declared and declared.isdigit() else None, limit)
+            async for chunk in r.aiter_bytes(STREAM_CHUNK_BYTES):
+                received += len(chunk)
+                _check_size(received, limit)
+                await run_in_threadpool(_write_and_hash, fh, hasher, chunk)
+                on_bytes(len(chunk))
+    finally:
+        fh.close()
+    return hasher.hexdigest()
+
+async def download_to_file(
+    url: str,
+    dest: str,
+    on_progress: Optional[Callable[[int, Optional[int], int], None]] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    parts: Optional[int] = None,
+    min_part_bytes: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> tuple[int, str]:
+    """
+    Download `url` into `dest`. Returns (size, sha256). Raises TooLarge past
+    `max_bytes` (default MAX_UPLOAD_MB) and BlockedURL for non-public hosts.
+
+    `on_progress(bytes_done, bytes_total, parts)` is called for every chunk
+    written; `client` can be injected (e.g. pointed at a local fixture server),
+    in which case the address check is the caller's.
+    """
+    parts = parts or settings.INGEST_PARALLEL_PARTS
+    min_part_bytes = min_part_bytes or settings.INGEST_MIN_PART_MB * 1024 * 1024
+    limit = max_bytes or max_download_bytes()
+    check_scheme(url)
+
+    own_client = client is None
+    if own_client:
+        client = open_client()
+    try:
+        size, ranged = await probe_remote(client, url)
+        _check_size(size, limit)
+        n_parts = max(1, min(parts, size // min_part_bytes)) if (ranged and size) else 1
+
+        done = 0
+        def on_bytes(n: int):
+            nonlocal done
+            done += n
+            if on_progress:
+                on_progress(done, size, n_parts)
+
+        try:
+            sha256 = None
+            if n_parts > 1:
+                try:
+                    await _download_ranged(client, url, dest, size, n_parts, on_bytes)
+                    sha256 = await run_in_threadpool(hash_file, dest)
+                except RangeIgnored as e:
+                    log.info("Ingest of %s: %s, downloading as one stream", url, e)
+                    done, n_parts = 0, 1
+            if sha256 is None:
+                sha256 = await _download_single(client, url, dest, on_bytes, limit)
+        except BaseException:
+            try:
+                os.remove(dest)
+            except OSError:
+                pass
+            raise
+        return done, sha256
+    finally:
+        if own_client:
+            await client.aclose()
+
+def _update_ingest(ingest_id: int, **fields) -> None:
+    db = SessionLocal()
+    try:
+        req = db.query(VideoIngestRequest).filter(VideoIngestRequest.id == ingest_id).first()
+        if req:
+            for k, v in fields.items():
+                setattr(req, k, v)
+            db.add(req)
+            db.commit()
+    finally:
+        db.close()
+
+def _finish_ingest(ingest_id: int, tmp_path: str, size: int, sha256: str) -> int:
+    db = SessionLocal()
+    try:
+        req = db.query(VideoIngestRequest).filter(VideoIngestRequest.id == ingest_id).one()
+        blob = store_blob(db, tmp_path, sha256, size, blob_ext(req.source_file_name))
+        v = db.query(Video).filter(Video.id == req.video_id).one()
+        v.storage_path = public_path_url(blob.path)
+        v.content_hash = blob.sha256
+        v.status = "ready"
+        v.error_message = None
+        req.status = "done"
+        req.downloaded_path = blob.path
+        req.source_file_size = size
+        req.completed_at = datetime.utcnow()
+        req.progress = {**(req.progress or {}), "bytes_done": size, "bytes_total": size, "percent": 100}
+        db.add_all([v, req])
+        db.commit()
+        add_reference(db, v.user_id, blob.sha256, v.id, v.original_filename)
+        return v.id
+    finally:
+        db.close()
+
+def mark_failed(db, ingest_id: int, message: str) -> None:
+    """Put the request and its video into the failed state (not committed)."""
+    req = db.query(VideoIngestRequest).filter(VideoIngestRequest.id == ingest_id).first()
+    if not req:
+        return
+    req.status = "failed"
+    req.error_message = message
+    req.completed_at = datetime.utcnow()
+    v = db.query(Video).filter(Video.id == req.video_id).first()
+    if v:
+        v.status = "error"
+        v.error_message = message
+        db.add(v)
+    db.add(req)
+
+def _fail_ingest(ingest_id: int, message: str) -> None:
+    db = SessionLocal()
+    try:
+        mark_failed(db, ingest_id, message)
+        db.commit()
+    finally:
+        db.close()
+
+async def _discard(tmp_path: str, pending_report: Optional[asyncio.Future]) -> None:
+    if pending_report:
+        await asyncio.gather(pending_report, return_exceptions=True)
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+async def run_ingest(ingest_id: int, client: Optional[httpx.AsyncClient] = None) -> Optional[int]:
+    """
+    Download one VideoIngestRequest and post-process the video; returns its
+    id. A refused URL (IngestError) marks the request failed and is raised;
+    any other error is raised with the request left "downloading", for the
+    job to retry. A request already done is only post-processed again.
+    """
+    db = SessionLocal()
+    try:
+        req = db.query(VideoIngestRequest).filter(VideoIngestRequest.id == ingest_id).first()
+        if not req or req.status not in ("queued", "downloading", "done"):
+            return None
+        url, video_id, downloaded = req.source_path, req.video_id, req.status == "done"
+        if not downloaded:
+            req.status = "downloading"
+            req.started_at = datetime.utcnow()
+            req.progress = {"bytes_done": 0, "bytes_total": None, "percent": 0}
+            db.add(req)
+            db.commit()
+    finally:
+        db.close()
+    if downloaded:
+        await run_postprocess(video_id)
+        return video_id
+
+    os.makedirs(incoming_dir(), exist_ok=True)
+    tmp_path = os.path.join(incoming_dir(), f"ingest_{ingest_id}_{uuid.uuid4().hex}")
+
+    last_report = 0.0
+    pending_report: Optional[asyncio.Future] = None
+
+    def on_progress(done: int, total: Optional[int], parts: int):
+        nonlocal last_report, pending_report
+        now = time.monotonic()
+        if now - last_report < PROGRESS_INTERVAL_SECONDS or (pending_report and not pending_report.done()):
+            return
+        last_report = now
+        progress = {
+            "bytes_done": done,
+            "bytes_total": total,
+            "percent": round(done * 100 / total, 1) if total else None,
+            "parts": parts,
+        }
+        pending_report = asyncio.ensure_future(
+            run_in_threadpool(_update_ingest, ingest_id, progress=progress, source_file_size=total)
+        )
+
+    try:
+        size, sha256 = await download_to_file(url, tmp_path, on_progress=on_progress, client=client)
+        if pending_report:
+            await pending_report
+        video_id = await run_in_threadpool(_finish_ingest, ingest_id, tmp_path, size, sha256)
+    except IngestError as e:
+        log.warning("Ingest %s refused: %s", ingest_id, e)
+        await _discard(tmp_path, pending_report)
+        await run_in_threadpool(_fail_ingest, ingest_id, f"Ingest failed: {e}")
+        raise
+    except BaseException:
+        await _discard(tmp_path, pending_report)
+        raise
+
+    await run_postprocess(video_id)
+    return video_id
@@ -0,0 +1,325 @@
+"""
+Durable Postgres-backed job queue.
+
+Endpoints enqueue a Job and answer 202 with its id; `python -m app.worker`
+processes on any number of nodes claim jobs with FOR UPDATE SKIP LOCKED, so
+each job runs on exactly one worker at a time without a central broker.
+
+A claimed job holds a lease (JOB_LEASE_SECONDS) that the worker extends
+while the handler runs. If a worker dies, its jobs become claimable again
+when the lease expires. Failures are retried with exponential backoff up to
+max_attempts; PermanentJobError fails a job at once. A handler that hands
+work to a service which calls back raises WaitForCallback: the job waits
+(status "waiting") until complete_waiting() settles it or the deadline
+passes, which counts as a failed attempt.
+
+Handlers are registered per kind with @job_handler next to the endpoint
+that enqueues them:
+
+    @job_handler("caption", on_failure=fail_video("Transcribe failed"))
+    async def run_caption(db, job) -> dict: ...
+
+Sync handlers run in a thread with their own session. The returned dict is
+stored as the job result, which is what GET /jobs/{id} hands back.
+"""
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Job, Video
+
+log = logging.getLogger(__name__)
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help (missing video, bad input)."""
+
+class WaitForCallback(Exception):
+    """
+    Raised by a handler that handed the work to an external service which
+    reports back later (see complete_waiting). The job is parked as
+    "waiting" for up to `timeout` seconds; if nothing arrives by then it
+    counts as a failed attempt and is retried.
+    """
+    def __init__(self, timeout: float):
+        super().__init__(f"waiting up to {timeout:.0f}s for a callback")
+        self.timeout = timeout
+
+@dataclass
+class JobHandler:
+    run: Callable
+    on_failure: Optional[Callable] = None  # (db, job, message), called once the job has failed for good
+    max_attempts: int = 5
+
+HANDLERS: dict[str, JobHandler] = {}
+
+def job_handler(kind: str, on_failure: Optional[Callable] = None, max_attempts: int = 5):
+    def register(fn):
+        HANDLERS[kind] = JobHandler(run=fn, on_failure=on_failure, max_attempts=max_attempts)
+        return fn
+    return register
+
+def fail_video(prefix: str, status: str = "error") -> Callable:
+    """on_failure hook that puts the job's video into `status` with the error message."""
+    def hook(db: Session, job: Job, message: str) -> None:
+        v = db.query(Video).filter(Video.id == job.video_id).first() if job.video_id else None
+        if v:
+            v.status = status
+            v.error_message = f"{prefix}: {message}"
+            db.add(v)
+    return hook
+
+def serialize_job(j: Job) -> dict:
+    return {
+        "job_id": j.id,
+        "kind": j.kind,
+        "video_id": j.video_id,
+        "status": j.status,
+        "attempts": j.attempts,
+        "max_attempts": j.max_attempts,
+        "result": j.result,
+        "progress": j.progress,
+        "error_message": j.error_message,
+        "run_after": j.run_after.isoformat() if j.run_after else None,
+        "created_at": j.created_at.isoformat() if j.created_at else None,
+        "started_at": j.started_at.isoformat() if j.started_at else None,
+        "completed_at": j.completed_at.isoformat() if j.completed_at else None,
+    }
+
+def enqueue(db: Session, kind: str, payload: dict, user_id: Optional[str] = None, video_id: Optional[int] = None) -> Job:
+    handler = HANDLERS.get(kind)
+    job = Job(
+        kind=kind,
+        user_id=user_id,
+        video_id=video_id,
+        payload=payload,
+        status="queued",
+        max_attempts=handler.max_attempts if handler else 5,
+        run_after=datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def _expire_waiting(db: Session, now: datetime) -> None:
+    """Jobs whose callback never came: retry or fail them like any other failed attempt."""
+    overdue = (
+        db.query(Job)
+        .filter(Job.status == "waiting", Job.run_after <= now)
+        .with_for_update(skip_locked=True)
+        .limit(20)
+        .all()
+    )
+    for job in overdue:
+        log.warning("Job %s: no callback received, giving up on attempt %s", job.id, job.attempts)
+        _settle(db, job, error="No callback received in time")
+    db.commit()
+
+def claim(worker_id: str) -> Optional[int]:
+    """
+    Claim the next due job (or one whose lease expired); returns its id. A
+    job whose lease expired on its last attempt is failed instead: its
+    worker died running it (e.g. OOM), and it would kill the next one too.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        _expire_waiting(db, now)
+        while True:
+            job = (
+                db.query(Job)
+                .filter(or_(
+                    (Job.status == "queued") & (Job.run_after <= now),
+                    (Job.status == "running") & (Job.lease_expires_at < now),
+                ))
+                .order_by(Job.run_after, Job.id)
+                .with_for_update(skip_locked=True)
+                .limit(1)
+                .first()
+            )
+            if not job:
+                db.rollback()
+                return None
+            if job.status != "running":
+                break
+            if job.attempts < job.max_attempts:
+                log.warning("Job %s: lease of %s expired, reclaiming", job.id, job.locked_by)
+                break
+            log.error("Job %s: lease of %s expired on its last attempt, failing it", job.id, job.locked_by)
+            _settle(db, job, error=f"Worker {job.locked_by} stopped responding on attempt {job.attempts}")
+            db.commit()
+        job.status = "running"
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.lease_expires_at = now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        job.started_at = now
+        db.add(job)
+        db.commit()
+        return job.id
+    finally:
+        db.close()
+
+def heartbeat(job_id: int, worker_id: str) -> bool:
+    """Extend the lease; False means the job is no longer ours (lease expired and was reclaimed)."""
+    db = SessionLocal()
+    try:
+        n = (
+            db.query(Job)
+            .filter(Job.id == job_id, Job.locked_by == worker_id, Job.status == "running")
+            .update(
+                {Job.lease_expires_at: datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_SECONDS)},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return n == 1
+    finally:
+        db.close()
+
+def report_progress(job_id: int, progress: dict) -> None:
+    """Publish handler progress for GET /jobs/{id}; kept across retries, so a handler can resume from it."""
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id == job_id).update({Job.progress: progress}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def retry_delay(attempts: int) -> float:
+    base = settings.JOB_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1)
+    return min(settings.JOB_RETRY_MAX_SECONDS, base) * random.uniform(0.8, 1.2)
+
+def _settle(
+    db: Session, job: Job, result: Optional[dict] = None, error: Optional[str] = None,
+    permanent: bool = False, wait: Optional[float] = None,
+) -> None:
+    """Record the outcome of an attempt on a locked job row: done, waiting, retry later, or failed."""
+    now = datetime.utcnow()
+    job.locked_by = None
+    job.lease_expires_at = None
+    if wait is not None:
+        job.status = "waiting"
+        job.run_after = now + timedelta(seconds=wait)  # callback deadline
+    elif error is None:
+        job.status = "done"
+        job.result = result
+        job.error_message = None
+        job.completed_at = now
+    elif not permanent and job.attempts < job.max_attempts:
+        job.status = "queued"
+        job.error_message = error
+        job.run_after = now + timedelta(seconds=retry_delay(job.attempts))
+    else:
+        job.status = "failed"
+        job.error_message = error
+        job.completed_at = now
+        handler = HANDLERS.get(job.kind)
+        if handler and handler.on_failure:
+            try:
+                handler.on_failure(db, job, error)
+            except Exception:
+                log.exception("Job %s: failure hook raised", job.id)
+    db.add(job)
+
+def _finish(
+    job_id: int, worker_id: str, result: Optional[dict] = None, error: Optional[str] = None,
+    permanent: bool = False, wait: Optional[float] = None,
+) -> None:
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).with_for_update().first()
+        if not job or job.locked_by != worker_id or job.status != "running":
+            db.rollback()
+            return  # lost the lease, or a callback already completed it; whoever holds it now decides
+        _settle(db, job, result, error, permanent, wait)
+        db.commit()
+    finally:
+        db.close()
+
+def complete_waiting(db: Session, job_id: int, result: Optional[dict] = None, error: Optional[str] = None) -> bool:
+    """
+    Settle a job from an external callback. Also accepted while the job is
+    still "running": the callback can beat the handler's own bookkeeping.
+    False if the job is already settled (duplicate or late callback).
+    """
+    job = db.query(Job).filter(Job.id == job_id).with_for_update().first()
+    if not job or job.status not in ("waiting", "running"):
+        db.rollback()
+        return False
+    _settle(db, job, result, error)
+    db.commit()
+    return True
+
+def _load(job_id: int) -> Job:
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).one()
+        db.expunge(job)
+        return job
+    finally:
+        db.close()
+
+def _run_sync(fn, job: Job):
+    db = SessionLocal()
+    try:
+        return fn(db, job)
+    finally:
+        db.close()
+
+async def _keep_leased(job_id: int, worker_id: str, task: asyncio.Task) -> None:
+    interval = max(1.0, settings.JOB_LEASE_SECONDS / 3)
+    while not task.done():
+        await asyncio.sleep(interval)
+        if not await run_in_threadpool(heartbeat, job_id, worker_id):
+            log.warning("Job %s: lease lost, abandoning", job_id)
+            task.cancel()
+            return
+
+async def run_job(job_id: int, worker_id: str) -> None:
+    """Run one claimed job to completion (or failure), keeping its lease alive meanwhile."""
+    job = await run_in_threadpool(_load, job_id)
+    handler = HANDLERS.get(job.kind)
+    if not handler:
+        await run_in_threadpool(_finish, job_id, worker_id, None, f"No handler for job kind {job.kind!r}", True)
+        return
+
+    if asyncio.iscoroutinefunction(handler.run):
+        async def call():
+            db = SessionLocal()
+            try:
+                return await handler.run(db, job)
+            finally:
+                db.close()
+        task = asyncio.ensure_future(call())
+    else:
+        task = asyncio.ensure_future(run_in_threadpool(_run_sync, handler.run, job))
+
+    keeper = asyncio.ensure_future(_keep_leased(job_id, worker_id, task))
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        if keeper.done():
+            return  # lease lost; the job now belongs to another worker
+        raise
+    except PermanentJobError as e:
+        await run_in_threadpool(_finish, job_id, worker_id, None, str(e), True)
+        return
+    except WaitForCallback as e:
+        await run_in_threadpool(_finish, job_id, worker_id, None, None, False, e.timeout)
+        return
+    except Exception as e:
+        log.exception("Job %s (%s) attempt %s failed", job_id, job.kind, job.attempts)
+        await run_in_threadpool(_finish, job_id, worker_id, None, f"{type(e).__name__}: {e}")
+        return
+    finally:
+        keeper.cancel()
+    await run_in_threadpool(_finish, job_id, worker_id, result if isinstance(result, dict) else {"value": result})
@@ -0,0 +1,163 @@
+"""
+Online migration of legacy flat uploads into the sharded layout.
+
+Walks videos in id order, LAYOUT_MIGRATION_BATCH_SIZE at a time. For each
+batch it links every flat "<user_id>/<file>" (storage_path, thumbnail_url,
+speaker_image_url and the video_<id>.srt side file) to its sharded key,
+rewrites the URLs and the resume cursor in one transaction, and only then
+removes the old keys. Each URL is rewritten only if it still holds the value
+that was read, so a thumbnail or speaker image uploaded meanwhile wins, and
+rows are not locked while files are copied. Readers never see a missing file: old URLs keep
+resolving through the /uploads fallback and new ones exist before they are
+published. A Postgres advisory lock keeps multiple replicas from running it
+at the same time; the cursor makes it resumable after restarts.
+
+Run in the API process (LAYOUT_MIGRATION_ENABLED) or by hand:
+    python -m app.services.layout_migration
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app import db as app_db
+from app.config import settings
+from app.db import SessionLocal
+from app.models import MaintenanceState, Video
+from app.services.media import public_path_url
+from app.services.storage import get_storage, key_from_url, sharded_key_for
+
+log = logging.getLogger(__name__)
+
+TASK_NAME = "upload_layout_v2"
+ADVISORY_LOCK_ID = 7_000_001
+URL_FIELDS = ("storage_path", "thumbnail_url", "speaker_image_url")
+
+_stop = threading.Event()
+
+def _load_cursor(db) -> dict:
+    row = db.query(MaintenanceState).filter(MaintenanceState.name == TASK_NAME).first()
+    return dict(row.state or {}) if row else {}
+
+def _save_cursor(db, state: dict) -> None:
+    row = db.query(MaintenanceState).filter(MaintenanceState.name == TASK_NAME).first()
+    if not row:
+        row = MaintenanceState(name=TASK_NAME)
+    row.state = state
+    db.add(row)
+
+def _plan_move(storage, key: str, moves: list) -> str | None:
+    """Link `key` to its sharded key; returns the new key (None if `key` is not a legacy flat key)."""
+    new_key = sharded_key_for(key)
+    if not new_key:
+        return None
+    if storage.exists(key):
+        storage.link(key, new_key)
+        moves.append(key)
+    elif not storage.exists(new_key):
+        return None  # dangling reference; leave the row alone
+    return new_key
+
+def migrate_batch() -> bool:
+    """Migrate one batch. Returns False once every video has been visited."""
+    storage = get_storage()
+    db = SessionLocal()
+    try:
+        state = _load_cursor(db)
+        if state.get("done"):
+            return False
+        last_id = state.get("last_id", 0)
+
+        columns = [getattr(Video, f) for f in URL_FIELDS]
+        rows = (
+            db.query(Video.id, Video.user_id, *columns)
+            .filter(Video.id > last_id)
+            .order_by(Video.id)
+            .limit(settings.LAYOUT_MIGRATION_BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            _save_cursor(db, {**state, "done": True})
+            db.commit()
+            return False
+        db.rollback()  # no transaction left open while files are linked
+
+        old_keys: list[str] = []
+        updates: list[tuple[int, str, str, str]] = []
+        for row in rows:
+            for field in URL_FIELDS:
+                old_url = getattr(row, field)
+                key = key_from_url(old_url)
+                new_key = _plan_move(storage, key, old_keys) if key else None
+                if new_key:
+                    updates.append((row.id, field, old_url, public_path_url(new_key)))
+            _plan_move(storage, f"{row.user_id}/video_{row.id}.srt", old_keys)
+
+        for video_id, field, old_url, new_url in updates:
+            column = getattr(Video, field)
+            n = (
+                db.query(Video)
+                .filter(Video.id == video_id, column == old_url)
+                .update({column: new_url}, synchronize_session=False)
+            )
+            if not n:
+                log.info("Video %s: %s changed during layout migration; keeping the new value", video_id, field)
+
+        _save_cursor(db, {
+            "last_id": rows[-1].id,
+            "moved": state.get("moved", 0) + len(old_keys),
+        })
+        db.commit()
+
+        # The new keys are published; the old ones can go
+        for key in old_keys:
+            storage.delete(key)
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def run_migration(pause_seconds: float = 0.0) -> None:
+    """Run the migration to completion if no other process holds the lock."""
+    # Session-level lock on a dedicated connection, committed at once so it does not sit idle in a transaction
+    conn = app_db.engine.connect()
+    try:
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID}).scalar()
+        conn.commit()
+        if not locked:
+            log.info("Upload layout migration already running elsewhere")
+            return
+        try:
+            batches = 0
+            while not _stop.is_set() and migrate_batch():
+                batches += 1
+                if pause_seconds:
+                    time.sleep(pause_seconds)
+            if batches:
+                log.info("Upload layout migration finished (%d batches)", batches)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+            conn.commit()
+    finally:
+        conn.close()
+
+async def run_in_background() -> None:
+    _stop.clear()
+    try:
+        await run_in_threadpool(run_migration, settings.LAYOUT_MIGRATION_PAUSE_SECONDS)
+    except asyncio.CancelledError:
+        _stop.set()  # the worker thread finishes its current batch and exits
+        raise
+    except Exception:
+        log.exception("Upload layout migration failed; it resumes from its cursor on next start")
+
+if __name__ == "__main__":
+    from app.db import init_engine
+    logging.basicConfig(level=logging.INFO)
+    init_engine(settings.DATABASE_URL)
+    run_migration()
@@ -0,0 +1,189 @@
+"""
+Media file responses for /uploads.
+
+Supports single byte-range requests (206), strong ETags with conditional
+requests, and hands the actual byte transfer to the cheapest path available:
+
+  1. X-Accel-Redirect to the front proxy (MEDIA_ACCEL_REDIRECT_PREFIX), so
+     Python never touches the bytes;
+  2. the ASGI zero-copy extensions (http.response.zerocopysend /
+     http.response.pathsend) when the server provides them, i.e. sendfile();
+  3. otherwise pread() in the threadpool, so the event loop is never blocked.
+"""
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from typing import Optional
+from urllib.parse import quote
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.config import settings
+
+READ_CHUNK_BYTES = 1024 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MUTABLE_CACHE_CONTROL = "no-cache"
+
+# Files whose name embeds a uuid4 hex or a sha256 never change under that name
+_IMMUTABLE_NAME_RE = re.compile(r"(^|[_/])([0-9a-f]{32}|[0-9a-f]{64})([_.]|$)")
+_SHA256_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.|$)")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def public_path_url(relpath: str) -> str:
+    """Public URL for a file stored at UPLOAD_DIR/<relpath>."""
+    return f"{settings.PUBLIC_BASE_URL.rstrip('/')}/uploads/{relpath}"
+
+def resolve_upload_path(relpath: str) -> Optional[str]:
+    """Map a URL path below /uploads to a file inside UPLOAD_DIR; hidden entries (.sessions, ...) are never served."""
+    parts = [p for p in relpath.split("/") if p]
+    if not parts or any(p.startswith(".") for p in parts):
+        return None
+    root = os.path.realpath(settings.UPLOAD_DIR)
+    full = os.path.realpath(os.path.join(root, *parts))
+    if not full.startswith(root + os.sep):
+        return None
+    return full
+
+def is_immutable(relpath: str) -> bool:
+    return bool(_IMMUTABLE_NAME_RE.search(relpath))
+
+def make_etag(relpath: str, st: os.stat_result) -> str:
+    m = _SHA256_NAME_RE.match(os.path.basename(relpath))
+    if m:
+        return f'"{m.group(1)}"'
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Parse a Range header into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be sent (no header, or a
+    multi-range request, which we are allowed to ignore). Raises
+    RangeNotSatisfiable for ranges outside the file.
+    """
+    if not header:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m:
+        return None
+    first, last = m.group(1), m.group(2)
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: last N bytes
+        n = int(last)
+        if n == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - n, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in [t.strip().removeprefix("W/") for t in header.split(",")]
+
+class MediaFileResponse(Response):
+    """Streams [start, start + count) of a file using the fastest transfer the server supports."""
+
+    def __init__(self, path: str, start: int, count: int, status_code: int, headers: dict, send_body: bool = True):
+        self.path = path
+        self.start = start
+        self.count = count
+        self.send_body = send_body
+        self.status_code = status_code
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            f = await run_in_threadpool(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            finally:
+                f.close()
+            return
+        if "http.response.pathsend" in extensions and self.status_code == 200:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        fd = await run_in_threadpool(os.open, self.path, os.O_RDONLY)
+        try:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, self.start, self.count, os.POSIX_FADV_SEQUENTIAL)
+            pos = self.start
+            remaining = self.count
+            while remaining > 0:
+                chunk = await run_in_threadpool(os.pread, fd, min(READ_CHUNK_BYTES, remaining), pos)
+                if not chunk:
+                    break  # file shrank underneath us; end the body rather than hang
+                pos += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            os.close(fd)
+
+def media_response(relpath: str, full_path: str, st: os.stat_result, request_headers, method: str) -> Response:
+    size = st.st_size
+    etag = make_etag(relpath, st)
+    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    headers = {
+        "accept-ranges": "bytes",
+        "etag": etag,
+        "last-modified": formatdate(st.st_mtime, usegmt=True),
+        "cache-control": IMMUTABLE_CACHE_CONTROL if is_immutable(relpath) else MUTABLE_CACHE_CONTROL,
+    }
+
+    if _etag_matches(request_headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        # The proxy serves the bytes (and the Range handling) from its internal location; it decodes the URI,
+        # so legacy names with spaces, "%", "?" or non-Latin-1 characters must be percent-encoded
+        headers["x-accel-redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(relpath, safe="/")
+        headers["content-type"] = media_type
+        return Response(status_code=200, headers=headers)
+
+    byte_range = None
+    if_range = request_headers.get("if-range")
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request_headers.get("range"), size)
+        except RangeNotSatisfiable:
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    headers["content-type"] = media_type
+    if byte_range:
+        start, end = byte_range
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+        headers["content-length"] = str(end - start + 1)
+        return MediaFileResponse(full_path, start, end - start + 1, 206, headers, send_body=method != "HEAD")
+
+    headers["content-length"] = str(size)
+    return MediaFileResponse(full_path, 0, size, 200, headers, send_body=method != "HEAD")
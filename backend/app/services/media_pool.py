@@ -0,0 +1,39 @@
+"""
+Bounded process pool for media work (probing, cutting, rendering).
+
+MEDIA_WORKERS processes (default: one per core) are shared by every media
+stage, so a burst of uploads queues up instead of starting unbounded
+ffmpeg processes next to the API. Workers are started with forkserver to
+avoid inheriting the API's threads and DB connections.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from app.config import settings
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def pool_size() -> int:
+    return settings.MEDIA_WORKERS or os.cpu_count() or 2
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=pool_size(), mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+def threads_per_job() -> int:
+    """Encoder threads per pool job, so a full pool does not oversubscribe the cores."""
+    return max(1, (os.cpu_count() or 1) // pool_size())
+
+async def run_in_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), fn, *args)
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -1,14 +1,25 @@
-import httpx
 from app.config import settings
+from app.services.http_clients import N8N, get_client
 
 async def transcribe_via_n8n(video_url: str, language_code: str | None = None) -> dict:
     language_code = language_code or settings.DEFAULT_LANGUAGE_CODE
 
-    async with httpx.AsyncClient(timeout=180.0) as client:
-        r = await client.post(
-            settings.N8N_TRANSCRIBE_URL,
-            data={"video_url": video_url, "language_code": language_code},
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
-        r.raise_for_status()
-        return r.json()
+    r = await get_client(N8N).post(
+        settings.N8N_TRANSCRIBE_URL,
+        data={"video_url": video_url, "language_code": language_code},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    r.raise_for_status()
+    return r.json()
+
+async def submit_transcription_n8n(video_url: str, callback_url: str, language_code: str | None = None) -> None:
+    """Callback mode: n8n acknowledges right away and POSTs {text, srt} to callback_url when done."""
+    language_code = language_code or settings.DEFAULT_LANGUAGE_CODE
+
+    r = await get_client(N8N).post(
+        settings.N8N_TRANSCRIBE_URL,
+        data={"video_url": video_url, "language_code": language_code, "callback_url": callback_url},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+        timeout=30.0,
+    )
+    r.raise_for_status()
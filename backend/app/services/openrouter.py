@@ -1,9 +1,151 @@
-import httpx
+"""
+OpenRouter chat completions, with an optional response cache.
+
+Metadata and confidentiality prompts are deterministic functions of the
+transcript, so with cache=True an answer is reused for the same (model,
+system prompt, user prompt, temperature): first from an in-process LRU of
+LLM_CACHE_SIZE entries, then from the llm_responses table, where rows live
+LLM_CACHE_TTL_SECONDS (run_cache_sweeper, started by the API, deletes
+expired rows every CACHE_SWEEP_SECONDS). refresh=True skips the lookup (explicit regenerate)
+and stores the new answer in place of the old one. Only answers that pass
+the caller's `validate` are stored; evict() drops one that later turns out
+unusable, so a bad answer is never served twice.
+
+Counters: llm_cache.hit / llm_cache.miss (GET /metrics).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from starlette.concurrency import run_in_threadpool
+
 from app.config import settings
+from app.db import SessionLocal
+from app.metrics import incr
+from app.services.http_clients import OPENROUTER, get_client
+from app.models import LLMResponse
+
+log = logging.getLogger(__name__)
 
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_TEMPERATURE = 0.4
+CACHE_SWEEP_SECONDS = 3600
+
+# key -> (expires at, epoch seconds; {"raw", "model"})
+_lru: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_lru_lock = threading.Lock()  # lookups also run in the threadpool
+
+def cache_key(system: str, user: str, temperature: float = DEFAULT_TEMPERATURE, model: Optional[str] = None) -> str:
+    blob = json.dumps([model or settings.OPENROUTER_MODEL, system, user, temperature], ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def _remember(key: str, res: dict, expires: float) -> None:
+    with _lru_lock:
+        _lru[key] = (expires, res)
+        _lru.move_to_end(key)
+        while len(_lru) > max(0, settings.LLM_CACHE_SIZE):
+            _lru.popitem(last=False)
+
+def _lru_get(key: str) -> Optional[tuple[float, dict]]:
+    with _lru_lock:
+        entry = _lru.get(key)
+        if not entry:
+            return None
+        if entry[0] <= time.time():
+            del _lru[key]
+            return None
+        _lru.move_to_end(key)
+        return entry
 
-async def chat_json(system: str, user: str) -> dict:
+def _db_get(key: str) -> Optional[tuple[float, dict]]:
+    db = SessionLocal()
+    try:
+        row = db.query(LLMResponse).filter(LLMResponse.key == key).first()
+        if not row:
+            return None
+        if row.expires_at <= datetime.utcnow():
+            db.delete(row)
+            db.commit()
+            return None
+        row.hits += 1
+        db.commit()
+        return (row.expires_at - datetime(1970, 1, 1)).total_seconds(), {"raw": row.response, "model": row.model}
+    finally:
+        db.close()
+
+def _db_put(key: str, res: dict, expires_at: datetime) -> None:
+    db = SessionLocal()
+    try:
+        stmt = insert(LLMResponse).values(
+            key=key, model=res["model"], response=res["raw"], hits=0, expires_at=expires_at,
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[LLMResponse.key],
+            set_={"model": res["model"], "response": res["raw"], "hits": 0, "expires_at": expires_at},
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+def _db_delete(key: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(LLMResponse).filter(LLMResponse.key == key).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def purge_expired() -> int:
+    """Delete expired llm_responses rows (blocking); returns how many."""
+    db = SessionLocal()
+    try:
+        n = (
+            db.query(LLMResponse)
+            .filter(LLMResponse.expires_at < datetime.utcnow())
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return n
+    finally:
+        db.close()
+
+async def run_cache_sweeper() -> None:
+    while True:
+        try:
+            n = await run_in_threadpool(purge_expired)
+            if n:
+                log.info("Deleted %d expired LLM cache row(s)", n)
+        except Exception:
+            log.exception("LLM cache sweep failed")
+        await asyncio.sleep(CACHE_SWEEP_SECONDS)
+
+def evict(system: str, user: str, temperature: float = DEFAULT_TEMPERATURE) -> None:
+    """Forget the cached answer for this prompt (blocking)."""
+    key = cache_key(system, user, temperature)
+    with _lru_lock:
+        _lru.pop(key, None)
+    _db_delete(key)
+
+def cached_response(system: str, user: str, temperature: float = DEFAULT_TEMPERATURE) -> Optional[dict]:
+    """{"raw", "model", "cached": True} when this prompt has a live cached answer, else None (blocking; counts hits only)."""
+    key = cache_key(system, user, temperature)
+    entry = _lru_get(key)
+    if not entry:
+        entry = _db_get(key)
+        if not entry:
+            return None
+        _remember(key, entry[1], entry[0])
+    incr("llm_cache.hit")
+    return {**entry[1], "cached": True}
+
+async def _complete(system: str, user: str, temperature: float) -> dict:
     if not settings.OPENROUTER_API_KEY:
         raise RuntimeError("OPENROUTER_API_KEY not set")
 
@@ -20,13 +162,39 @@ async def chat_json(system: str, user: str) -> dict:
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ],
-        "temperature": 0.4,
+        "temperature": temperature,
     }
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        r = await client.post(OPENROUTER_URL, headers=headers, json=payload)
-        r.raise_for_status()
-        data = r.json()
+    r = await get_client(OPENROUTER).post(OPENROUTER_URL, headers=headers, json=payload)
+    r.raise_for_status()
+    data = r.json()
 
     content = data["choices"][0]["message"]["content"]
     return {"raw": content, "model": settings.OPENROUTER_MODEL}
+
+async def chat_json(
+    system: str, user: str, temperature: float = DEFAULT_TEMPERATURE, cache: bool = False, refresh: bool = False,
+    validate: Optional[Callable[[str], Any]] = None,
+) -> dict:
+    """
+    {"raw", "model"} for one completion. With `cache`, a stored answer for
+    the same prompt is returned instead (with "cached": True) unless
+    `refresh`. A fresh answer is stored only once `validate(raw)` (e.g. the
+    caller's JSON parser) has returned without raising.
+    """
+    if not cache:
+        return await _complete(system, user, temperature)
+    if not refresh:
+        hit = await run_in_threadpool(cached_response, system, user, temperature)
+        if hit:
+            return hit
+    await run_in_threadpool(incr, "llm_cache.miss")
+
+    res = await _complete(system, user, temperature)
+    if validate is not None:
+        validate(res["raw"])
+    key = cache_key(system, user, temperature)
+    ttl = settings.LLM_CACHE_TTL_SECONDS
+    _remember(key, res, time.time() + ttl)
+    await run_in_threadpool(_db_put, key, res, datetime.utcnow() + timedelta(seconds=ttl))
+    return res
@@ -0,0 +1,31 @@
+"""
+Post-upload media pipeline.
+
+Runs once a video's bytes are stored (multipart upload, resumable upload,
+ingest), after the response has gone out, so uploads never wait on it.
+Stages run in order; a failing stage is logged and does not stop the rest.
+"""
+import logging
+
+from app.services.audio import build_audio
+from app.services.faststart import make_faststart
+from app.services.probe import probe_video
+from app.services.renditions import build_renditions
+from app.services.timeline import build_timeline
+
+log = logging.getLogger(__name__)
+
+STAGES = [
+    ("faststart", make_faststart),  # first: later stages read the file, and it may move
+    ("probe", probe_video),
+    ("audio", build_audio),
+    ("timeline", build_timeline),
+    ("renditions", build_renditions),
+]
+
+async def run_postprocess(video_id: int) -> None:
+    for name, stage in STAGES:
+        try:
+            await stage(video_id)
+        except Exception:
+            log.exception("Post-upload stage %s failed for video %s", name, video_id)
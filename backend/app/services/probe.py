@@ -0,0 +1,63 @@
+"""
+Media probe stage: fills Video.duration_ms and Video.media_info.
+
+ffprobe runs in the media process pool; results are cached per blob hash in
+media_probes, so probing a file someone already uploaded costs one query.
+"""
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+from app.db import SessionLocal
+from app.models import MediaProbe, Video
+from app.services import ffmpeg
+from app.services.media_pool import run_in_pool
+from app.services.storage import media_source
+
+def _load(video_id: int):
+    db = SessionLocal()
+    try:
+        v = db.query(Video).filter(Video.id == video_id).first()
+        if not v:
+            return None
+        cached = None
+        if v.content_hash:
+            row = db.query(MediaProbe).filter(MediaProbe.content_hash == v.content_hash).first()
+            cached = row.info if row else None
+        return v.content_hash, v.storage_path, cached
+    finally:
+        db.close()
+
+def _save(video_id: int, content_hash: Optional[str], info: dict, cache: bool) -> None:
+    db = SessionLocal()
+    try:
+        v = db.query(Video).filter(Video.id == video_id).first()
+        if v:
+            v.media_info = info
+            v.duration_ms = info.get("duration_ms") or v.duration_ms
+            db.add(v)
+        if cache and content_hash:
+            db.add(MediaProbe(content_hash=content_hash, info=info))
+        try:
+            db.commit()
+        except IntegrityError:
+            # another worker probed the same blob concurrently; keep its row
+            db.rollback()
+            if v:
+                v = db.query(Video).filter(Video.id == video_id).first()
+                v.media_info = info
+                v.duration_ms = info.get("duration_ms") or v.duration_ms
+                db.add(v)
+                db.commit()
+    finally:
+        db.close()
+
+async def probe_video(video_id: int) -> Optional[dict]:
+    ctx = await run_in_threadpool(_load, video_id)
+    if not ctx:
+        return None
+    content_hash, storage_path, cached = ctx
+    info = cached or await run_in_pool(ffmpeg.probe, media_source(storage_path))
+    await run_in_threadpool(_save, video_id, content_hash, info, cached is None)
+    return info
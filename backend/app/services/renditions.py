@@ -0,0 +1,105 @@
+"""
+Preview renditions: low-bitrate 480p/720p proxies for editing and review.
+
+Built after upload in the media process pool (one encode per pool slot,
+with encoder threads split so the pool never oversubscribes the cores),
+stored once per blob as derived files and recorded on Video.renditions.
+Playback prefers a proxy (see playback_url); publishing and transcription
+keep using the original in storage_path.
+"""
+import os
+import shutil
+import uuid
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Video
+from app.services import ffmpeg
+from app.services.blobs import incoming_dir
+from app.services.derivatives import get_derivatives, save_derivative
+from app.services.media import public_path_url
+from app.services.media_pool import run_in_pool, threads_per_job
+from app.services.storage import media_source
+
+def preview_heights() -> list[int]:
+    return sorted({int(h) for h in settings.PREVIEW_RENDITIONS.split(",") if h.strip().isdigit()})
+
+def rendition_kind(height: int) -> str:
+    return f"preview_{height}p"
+
+def playback_url(v: Video) -> str:
+    """URL players should load: the largest preview proxy when there is one, else the original."""
+    renditions = v.renditions or {}
+    for height in sorted(preview_heights(), reverse=True):
+        r = renditions.get(f"{height}p")
+        if r and r.get("url"):
+            return r["url"]
+    return v.storage_path
+
+def _load(video_id: int):
+    db = SessionLocal()
+    try:
+        v = db.query(Video).filter(Video.id == video_id).first()
+        if not v or not v.content_hash:
+            return None
+        kinds = [rendition_kind(h) for h in preview_heights()]
+        done = get_derivatives(db, v.content_hash, kinds)
+        return v.content_hash, v.storage_path, v.media_info or {}, set(done)
+    finally:
+        db.close()
+
+def _save(sha256: str, height: int, path: str, info: dict) -> None:
+    db = SessionLocal()
+    try:
+        save_derivative(db, sha256, rendition_kind(height), path, f"preview_{height}p.mp4", info)
+    finally:
+        db.close()
+
+def record_renditions(video_id: int) -> Optional[dict]:
+    """Copy the stored proxies of the video's blob onto Video.renditions."""
+    db = SessionLocal()
+    try:
+        v = db.query(Video).filter(Video.id == video_id).first()
+        if not v or not v.content_hash:
+            return None
+        heights = preview_heights()
+        done = get_derivatives(db, v.content_hash, [rendition_kind(h) for h in heights])
+        renditions = {}
+        for h in heights:
+            d = done.get(rendition_kind(h))
+            if d:
+                renditions[f"{h}p"] = {**(d.info or {}), "url": public_path_url(d.path)}
+        v.renditions = renditions or None
+        db.add(v)
+        db.commit()
+        return renditions
+    finally:
+        db.close()
+
+async def build_renditions(video_id: int) -> None:
+    ctx = await run_in_threadpool(_load, video_id)
+    if not ctx:
+        return
+    sha256, storage_path, media_info, done = ctx
+    source_height = (media_info.get("video") or {}).get("height")
+    if not source_height:
+        return
+
+    # no upscaling, and a proxy the size of the original saves nothing
+    todo = [h for h in preview_heights() if h < source_height and rendition_kind(h) not in done]
+    if todo:
+        src = media_source(storage_path)
+        workdir = os.path.join(incoming_dir(), f"renditions_{video_id}_{uuid.uuid4().hex}")
+        await run_in_threadpool(os.makedirs, workdir, exist_ok=True)
+        try:
+            for height in todo:
+                out = os.path.join(workdir, f"preview_{height}p.mp4")
+                info = await run_in_pool(ffmpeg.render_preview, src, out, height, threads_per_job())
+                await run_in_threadpool(_save, sha256, height, out, info)
+        finally:
+            await run_in_threadpool(shutil.rmtree, workdir, True)
+
+    await run_in_threadpool(record_renditions, video_id)
@@ -0,0 +1,225 @@
+"""
+Storage backends for uploaded media.
+
+Files are addressed by a key relative to the store root, e.g.
+"blobs/ab/cd/<sha256>.mp4" or "<user_id>/3f/a1/thumb_12_<uuid>.jpg" (see
+user_key). The public URL
+of a key is always PUBLIC_BASE_URL/uploads/<key>; the /uploads route serves
+local files directly and redirects to a presigned GET for S3, so URLs stored
+in the database do not depend on the backend.
+
+STORAGE_BACKEND=local  files live under UPLOAD_DIR (single node / shared volume)
+STORAGE_BACKEND=s3     any S3-compatible store (AWS, MinIO via S3_ENDPOINT_URL)
+"""
+import hashlib
+import os
+import re
+import shutil
+from typing import BinaryIO, Optional
+
+from app.config import settings
+from app.services.media import public_path_url
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self._path(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put_file(self, key: str, src_path: str, content_type: Optional[str] = None) -> None:
+        """Move a finished local file into the store (a rename when src is on the same filesystem)."""
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.move(src_path, dest)
+
+    def put_fileobj(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> None:
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, "wb") as f:
+            shutil.copyfileobj(fileobj, f)
+
+    def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        dest = self._path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, "wb") as f:
+            f.write(data)
+
+    def fetch_to(self, key: str, dest_path: str) -> None:
+        shutil.copyfile(self._path(key), dest_path)
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+    def link(self, src_key: str, dest_key: str) -> None:
+        """Make `src_key` also available as `dest_key` (hard link, so no data is copied)."""
+        dest = self._path(dest_key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.link(self._path(src_key), dest)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(self._path(src_key), dest)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def download_url(self, key: str) -> str:
+        return public_path_url(key)
+
+class S3Storage:
+    """
+    S3-compatible backend. Large files go up as concurrent multipart uploads
+    and come down as concurrent ranged GETs (boto3 TransferConfig); readers get
+    short-lived presigned URLs.
+    """
+    name = "s3"
+
+    def __init__(self):
+        # optional dependency: only needed when STORAGE_BACKEND=s3
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
+
+        if not settings.S3_BUCKET:
+            raise RuntimeError("S3_BUCKET not set")
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            config=Config(
+                signature_version="s3v4",
+                # MinIO and most self-hosted stores need path-style addressing
+                s3={"addressing_style": "path" if settings.S3_ENDPOINT_URL else "auto"},
+                max_pool_connections=max(10, settings.S3_MAX_CONCURRENCY * 2),
+            ),
+        )
+        self.transfer = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_CHUNK_MB * 1024 * 1024,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_MB * 1024 * 1024,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+            use_threads=True,
+        )
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def _extra(self, content_type: Optional[str]) -> dict:
+        return {"ContentType": content_type} if content_type else {}
+
+    def put_file(self, key: str, src_path: str, content_type: Optional[str] = None) -> None:
+        self.client.upload_file(src_path, self.bucket, key, ExtraArgs=self._extra(content_type), Config=self.transfer)
+        os.remove(src_path)
+
+    def put_fileobj(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> None:
+        self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs=self._extra(content_type), Config=self.transfer)
+
+    def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **self._extra(content_type))
+
+    def fetch_to(self, key: str, dest_path: str) -> None:
+        self.client.download_file(self.bucket, key, dest_path, Config=self.transfer)
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        r = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={start}-{start + length - 1}")
+        return r["Body"].read()
+
+    def link(self, src_key: str, dest_key: str) -> None:
+        # server-side (multipart for large objects) copy; nothing passes through us
+        self.client.copy({"Bucket": self.bucket, "Key": src_key}, self.bucket, dest_key, Config=self.transfer)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def download_url(self, key: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=settings.S3_PRESIGN_SECONDS,
+        )
+
+# "<user_id>/<file>" keys written before per-user files were sharded
+_FLAT_USER_KEY_RE = re.compile(r"^([^/]+)/([^/]+)$")
+
+def user_key(user_id: str, filename: str) -> str:
+    """
+    Key for a per-user file (speaker images, thumbnails, .srt side files).
+
+    Files fan out over two levels of hashed prefix directories so no single
+    directory grows past a few hundred entries, even for accounts with tens
+    of thousands of files.
+    """
+    h = hashlib.md5(filename.encode("utf-8")).hexdigest()
+    return f"{user_id}/{h[:2]}/{h[2:4]}/{filename}"
+
+def sharded_key_for(key: str) -> Optional[str]:
+    """Sharded equivalent of a legacy flat "<user_id>/<file>" key, or None if `key` is not flat."""
+    m = _FLAT_USER_KEY_RE.match(key)
+    if not m or m.group(1).startswith("."):
+        return None
+    return user_key(m.group(1), m.group(2))
+
+_storage = None
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _storage = S3Storage()
+        elif settings.STORAGE_BACKEND == "local":
+            _storage = LocalStorage(settings.UPLOAD_DIR)
+        else:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+    return _storage
+
+def key_from_url(url: Optional[str]) -> Optional[str]:
+    """Storage key for one of our public /uploads URLs, or None for foreign URLs."""
+    if not url:
+        return None
+    prefix = public_path_url("")
+    if url.startswith(prefix):
+        return url[len(prefix):].split("?", 1)[0] or None
+    return None
+
+def fetchable_url(url: Optional[str]) -> Optional[str]:
+    """URL an external service (n8n) can GET directly: presigned for S3, unchanged otherwise."""
+    key = key_from_url(url)
+    return get_storage().download_url(key) if key else url
+
+def media_source(url: Optional[str]) -> Optional[str]:
+    """
+    What ffmpeg should read for one of our URLs: the local file when we have
+    it, else a presigned URL. Foreign URLs (e.g. an ingest that never
+    finished) are refused: ffmpeg must not fetch user-supplied addresses.
+    """
+    key = key_from_url(url)
+    if not key:
+        raise ValueError("Media is not in storage yet")
+    return get_storage().local_path(key) or get_storage().download_url(key)
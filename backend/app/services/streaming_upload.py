@@ -0,0 +1,172 @@
+"""
+Streaming multipart receiver.
+
+Parses the request body incrementally with python-multipart and writes the
+file part straight to its final location. Nothing is spooled to a temp file
+first, disk writes run in the threadpool so the event loop keeps serving
+other requests, and the size limit is enforced while the body is arriving.
+The sha256 of the file is computed on the same pass.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Callable
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+# Coalesce small ASGI body chunks before handing them to the threadpool
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+@dataclass
+class StreamedUpload:
+    filename: str      # client-supplied filename (unsanitized)
+    stored_name: str   # name of the file written on disk
+    path: str
+    size: int
+    sha256: str
+
+class _FilePartCollector:
+    """Turns python-multipart callbacks into a list of open/data/close events for one field."""
+
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+        self.events: list[tuple[str, object]] = []
+        self.seen_file = False
+        self._headers: dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+        self._active = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._field = b""
+        self._value = b""
+        self._active = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = b""
+        self._value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        filename = options.get(b"filename")
+        if name == self.field_name and filename and not self.seen_file:
+            self.seen_file = True
+            self._active = True
+            self.events.append(("open", filename.decode("utf-8", errors="replace")))
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._active:
+            self.events.append(("data", data[start:end]))
+
+    def on_part_end(self):
+        if self._active:
+            self._active = False
+            self.events.append(("close", None))
+
+def _write_and_hash(fh, hasher, data: bytes) -> None:
+    hasher.update(data)
+    fh.write(data)
+
+def _boundary(request: Request) -> bytes:
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(400, "Expected multipart/form-data body")
+    return params[b"boundary"]
+
+async def receive_upload(
+    request: Request,
+    dest_dir: str,
+    make_name: Callable[[str], str],
+    field_name: str = "file",
+    max_bytes: int | None = None,
+) -> StreamedUpload:
+    """
+    Stream the `field_name` file part of a multipart request into `dest_dir`.
+
+    `make_name(client_filename)` returns the on-disk file name. Raises 413 as
+    soon as more than `max_bytes` have arrived; the partial file is removed on
+    any failure.
+    """
+    declared = request.headers.get("content-length")
+    if max_bytes is not None and declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(413, f"Upload exceeds {max_bytes // (1024 * 1024)} MB limit")
+
+    collector = _FilePartCollector(field_name)
+    parser = MultipartParser(_boundary(request), collector.callbacks())
+
+    fh = None
+    path = None
+    filename = None
+    stored_name = None
+    size = 0
+    hasher = hashlib.sha256()
+    pending: list[bytes] = []
+    pending_bytes = 0
+    finished = False
+
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+            for kind, value in collector.events:
+                if kind == "open":
+                    filename = value
+                    stored_name = make_name(filename)
+                    path = os.path.join(dest_dir, stored_name)
+                    fh = await run_in_threadpool(open, path, "wb")
+                elif kind == "data":
+                    size += len(value)
+                    if max_bytes is not None and size > max_bytes:
+                        raise HTTPException(413, f"Upload exceeds {max_bytes // (1024 * 1024)} MB limit")
+                    pending.append(value)
+                    pending_bytes += len(value)
+                elif kind == "close":
+                    finished = True
+            collector.events.clear()
+
+            if fh and (pending_bytes >= WRITE_BUFFER_BYTES or (finished and pending)):
+                await run_in_threadpool(_write_and_hash, fh, hasher, b"".join(pending))
+                pending.clear()
+                pending_bytes = 0
+
+        parser.finalize()
+        if not collector.seen_file:
+            raise HTTPException(400, "Missing file")
+        if not finished:
+            raise HTTPException(400, "Upload body ended before the file part was complete")
+
+        await run_in_threadpool(fh.close)
+        fh = None
+        return StreamedUpload(filename=filename, stored_name=stored_name, path=path, size=size, sha256=hasher.hexdigest())
+    except BaseException:
+        # synchronous on purpose: this also runs when the request task is cancelled
+        if fh:
+            fh.close()
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
@@ -0,0 +1,104 @@
+"""
+Timeline stage: a sprite sheet of frames at a fixed interval plus a binary
+keyframe/byte-offset index, so the caption editor scrubs by loading one
+image instead of seeking through the original over /uploads.
+
+Both are built in the media process pool once per blob and stored as
+derived files (services/derivatives.py).
+"""
+import asyncio
+import math
+import os
+import shutil
+import uuid
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Video
+from app.services import ffmpeg
+from app.services.blobs import incoming_dir
+from app.services.derivatives import get_derivatives, save_derivative
+from app.services.media import public_path_url
+from app.services.media_pool import run_in_pool
+from app.services.storage import media_source
+
+SPRITE_KIND = "timeline_sprite"
+INDEX_KIND = "keyframe_index"
+SPRITE_COLUMNS = 10
+
+INDEX_FORMAT = {
+    "byte_order": "little",
+    "header": {"magic": ffmpeg.KEYFRAME_INDEX_MAGIC.decode(), "fields": ["magic:4s", "version:u8", "count:u32"]},
+    "record": {"size": ffmpeg.KEYFRAME_INDEX_RECORD.size, "fields": ["pts_ms:u32", "byte_offset:u64"]},
+}
+
+def tile_height(media_info: dict, tile_width: int) -> Optional[int]:
+    video = media_info.get("video") or {}
+    if not video.get("width") or not video.get("height"):
+        return None
+    return 2 * round(tile_width * video["height"] / video["width"] / 2)
+
+def _load(video_id: int):
+    db = SessionLocal()
+    try:
+        v = db.query(Video).filter(Video.id == video_id).first()
+        if not v or not v.content_hash:
+            return None
+        done = get_derivatives(db, v.content_hash, [SPRITE_KIND, INDEX_KIND])
+        return v.content_hash, v.storage_path, v.media_info or {}, set(done)
+    finally:
+        db.close()
+
+def _save(sha256: str, sprite_path: str, sprite_info: dict, index_path: str, keyframes: int) -> None:
+    db = SessionLocal()
+    try:
+        save_derivative(db, sha256, SPRITE_KIND, sprite_path, "timeline.jpg", sprite_info)
+        save_derivative(db, sha256, INDEX_KIND, index_path, "keyframes.bin", {"keyframes": keyframes})
+    finally:
+        db.close()
+
+async def build_timeline(video_id: int) -> None:
+    ctx = await run_in_threadpool(_load, video_id)
+    if not ctx:
+        return
+    sha256, storage_path, media_info, done = ctx
+    duration_ms = media_info.get("duration_ms")
+    if {SPRITE_KIND, INDEX_KIND} <= done or not duration_ms or not media_info.get("video"):
+        return
+
+    duration_s = duration_ms / 1000
+    interval_s = max(settings.TIMELINE_INTERVAL_SECONDS, math.ceil(duration_s / settings.TIMELINE_MAX_FRAMES))
+    tile_width = settings.TIMELINE_TILE_WIDTH
+    src = media_source(storage_path)
+
+    workdir = os.path.join(incoming_dir(), f"timeline_{video_id}_{uuid.uuid4().hex}")
+    await run_in_threadpool(os.makedirs, workdir, exist_ok=True)
+    try:
+        sprite_path = os.path.join(workdir, "timeline.jpg")
+        index_path = os.path.join(workdir, "keyframes.bin")
+        sprite_info, keyframes = await asyncio.gather(
+            run_in_pool(ffmpeg.timeline_sprite, src, sprite_path, duration_s, interval_s, tile_width, SPRITE_COLUMNS),
+            run_in_pool(ffmpeg.keyframe_index, src, index_path),
+        )
+        sprite_info.update(tile_width=tile_width, tile_height=tile_height(media_info, tile_width))
+        await run_in_threadpool(_save, sha256, sprite_path, sprite_info, index_path, keyframes)
+    finally:
+        await run_in_threadpool(shutil.rmtree, workdir, True)
+
+def timeline_manifest(db, v: Video) -> dict:
+    done = get_derivatives(db, v.content_hash, [SPRITE_KIND, INDEX_KIND]) if v.content_hash else {}
+    sprite, index = done.get(SPRITE_KIND), done.get(INDEX_KIND)
+    if not sprite or not index:
+        return {"video_id": v.id, "status": "pending"}
+    return {
+        "video_id": v.id,
+        "status": "ready",
+        **(sprite.info or {}),
+        "sprite_url": public_path_url(sprite.path),
+        "index_url": public_path_url(index.path),
+        "keyframes": (index.info or {}).get("keyframes"),
+        "index_format": INDEX_FORMAT,
+    }
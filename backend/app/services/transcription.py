@@ -0,0 +1,181 @@
+"""
+Transcription, whole-file or segmented.
+
+Short videos go to N8N_TRANSCRIBE_URL in one call. Anything longer than
+TRANSCRIBE_SEGMENT_SECONDS is split at silences into chunks of roughly that
+length, each padded by TRANSCRIBE_SEGMENT_OVERLAP_SECONDS on both sides so a
+misplaced cut does not clip a word. Chunks are transcribed concurrently
+(TRANSCRIBE_PARALLELISM calls at a time) and the returned SRTs are stitched:
+cue times are shifted by the chunk offset, each chunk keeps the cues whose
+midpoint lies between its cut points, and cues that still appear twice in an
+overlap are merged.
+
+The transcriber contract is the same for whole files and chunks (form
+fields video_url and language_code, JSON {text, srt} back), so any local
+stub serving that contract works as N8N_TRANSCRIBE_URL. plan_segments and
+merge_segments are pure and can be exercised without ffmpeg or n8n.
+"""
+import asyncio
+import logging
+import os
+import re
+import shutil
+import uuid
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models import Video
+from app.services import captions, ffmpeg, transcription_cache
+from app.services.audio import transcription_source_url
+from app.services.blobs import incoming_dir
+from app.services.media import public_path_url
+from app.services.media_pool import run_in_pool
+from app.services.n8n import submit_transcription_n8n, transcribe_via_n8n
+from app.services.storage import fetchable_url, get_storage, media_source
+
+log = logging.getLogger(__name__)
+
+def plan_segments(
+    duration_s: float, silences: list[tuple[float, float]], target_s: float, overlap_s: float
+) -> list[dict]:
+    """
+    Split [0, duration_s] at silences into chunks of about target_s.
+    Each chunk is {"start", "end"} (the audio sent, cut points +/- overlap)
+    and {"own_start", "own_end"} (the cut points: the cues it is responsible for).
+    """
+    cuts = [0.0]
+    while duration_s - cuts[-1] > target_s * 1.5:
+        ideal = cuts[-1] + target_s
+        lo, hi = cuts[-1] + target_s * 0.5, cuts[-1] + target_s * 1.5
+        mids = [(a + b) / 2 for a, b in silences if lo <= (a + b) / 2 <= hi]
+        cuts.append(min(mids, key=lambda t: abs(t - ideal)) if mids else ideal)
+    cuts.append(duration_s)
+    return [
+        {
+            "start": max(0.0, a - overlap_s),
+            "end": min(duration_s, b + overlap_s),
+            "own_start": a,
+            "own_end": b,
+        }
+        for a, b in zip(cuts, cuts[1:])
+    ]
+
+def _norm(text: str) -> str:
+    return re.sub(r"[^\w]+", " ", text.lower()).strip()
+
+def merge_segments(segments: list[dict], srts: list[Optional[str]]) -> list[dict]:
+    """Shift each chunk's cues onto the full timeline, keep the ones it owns and drop overlap duplicates."""
+    last = len(segments) - 1
+    merged: list[dict] = []
+    for i, (seg, srt) in enumerate(zip(segments, srts)):
+        for start_ms, end_ms, text in captions.parse(srt or ""):
+            start, end = start_ms / 1000 + seg["start"], min(end_ms / 1000 + seg["start"], seg["end"])
+            mid = (start + end) / 2
+            if (i > 0 and mid < seg["own_start"]) or (i < last and mid >= seg["own_end"]):
+                continue
+            if merged:
+                prev = merged[-1]
+                a, b = _norm(prev["text"]), _norm(text)
+                if start < prev["end"] and a and b and (a in b or b in a):
+                    # Same words heard by both chunks around the cut: keep one, spanning both
+                    prev["start"], prev["end"] = min(prev["start"], start), max(prev["end"], end)
+                    if len(b) > len(a):
+                        prev["text"] = text
+                    continue
+                start = max(start, prev["end"])
+                if end <= start:
+                    continue
+            merged.append({"start": start, "end": end, "text": text})
+    return merged
+
+def _should_segment(v: Video) -> bool:
+    duration_ms = (v.media_info or {}).get("duration_ms")
+    target = settings.TRANSCRIBE_SEGMENT_SECONDS
+    return bool(target and duration_ms and duration_ms / 1000 > target * 1.5)
+
+def _publish_segments(prefix: str, paths: list[str]) -> list[str]:
+    storage = get_storage()
+    keys = []
+    for path in paths:
+        key = f"{prefix}/{os.path.basename(path)}"
+        storage.put_file(key, path, None)
+        keys.append(key)
+    return keys
+
+def _delete_keys(keys: list[str]) -> None:
+    storage = get_storage()
+    for key in keys:
+        try:
+            storage.delete(key)
+        except Exception:
+            log.warning("Could not delete transcription segment %s", key)
+
+async def transcribe_segmented(v: Video, source_url: str, language_code: str) -> dict:
+    duration_s = v.media_info["duration_ms"] / 1000
+    src = media_source(source_url)
+    silences = await run_in_pool(
+        ffmpeg.detect_silences, src, settings.TRANSCRIBE_SILENCE_DB, settings.TRANSCRIBE_SILENCE_MIN_SECONDS
+    )
+    segments = plan_segments(
+        duration_s, silences, settings.TRANSCRIBE_SEGMENT_SECONDS, settings.TRANSCRIBE_SEGMENT_OVERLAP_SECONDS
+    )
+    log.info("Video %s: transcribing %.0fs in %d segments", v.id, duration_s, len(segments))
+
+    name = f"transcribe_{v.id}_{uuid.uuid4().hex}"
+    workdir = os.path.join(incoming_dir(), name)
+    await run_in_threadpool(os.makedirs, workdir, exist_ok=True)
+    keys: list[str] = []
+    try:
+        spans = [(s["start"], s["end"]) for s in segments]
+        paths = await run_in_pool(ffmpeg.split_audio, src, workdir, spans, settings.TRANSCRIBE_AUDIO_FORMAT)
+        keys = await run_in_threadpool(_publish_segments, f"transcribe/{name}", paths)
+
+        sem = asyncio.Semaphore(max(1, settings.TRANSCRIBE_PARALLELISM))
+
+        async def one(key: str) -> dict:
+            async with sem:
+                return await transcribe_via_n8n(video_url=fetchable_url(public_path_url(key)), language_code=language_code)
+
+        results = await asyncio.gather(*(one(k) for k in keys))
+    finally:
+        await run_in_threadpool(shutil.rmtree, workdir, True)
+        if keys:
+            await run_in_threadpool(_delete_keys, keys)
+
+    srts = [r.get("srt") for r in results]
+    if not any(srts):
+        # Transcriber returned plain text only; nothing to align, keep the chunks in order
+        return {"text": " ".join((r.get("text") or "").strip() for r in results).strip(), "srt": None}
+    cues = captions.Cues.build(
+        (round(c["start"] * 1000), round(c["end"] * 1000), c["text"]) for c in merge_segments(segments, srts)
+    )
+    return {"text": cues.plain_text(), "srt": cues.to_srt()}
+
+async def transcribe_video(
+    db: Session, v: Video, language_code: str, force: bool = False, callback_url: Optional[str] = None
+) -> Optional[dict]:
+    """
+    {"text", "srt"} for the video: from the transcription cache unless
+    `force`, else one transcriber call, or parallel segments for long media.
+    With `callback_url` a whole-file transcription is only submitted and
+    None is returned; the result arrives at the callback.
+    """
+    source_url = await transcription_source_url(v)  # extracts the audio track, whose hash keys the cache
+    if not force:
+        cached = transcription_cache.get_cached(db, v, language_code)
+        if cached:
+            return {**cached, "cached": True}
+    transcription_cache.record_miss()
+
+    if source_url != v.storage_path and _should_segment(v):
+        res = await transcribe_segmented(v, source_url, language_code)
+    elif callback_url:
+        await submit_transcription_n8n(fetchable_url(source_url), callback_url, language_code)
+        return None
+    else:
+        res = await transcribe_via_n8n(video_url=fetchable_url(source_url), language_code=language_code)
+    transcription_cache.store(db, v, language_code, res)
+    return res
@@ -0,0 +1,65 @@
+"""
+Transcription cache.
+
+Transcribing the same audio in the same language twice gives the same
+result, so the transcriber's output is kept per (audio hash, language,
+TRANSCRIBER_VERSION). The caption endpoint answers from it without queuing
+a job; the caption job checks it again once the audio track exists. Bump
+TRANSCRIBER_VERSION when the n8n workflow or model changes; old entries
+are then simply never read. `force` on the caption request skips lookup.
+
+Counters: transcription_cache.hit / transcription_cache.miss (GET /metrics).
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.metrics import incr
+from app.models import TranscriptionCache, Video
+from app.services.audio import audio_hash
+
+def get_cached(db: Session, v: Video, language_code: str) -> Optional[dict]:
+    """{"text", "srt"} from the cache, or None. Counts a hit; misses are counted where the transcriber is called."""
+    key = audio_hash(db, v)
+    if not key:
+        return None
+    row = (
+        db.query(TranscriptionCache)
+        .filter(
+            TranscriptionCache.audio_hash == key,
+            TranscriptionCache.language == language_code,
+            TranscriptionCache.transcriber_version == settings.TRANSCRIBER_VERSION,
+        )
+        .first()
+    )
+    if not row:
+        return None
+    row.hits += 1
+    row.last_hit_at = datetime.utcnow()
+    db.add(row)
+    db.commit()
+    incr("transcription_cache.hit")
+    return {"text": row.text, "srt": row.srt}
+
+def record_miss() -> None:
+    incr("transcription_cache.miss")
+
+def store(db: Session, v: Video, language_code: str, res: dict) -> None:
+    key = audio_hash(db, v)
+    if not key or not (res.get("srt") or res.get("text")):
+        return
+    stmt = insert(TranscriptionCache).values(
+        audio_hash=key,
+        language=language_code,
+        transcriber_version=settings.TRANSCRIBER_VERSION,
+        text=res.get("text"),
+        srt=res.get("srt"),
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[TranscriptionCache.audio_hash, TranscriptionCache.language, TranscriptionCache.transcriber_version],
+        set_={"text": stmt.excluded.text, "srt": stmt.excluded.srt},
+    ))
+    db.commit()
@@ -0,0 +1,282 @@
+"""
+Caption translation through OpenRouter.
+
+Captions are translated as cue text only: the track is split into its cues
+and consecutive cues are packed into numbered batches of about
+TRANSLATE_BATCH_TOKENS. Only the text goes to the model, as a JSON object
+{"1": "...", "2": "..."}, and the answer must come back with exactly the
+same keys. Timings never leave the process, so they cannot be mangled and
+cost no tokens, and nothing is truncated however long the video is.
+
+A batch whose answer is not valid (bad JSON, missing or extra keys) is
+retried on its own, TRANSLATE_BATCH_RETRIES times, then split in half, so a
+single stubborn cue never costs a whole-file retry. Transient upstream
+errors (429, 5xx, timeouts, dropped connections) are retried per call with
+exponential backoff, up to TRANSLATE_TRANSIENT_RETRIES times. When a batch
+still fails, the other batches of that language are cancelled rather than
+left spending tokens on a result that is thrown away.
+
+Every model call holds a slot: at most TRANSLATE_WORKER_CONCURRENCY calls
+and TRANSLATE_PER_USER_WORKER_CONCURRENCY per user, counted per worker
+process (N workers allow N times as many calls in flight). Batches of one
+language and languages of one request all run concurrently within those
+limits, so a request takes about as long as its slowest batch.
+
+Lines already in the translation memory (services/translation_memory.py)
+and repeats within the track are never sent, unless `retranslate` asks for
+fresh answers (which then replace the remembered ones).
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.services import captions, translation_memory
+from app.services.openrouter import chat_json
+
+log = logging.getLogger(__name__)
+
+# Supported languages for caption translation
+SUPPORTED_LANGUAGES = {
+    "en": "English",
+    "es": "Spanish",
+    "fr": "French",
+    "de": "German",
+    "it": "Italian",
+    "pt": "Portuguese",
+    "nl": "Dutch",
+    "pl": "Polish",
+    "ru": "Russian",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "zh": "Chinese (Simplified)",
+    "zh-TW": "Chinese (Traditional)",
+    "ar": "Arabic",
+    "hi": "Hindi",
+    "th": "Thai",
+    "vi": "Vietnamese",
+    "id": "Indonesian",
+    "ms": "Malay",
+    "tl": "Filipino/Tagalog",
+    "tr": "Turkish",
+    "sv": "Swedish",
+    "da": "Danish",
+    "no": "Norwegian",
+    "fi": "Finnish",
+    "el": "Greek",
+    "he": "Hebrew",
+    "cs": "Czech",
+    "ro": "Romanian",
+    "hu": "Hungarian",
+}
+
+TRANSLATE_SYSTEM = """You are a professional translator specializing in video subtitles/captions.
+You receive a JSON object mapping cue numbers to subtitle lines, in order.
+Translate every value naturally and conversationally, keeping cultural context,
+line breaks ("\\n") and the meaning of each cue within that cue.
+Return STRICT JSON only: the same keys, each mapped to its translation. No markdown.
+"""
+
+TRANSLATE_PROMPT = """Translate these subtitle cues from {source_lang} to {target_lang}.
+Return exactly {count} keys ("1" to "{count}").
+
+{content}"""
+
+# Rough tokens per character for budgeting (no tokenizer dependency); JSON framing per cue on top
+_CHARS_PER_TOKEN = 3.5
+_TOKENS_PER_CUE = 4
+
+_BACKOFF_BASE_SECONDS = 1.0
+_BACKOFF_MAX_SECONDS = 30.0
+
+class BatchError(ValueError):
+    pass
+
+def _transient(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(e, httpx.TransportError)
+
+def _backoff(attempt: int, e: Exception) -> float:
+    retry_after = e.response.headers.get("retry-after") if isinstance(e, httpx.HTTPStatusError) else None
+    if retry_after and retry_after.isdigit():
+        return min(_BACKOFF_MAX_SECONDS, float(retry_after))
+    return min(_BACKOFF_MAX_SECONDS, _BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+async def _call(prompt: str, user_id: Optional[str]) -> dict:
+    """One model call in a translation slot, retrying transient upstream errors (the slot is released while waiting)."""
+    for attempt in range(settings.TRANSLATE_TRANSIENT_RETRIES + 1):
+        try:
+            async with translation_slot(user_id):
+                return await chat_json(TRANSLATE_SYSTEM, prompt)
+        except Exception as e:
+            if not _transient(e) or attempt == settings.TRANSLATE_TRANSIENT_RETRIES:
+                raise
+            delay = _backoff(attempt, e)
+            log.info("Translation call failed (%s), retrying in %.1fs", e, delay)
+            await asyncio.sleep(delay)
+
+async def _gather_batches(coros) -> list:
+    """Run batch coroutines together; the first failure cancels the rest and is raised as-is."""
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(c) for c in coros]
+    except BaseExceptionGroup as eg:
+        raise eg.exceptions[0]
+    return [t.result() for t in tasks]
+
+_global: Optional[asyncio.Semaphore] = None
+# user -> (semaphore, calls holding or waiting for it); dropped when the count reaches 0
+_per_user: dict[str, tuple[asyncio.Semaphore, int]] = {}
+
+@asynccontextmanager
+async def translation_slot(user_id: Optional[str]):
+    """Hold one process-wide and one per-user translation slot (in this worker) for the duration of a model call."""
+    global _global
+    if _global is None:
+        _global = asyncio.Semaphore(max(1, settings.TRANSLATE_WORKER_CONCURRENCY))
+    key = user_id or ""
+    user_sem, users = _per_user.get(key) or (asyncio.Semaphore(max(1, settings.TRANSLATE_PER_USER_WORKER_CONCURRENCY)), 0)
+    _per_user[key] = (user_sem, users + 1)
+    try:
+        async with user_sem:
+            async with _global:
+                yield
+    finally:
+        user_sem, users = _per_user[key]
+        if users <= 1:
+            del _per_user[key]
+        else:
+            _per_user[key] = (user_sem, users - 1)
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / _CHARS_PER_TOKEN) + _TOKENS_PER_CUE
+
+def plan_batches(texts: list[str], budget: int) -> list[tuple[int, int]]:
+    """[start, end) index ranges of consecutive cues, each within `budget` estimated tokens (at least one cue)."""
+    batches, start, used = [], 0, 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and used + cost > budget:
+            batches.append((start, i))
+            start, used = i, 0
+        used += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+def parse_batch(raw: str, count: int) -> list[str]:
+    """The model's answer as `count` texts in order; BatchError if it does not have exactly keys 1..count."""
+    s, e = raw.find("{"), raw.rfind("}")
+    if s == -1 or e <= s:
+        raise BatchError("no JSON object in answer")
+    try:
+        obj = json.loads(raw[s:e + 1])
+    except json.JSONDecodeError as exc:
+        raise BatchError(f"invalid JSON: {exc}")
+    expected = {str(i) for i in range(1, count + 1)}
+    if not isinstance(obj, dict) or set(obj) != expected:
+        got = len(obj) if isinstance(obj, dict) else 0
+        raise BatchError(f"expected {count} cues, got {got}")
+    out = []
+    for i in range(1, count + 1):
+        value = obj[str(i)]
+        if not isinstance(value, str):
+            raise BatchError(f"cue {i} is not a string")
+        out.append(value.strip())
+    return out
+
+async def _translate_batch(texts: list[str], source_lang: str, target_lang: str, user_id: Optional[str]) -> tuple[list[str], Optional[str]]:
+    content = json.dumps({str(i): t for i, t in enumerate(texts, 1)}, ensure_ascii=False)
+    prompt = TRANSLATE_PROMPT.format(source_lang=source_lang, target_lang=target_lang, count=len(texts), content=content)
+    last_error: Optional[Exception] = None
+    for attempt in range(settings.TRANSLATE_BATCH_RETRIES + 1):
+        res = await _call(prompt, user_id)
+        try:
+            return parse_batch(res.get("raw", ""), len(texts)), res.get("model")
+        except BatchError as e:
+            last_error = e
+            log.info("Translation batch of %d cues to %s rejected (attempt %d): %s", len(texts), target_lang, attempt + 1, e)
+    if len(texts) == 1:
+        raise last_error
+    mid = len(texts) // 2
+    (left, model), (right, _) = await _gather_batches([
+        _translate_batch(texts[:mid], source_lang, target_lang, user_id),
+        _translate_batch(texts[mid:], source_lang, target_lang, user_id),
+    ])
+    return left + right, model
+
+async def _translate_uncached(
+    texts: list[str], source_lang: str, target_lang: str, user_id: Optional[str]
+) -> tuple[list[str], Optional[str]]:
+    batches = plan_batches(texts, settings.TRANSLATE_BATCH_TOKENS)
+    results = await _gather_batches([
+        _translate_batch(texts[a:b], _name(source_lang), _name(target_lang), user_id) for a, b in batches
+    ])
+    out: list[str] = []
+    for part, _ in results:
+        out.extend(part)
+    return out, next((m for _, m in results if m), None)
+
+def _name(code: str) -> str:
+    return SUPPORTED_LANGUAGES.get(code, code)
+
+async def translate_texts(
+    texts: list[str], source_lang: str, target_lang: str, user_id: Optional[str] = None, memory_scope: str = "global",
+    retranslate: bool = False,
+) -> tuple[list[str], Optional[str]]:
+    """
+    Translate a list of cue texts between language codes, keeping order and
+    count; returns (texts, model used). Lines found in the translation
+    memory are not sent (all are with `retranslate`), and repeated lines are
+    sent once.
+    """
+    model = settings.OPENROUTER_MODEL
+    scope = translation_memory.scope_key(memory_scope, user_id)
+    norm = [translation_memory.normalize_text(t) for t in texts]
+    hashes = [translation_memory.text_hash(n) for n in norm]
+    unique = [h for h in dict.fromkeys(h for h, n in zip(hashes, norm) if n)]
+
+    known: dict[str, str] = {}
+    if scope is not None and not retranslate:
+        known = await run_in_threadpool(translation_memory.lookup, scope, unique, source_lang, target_lang, model)
+
+    todo = [h for h in unique if h not in known]
+    pending = set(todo)
+    source_of = dict(zip(hashes, norm))
+    if todo:
+        translated, model = await _translate_uncached([source_of[h] for h in todo], source_lang, target_lang, user_id)
+        fresh = dict(zip(todo, translated))
+        if scope is not None and model:
+            await run_in_threadpool(
+                translation_memory.store, scope, [(h, source_of[h], fresh[h]) for h in todo],
+                source_lang, target_lang, model, retranslate,
+            )
+        known.update(fresh)
+
+    if scope is not None:
+        # Distinct non-blank lines: a miss is a line sent to the model (once, however often it repeats)
+        saved = sum(estimate_tokens(source_of[h]) for h in unique if h not in pending)
+        await run_in_threadpool(translation_memory.record, len(unique) - len(pending), len(pending), saved)
+    return [known.get(h, t) if n else t for h, n, t in zip(hashes, norm, texts)], model
+
+async def translate_track(
+    source_track: dict, source_lang: str, target_lang: str, user_id: Optional[str] = None, memory_scope: str = "global",
+    retranslate: bool = False,
+) -> tuple[dict, Optional[str]]:
+    """Translate one caption track (language codes) onto the same timings; returns (new track, model used)."""
+    cues = captions.track_cues(source_track)
+    if cues is not None:
+        texts, model = await translate_texts(cues.texts(), source_lang, target_lang, user_id, memory_scope, retranslate)
+        return captions.cues_track(cues.with_texts(texts)), model
+    # Untimed transcript: translate it paragraph by paragraph the same way
+    paragraphs = [p for p in re.split(r"\n\s*\n", source_track.get("text") or "") if p.strip()]
+    texts, model = await translate_texts(paragraphs, source_lang, target_lang, user_id, memory_scope, retranslate)
+    return captions.make_track("\n\n".join(texts), "text"), model
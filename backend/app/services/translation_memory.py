@@ -0,0 +1,130 @@
+"""
+Translation memory: caption lines translated before, shared across videos.
+
+Intros, outros, sponsor reads and catchphrases repeat across a channel's
+videos, so each cue line is looked up by exact match on its normalized text
+(Unicode NFC, whitespace collapsed per line) for the language pair and
+model before anything goes to the model. Scope "global" shares the memory
+between all users, "user" keeps one per user, "off" skips it.
+
+A line the model returned unchanged is never remembered (it is usually an
+untranslated answer, and cheap to ask again). A retranslate request skips
+the lookup and overwrites the stored lines with the new answers, which is
+how a bad translation is replaced.
+
+Counters (GET /metrics): translation_memory.hit / .miss, in distinct
+non-blank lines per track (a miss is a line sent to the model), and
+translation_memory.tokens_saved, the estimated input tokens not sent.
+"""
+import hashlib
+import re
+import unicodedata
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db import SessionLocal
+from app.metrics import incr
+from app.models import TranslationMemory
+
+TRANSLATION_MEMORY_SCOPES = ("global", "user", "off")
+_LOOKUP_CHUNK = 500
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFC", text)
+    return "\n".join(re.sub(r"\s+", " ", line).strip() for line in text.strip().splitlines() if line.strip())
+
+def text_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def scope_key(scope: str, user_id: Optional[str]) -> Optional[str]:
+    """Value of the scope column for a request, None when the memory is off."""
+    if scope == "off":
+        return None
+    if scope == "user":
+        return user_id or None
+    return ""
+
+def lookup(scope: str, hashes: list[str], source_lang: str, target_lang: str, model: str) -> dict[str, str]:
+    """{source_hash: translation} for the hashes the memory has; bumps their hit counts."""
+    found: dict[str, str] = {}
+    if not hashes:
+        return found
+    db = SessionLocal()
+    try:
+        base = (
+            TranslationMemory.scope == scope,
+            TranslationMemory.source_lang == source_lang,
+            TranslationMemory.target_lang == target_lang,
+            TranslationMemory.model == model,
+        )
+        for i in range(0, len(hashes), _LOOKUP_CHUNK):
+            chunk = hashes[i:i + _LOOKUP_CHUNK]
+            rows = (
+                db.query(TranslationMemory.source_hash, TranslationMemory.target_text)
+                .filter(*base, TranslationMemory.source_hash.in_(chunk))
+                .all()
+            )
+            found.update(rows)
+        if found:
+            db.query(TranslationMemory).filter(*base, TranslationMemory.source_hash.in_(list(found))).update(
+                {TranslationMemory.hits: TranslationMemory.hits + 1, TranslationMemory.last_hit_at: datetime.utcnow()},
+                synchronize_session=False,
+            )
+            db.commit()
+        return found
+    finally:
+        db.close()
+
+def store(
+    scope: str, entries: list[tuple[str, str, str]], source_lang: str, target_lang: str, model: str,
+    overwrite: bool = False,
+) -> None:
+    """
+    Remember (source_hash, normalized source, translation) entries, except
+    translations equal to their source. Existing entries are kept, or with
+    `overwrite` replaced (and dropped where the new answer is unchanged).
+    """
+    entries = list({e[0]: e for e in entries}.values())
+    unchanged = [h for h, src, dst in entries if normalize_text(dst) == src]
+    rows = [
+        {
+            "scope": scope, "source_hash": h, "source_lang": source_lang, "target_lang": target_lang,
+            "model": model, "source_text": src, "target_text": dst,
+        }
+        for h, src, dst in entries if normalize_text(dst) != src
+    ]
+    if not rows and not (overwrite and unchanged):
+        return
+    db = SessionLocal()
+    try:
+        if rows:
+            stmt = insert(TranslationMemory).values(rows)
+            if overwrite:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[
+                        TranslationMemory.scope, TranslationMemory.source_hash, TranslationMemory.source_lang,
+                        TranslationMemory.target_lang, TranslationMemory.model,
+                    ],
+                    set_={"target_text": stmt.excluded.target_text, "hits": 0, "last_hit_at": None},
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing()
+            db.execute(stmt)
+        if overwrite and unchanged:
+            db.query(TranslationMemory).filter(
+                TranslationMemory.scope == scope,
+                TranslationMemory.source_lang == source_lang,
+                TranslationMemory.target_lang == target_lang,
+                TranslationMemory.model == model,
+                TranslationMemory.source_hash.in_(unchanged),
+            ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def record(hits: int, misses: int, tokens_saved: int) -> None:
+    incr("translation_memory.hit", hits)
+    incr("translation_memory.miss", misses)
+    incr("translation_memory.tokens_saved", tokens_saved)
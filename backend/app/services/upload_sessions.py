@@ -0,0 +1,137 @@
+"""
+Resumable upload sessions.
+
+Each session owns a sparse part file sized to the final upload. Chunks are
+pwrite()n at their offset, so out-of-order or retried chunks never require
+concatenation or buffering, and finalizing is a rename into the user's
+upload directory.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import UploadSession
+
+log = logging.getLogger(__name__)
+
+# Coalesce small ASGI body chunks into fewer pwrite() calls
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+def sessions_dir() -> str:
+    return os.path.join(settings.UPLOAD_DIR, ".sessions")
+
+def session_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+def create_part_file(path: str, size: int) -> None:
+    """Create a sparse file of the final size so every chunk can be written in place."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+def pwrite_all(fd: int, data: bytes, pos: int) -> None:
+    view = memoryview(data)
+    while view:
+        n = os.pwrite(fd, view, pos)
+        view = view[n:]
+        pos += n
+
+class RangeWriter:
+    """
+    Writes an async byte stream into `path` at `start`.
+
+    `written` always reflects the bytes that reached the file, even when the
+    stream fails half way (client disconnect), so the caller can record the
+    partial range and the client resumes from there instead of from scratch.
+    """
+
+    def __init__(self, path: str, start: int, limit: int):
+        self.path = path
+        self.start = start
+        self.limit = limit
+        self.written = 0
+
+    async def run(self, chunks) -> int:
+        fd = await run_in_threadpool(os.open, self.path, os.O_WRONLY)
+        pending: list[bytes] = []
+        pending_bytes = 0
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if self.written + pending_bytes + len(chunk) > self.limit:
+                    raise ValueError("Chunk is larger than its declared range")
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+                if pending_bytes >= WRITE_BUFFER_BYTES:
+                    await self._flush(fd, pending)
+                    pending.clear()
+                    pending_bytes = 0
+            if pending:
+                await self._flush(fd, pending)
+            return self.written
+        finally:
+            os.close(fd)
+
+    async def _flush(self, fd: int, pending: list[bytes]) -> None:
+        data = b"".join(pending)
+        await run_in_threadpool(pwrite_all, fd, data, self.start + self.written)
+        self.written += len(data)
+
+def merge_range(ranges: list | None, start: int, end: int) -> list[list[int]]:
+    """Insert [start, end) into a sorted list of disjoint ranges, coalescing neighbours."""
+    out: list[list[int]] = []
+    for s, e in sorted((ranges or []) + [[start, end]]):
+        if out and s <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], e)
+        else:
+            out.append([s, e])
+    return out
+
+def contiguous_offset(ranges: list | None) -> int:
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+def _remove(path: str | None) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def sweep_expired() -> int:
+    """Delete sessions past their TTL together with any part file left behind."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(UploadSession)
+            .filter(UploadSession.expires_at < datetime.utcnow())
+            .all()
+        )
+        for s in rows:
+            _remove(s.temp_path)
+            db.delete(s)
+        db.commit()
+        return len(rows)
+    finally:
+        db.close()
+
+async def run_sweeper() -> None:
+    while True:
+        try:
+            n = await run_in_threadpool(sweep_expired)
+            if n:
+                log.info("Expired %d upload session(s)", n)
+        except Exception:
+            log.exception("Upload session sweep failed")
+        await asyncio.sleep(settings.UPLOAD_SESSION_SWEEP_SECONDS)
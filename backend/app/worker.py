@@ -0,0 +1,83 @@
+"""
+Job worker: python -m app.worker
+
+Runs JOB_WORKER_CONCURRENCY job slots that claim from the jobs table (see
+services/jobs.py). Start as many workers on as many nodes as needed; they
+coordinate only through Postgres. On SIGTERM/SIGINT a worker stops claiming
+and lets running jobs finish. Every GAUGE_PUBLISH_SECONDS the worker
+publishes its HTTP pool gauges for GET /metrics (app/metrics.py).
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import init_engine
+from app.metrics import GAUGE_PUBLISH_SECONDS, publish_gauges, withdraw_gauges
+from app.services import jobs
+from app.services.callbacks import check_config as check_callback_config
+from app.services.http_clients import close_clients, open_clients, pool_stats
+from app.services.media_pool import shutdown_pool
+
+# Modules that register job handlers
+import app.api_videos  # noqa: F401  caption, ingest
+import app.api_ai  # noqa: F401  metadata
+import app.api_youtube  # noqa: F401  publish_youtube
+import app.api_publish  # noqa: F401  publish_n8n
+import app.api_clips  # noqa: F401  clips
+
+log = logging.getLogger("app.worker")
+
+async def slot(worker_id: str, stopping: asyncio.Event) -> None:
+    while not stopping.is_set():
+        try:
+            job_id = await run_in_threadpool(jobs.claim, worker_id)
+        except Exception:
+            log.exception("Claiming a job failed")
+            job_id = None
+        if job_id is None:
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=settings.JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await jobs.run_job(job_id, worker_id)
+
+async def publish(worker_id: str, stopping: asyncio.Event) -> None:
+    while not stopping.is_set():
+        await run_in_threadpool(publish_gauges, worker_id, {"http_pools": pool_stats()})
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=GAUGE_PUBLISH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+    await run_in_threadpool(withdraw_gauges, worker_id)
+
+async def main() -> None:
+    init_engine(settings.DATABASE_URL)
+    check_callback_config()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    await open_clients()
+    log.info("Worker %s started with %d slots (%s)", worker_id, settings.JOB_WORKER_CONCURRENCY, ", ".join(sorted(jobs.HANDLERS)))
+    try:
+        await asyncio.gather(
+            publish(worker_id, stopping),
+            *(slot(worker_id, stopping) for _ in range(settings.JOB_WORKER_CONCURRENCY)),
+        )
+    finally:
+        shutdown_pool()
+        await close_clients()
+    log.info("Worker %s stopped", worker_id)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+import pytest
+
+from app.services import captions
+
+SRT = """1
+00:00:01,000 --> 00:00:02,500
+Hello there.
+
+2
+00:00:03,000 --> 00:00:04,000
+Two lines
+of text.
+"""
+
+def test_parse_srt():
+    cues = captions.parse(SRT)
+    assert list(cues) == [(1000, 2500, "Hello there."), (3000, 4000, "Two lines\nof text.")]
+
+def test_parse_vtt_skips_header_notes_and_settings():
+    vtt = """WEBVTT
+Kind: captions
+
+NOTE a comment
+spanning lines
+
+intro
+00:01.000 --> 00:02.000 align:start
+Hi.
+
+01:00:00.500 --> 01:00:01.000
+Later.
+"""
+    assert list(captions.parse(vtt)) == [(1000, 2000, "Hi."), (3600500, 3601000, "Later.")]
+
+def test_parse_missing_blank_line_drops_glued_index():
+    srt = "1\n00:00:01,000 --> 00:00:02,000\nFirst\n2\n00:00:03,000 --> 00:00:04,000\nSecond\n"
+    assert captions.parse(srt).texts() == ["First", "Second"]
+
+def test_parse_keeps_numeric_cue_text():
+    srt = "1\n00:00:01,000 --> 00:00:02,000\n2019\n\n2\n00:00:03,000 --> 00:00:04,000\n42\n"
+    assert captions.parse(srt).texts() == ["2019", "42"]
+
+def test_parse_keeps_numeric_last_line_that_is_not_the_next_index():
+    srt = "1\n00:00:01,000 --> 00:00:02,000\nThe answer is\n42\n2\n00:00:03,000 --> 00:00:04,000\nSecond\n"
+    assert captions.parse(srt).texts() == ["The answer is\n42", "Second"]
+
+def test_parse_accepts_iterable_of_lines():
+    assert list(captions.parse(iter(SRT.splitlines(keepends=True)))) == list(captions.parse(SRT))
+
+def test_srt_round_trip():
+    cues = captions.parse(SRT)
+    assert list(captions.parse(cues.to_srt())) == list(cues)
+    assert list(captions.parse(cues.to_vtt())) == list(cues)
+
+def test_with_texts_keeps_timings():
+    cues = captions.parse(SRT).with_texts(["Hola.", "Dos líneas"])
+    assert list(cues) == [(1000, 2500, "Hola."), (3000, 4000, "Dos líneas")]
+    with pytest.raises(ValueError):
+        cues.with_texts(["only one"])
+
+def test_normalize_rebuilds_v2_tracks():
+    track = captions.cues_track(captions.parse(SRT))
+    doc = captions.normalize({"version": 2, "primary": "fr", "tracks": {"en": track}})
+    assert doc == {"version": 2, "primary": "en", "tracks": {"en": track}}
+
+@pytest.mark.parametrize("tracks", [
+    {"en": {"cues": {"start_ms": "x"}}},
+    {"en": {"cues": {"start_ms": [0], "end_ms": [1], "offsets": [0, 9], "text": "short"}}},
+    {"en": {"cues": {"start_ms": [0, 5], "end_ms": [1], "offsets": [0, 1, 2], "text": "ab"}}},
+    {"en": "not a track"},
+])
+def test_normalize_rejects_malformed_v2(tracks):
+    with pytest.raises(captions.CaptionError):
+        captions.normalize({"version": 2, "tracks": tracks})
+
+def test_normalize_legacy_shapes():
+    doc = captions.normalize({"srt": SRT}, "de")
+    assert doc["primary"] == "de"
+    assert captions.track_cues(doc["tracks"]["de"]).texts() == ["Hello there.", "Two lines\nof text."]
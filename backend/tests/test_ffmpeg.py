@@ -0,0 +1,91 @@
+import hashlib
+import shutil
+
+import pytest
+
+from app.config import settings
+from app.services import ffmpeg
+
+pytestmark = pytest.mark.skipif(
+    not shutil.which(settings.FFMPEG_BIN) or not shutil.which(settings.FFPROBE_BIN), reason="ffmpeg not installed"
+)
+
+def _sha256(path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _tone(dest, *extra: str) -> str:
+    ffmpeg._ffmpeg(
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000:duration=3",
+        "-metadata", "title=source", *extra, str(dest),
+    )
+    return str(dest)
+
+@pytest.mark.parametrize("fmt", sorted(ffmpeg.TRANSCRIBE_AUDIO_CODECS))
+def test_extract_audio_is_deterministic_across_runs_and_containers(tmp_path, fmt):
+    ext, _ = ffmpeg.TRANSCRIBE_AUDIO_CODECS[fmt]
+    wav = _tone(tmp_path / "tone.wav")
+    mka = tmp_path / "tone.mka"
+    ffmpeg._ffmpeg("-i", wav, "-c", "copy", "-metadata", "title=remuxed", str(mka))
+
+    outputs = []
+    for i, src in enumerate([wav, wav, str(mka)]):
+        dest = tmp_path / f"out{i}.{ext}"
+        info = ffmpeg.extract_audio(src, str(dest), fmt)
+        assert info["size"] == dest.stat().st_size
+        outputs.append(_sha256(dest))
+
+    assert len(set(outputs)) == 1
+
+@pytest.fixture
+def h264_source(tmp_path) -> str:
+    """10 s of 25 fps H.264 with a keyframe every 2 s, plus audio."""
+    dest = str(tmp_path / "source.mp4")
+    ffmpeg._ffmpeg(
+        "-f", "lavfi", "-i", "testsrc2=size=320x240:rate=25:duration=10",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000:duration=10",
+        "-c:v", "libx264", "-profile:v", "main", "-level:v", "3.1", "-refs", "3", "-pix_fmt", "yuv420p",
+        "-g", "50", "-keyint_min", "50", "-sc_threshold", "0",
+        "-c:a", "aac", "-shortest", dest,
+    )
+    return dest
+
+def _decode_frames(path: str) -> int:
+    """Decodes every frame, failing on any decode error; returns the frame count."""
+    res = ffmpeg.run([
+        settings.FFPROBE_BIN, "-v", "error", "-err_detect", "explode", "-count_frames",
+        "-select_streams", "v:0", "-show_entries", "stream=nb_read_frames", "-of", "csv=p=0", path,
+    ])
+    return int(res.stdout.decode().strip())
+
+def test_smart_cut_copies_the_middle_and_splices_cleanly(h264_source, tmp_path):
+    info = ffmpeg.probe(h264_source)
+    dest = str(tmp_path / "clip.mp4")
+
+    stats = ffmpeg.smart_cut(h264_source, dest, 1.0, 7.0, info, str(tmp_path))
+
+    assert stats["mode"] == "smart", stats
+    assert stats["copied_s"] == pytest.approx(4.0, abs=0.1)  # keyframes at 2 s and 6 s
+    assert stats["reencoded_s"] == pytest.approx(2.0, abs=0.1)
+    out = ffmpeg.probe(dest)
+    assert out["duration_ms"] == pytest.approx(6000, abs=150)
+    assert _decode_frames(dest) == pytest.approx(150, abs=2)
+    source, clip = ffmpeg.stream_params(h264_source), ffmpeg.stream_params(dest)
+    assert {k: clip.get(k) for k in ffmpeg.SPLICE_PARAMS} == {k: source.get(k) for k in ffmpeg.SPLICE_PARAMS}
+
+def test_smart_cut_falls_back_when_parameter_sets_differ(h264_source, tmp_path, monkeypatch):
+    info = ffmpeg.probe(h264_source)
+    real = ffmpeg.stream_params
+
+    def stream_params(path):
+        params = real(path)
+        return {**params, "level": 52} if path.endswith(".ts") else params
+
+    monkeypatch.setattr(ffmpeg, "stream_params", stream_params)
+    dest = str(tmp_path / "clip.mp4")
+
+    stats = ffmpeg.smart_cut(h264_source, dest, 1.0, 7.0, info, str(tmp_path))
+
+    assert stats["mode"] == "reencode"
+    assert "level" in stats["fallback"]
+    assert _decode_frames(dest) == pytest.approx(150, abs=2)
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import os
+import re
+from http.server import BaseHTTPRequestHandler
+
+import httpx
+import pytest
+
+from app.services import ingest
+from app.services.ingest import BlockedURL, TooLarge, download_to_file
+
+DATA = os.urandom(1_000_003)
+
+def _origin(
+    data: bytes, ranges: bool = True, length: bool = True, fail_from: int = None, requests: list = None,
+    advertise_ranges: bool = None, probe_only: bool = False, hosts: list = None,
+):
+    """
+    A file server: Range support and Content-Length can be switched off,
+    Accept-Ranges can be advertised regardless, `probe_only` honours just the
+    one-byte probe, and range requests starting at or after `fail_from` answer 500.
+    """
+    advertise = ranges if advertise_ranges is None else advertise_ranges
+
+    class Handler(BaseHTTPRequestHandler):
+        def _headers(self, status: int, size: int, extra: dict = ()):
+            self.send_response(status)
+            if advertise:
+                self.send_header("Accept-Ranges", "bytes")
+            if length:
+                self.send_header("Content-Length", str(size))
+            for k, v in dict(extra).items():
+                self.send_header(k, v)
+            self.end_headers()
+
+        def do_HEAD(self):
+            self._headers(200, len(data))
+
+        def do_GET(self):
+            header = self.headers.get("Range")
+            if requests is not None:
+                requests.append(header)
+            if hosts is not None:
+                hosts.append(self.headers.get("Host"))
+            m = re.fullmatch(r"bytes=(\d+)-(\d+)", header or "")
+            if not (ranges and m) or (probe_only and header != "bytes=0-0"):
+                self._headers(200, len(data))
+                self.wfile.write(data)
+                return
+            start, end = int(m.group(1)), min(int(m.group(2)), len(data) - 1)
+            if fail_from is not None and start >= fail_from and header != "bytes=0-0":
+                self.send_error(500)
+                return
+            self._headers(206, end - start + 1, {"Content-Range": f"bytes {start}-{end}/{len(data)}"})
+            self.wfile.write(data[start:end + 1])
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def _download(url: str, dest: str, **kwargs):
+    progress = []
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await download_to_file(
+                url, dest, lambda done, total, parts: progress.append((done, total, parts)), client=client, **kwargs
+            )
+
+    return asyncio.run(run()), progress
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def test_ranged_download(http_server, tmp_path):
+    requests = []
+    url = http_server(_origin(DATA, requests=requests)) + "/video.mp4"
+    dest = str(tmp_path / "video.mp4")
+
+    (size, sha256), progress = _download(url, dest, parts=4, min_part_bytes=100_000)
+
+    assert (size, sha256) == (len(DATA), hashlib.sha256(DATA).hexdigest())
+    assert _read(dest) == DATA
+    assert progress[-1] == (len(DATA), len(DATA), 4)
+    assert len([r for r in requests if r and r != "bytes=0-0"]) == 4
+
+def test_small_file_is_one_request(http_server, tmp_path):
+    url = http_server(_origin(DATA)) + "/video.mp4"
+    dest = str(tmp_path / "video.mp4")
+
+    (size, _), progress = _download(url, dest, parts=4, min_part_bytes=len(DATA) + 1)
+
+    assert size == len(DATA) and _read(dest) == DATA
+    assert {p for _, _, p in progress} == {1}
+
+def test_origin_without_ranges_is_streamed(http_server, tmp_path):
+    url = http_server(_origin(DATA, ranges=False)) + "/video.mp4"
+    dest = str(tmp_path / "video.mp4")
+
+    (size, sha256), _ = _download(url, dest, parts=4, min_part_bytes=100_000)
+
+    assert (size, sha256) == (len(DATA), hashlib.sha256(DATA).hexdigest())
+    assert _read(dest) == DATA
+
+def test_advertised_but_ignored_ranges_are_streamed(http_server, tmp_path):
+    requests = []
+    url = http_server(_origin(DATA, ranges=False, advertise_ranges=True, requests=requests)) + "/video.mp4"
+    dest = str(tmp_path / "video.mp4")
+
+    (size, sha256), progress = _download(url, dest, parts=4, min_part_bytes=100_000)
+
+    assert (size, sha256) == (len(DATA), hashlib.sha256(DATA).hexdigest())
+    assert _read(dest) == DATA
+    assert requests == ["bytes=0-0", None]
+    assert {p for _, _, p in progress} == {1}
+
+def test_parts_answered_with_200_fall_back_to_one_stream(http_server, tmp_path):
+    url = http_server(_origin(DATA, probe_only=True)) + "/video.mp4"
+    dest = str(tmp_path / "video.mp4")
+
+    (size, sha256), progress = _download(url, dest, parts=4, min_part_bytes=100_000)
+
+    assert (size, sha256) == (len(DATA), hashlib.sha256(DATA).hexdigest())
+    assert _read(dest) == DATA
+    assert progress[-1] == (len(DATA), len(DATA), 1)
+
+def test_failed_part_fails_download_and_removes_file(http_server, tmp_path):
+    url = http_server(_origin(DATA, fail_from=len(DATA) // 2)) + "/video.mp4"
+    dest = str(tmp_path / "video.mp4")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        _download(url, dest, parts=4, min_part_bytes=100_000)
+    assert not os.path.exists(dest)
+
+def test_declared_size_over_cap_is_refused(http_server, tmp_path):
+    requests = []
+    url = http_server(_origin(DATA, requests=requests)) + "/video.mp4"
+    dest = str(tmp_path / "video.mp4")
+
+    with pytest.raises(TooLarge) as e:
+        _download(url, dest, max_bytes=len(DATA) - 1)
+    assert e.value.status_code == 413
+    assert not os.path.exists(dest)
+    assert requests == ["bytes=0-0"]  # refused on the probe's headers, nothing else requested
+
+def test_received_bytes_over_cap_abort(http_server, tmp_path):
+    url = http_server(_origin(DATA, ranges=False, length=False)) + "/video.mp4"
+    dest = str(tmp_path / "video.mp4")
+
+    with pytest.raises(TooLarge):
+        _download(url, dest, max_bytes=300_000)
+    assert not os.path.exists(dest)
+
+@pytest.mark.parametrize("url", ["ftp://example.com/video.mp4", "file:///etc/passwd", "http:///no-host"])
+def test_only_http_urls(url, tmp_path):
+    with pytest.raises(BlockedURL):
+        _download(url, str(tmp_path / "video.mp4"))
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/video.mp4",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5:8080/video.mp4",
+    "http://[::1]/video.mp4",
+])
+def test_non_public_addresses_are_blocked(url):
+    with pytest.raises(BlockedURL):
+        asyncio.run(ingest.check_url(url))
+
+def test_public_address_is_returned_for_pinning():
+    assert asyncio.run(ingest.check_url("https://93.184.215.14/video.mp4")) == "93.184.215.14"
+
+def test_owned_client_connects_to_the_vetted_address(http_server, monkeypatch, tmp_path):
+    # "media.invalid" never resolves: the download only works if it goes to the address check_url vetted
+    hosts = []
+    port = http_server(_origin(DATA, hosts=hosts)).rsplit(":", 1)[1]
+    vetted = []
+
+    async def check_url(url):
+        vetted.append(url)
+        return "127.0.0.1"
+
+    monkeypatch.setattr(ingest, "check_url", check_url)
+    dest = str(tmp_path / "video.mp4")
+
+    size, _ = asyncio.run(download_to_file(f"http://media.invalid:{port}/video.mp4", dest, parts=2, min_part_bytes=100_000))
+
+    assert size == len(DATA) and _read(dest) == DATA
+    assert hosts and set(hosts) == {f"media.invalid:{port}"}
+    assert len(vetted) == len(hosts)
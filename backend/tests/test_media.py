@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from app.config import settings
+from app.services.media import media_response
+
+@pytest.fixture
+def legacy_file(tmp_path):
+    relpath = "uploads/user-1/Café vidéo 100% ?final 動画.mp4"
+    path = tmp_path / relpath
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"0123456789")
+    return relpath, str(path)
+
+def test_accel_redirect_percent_encodes_legacy_names(legacy_file, monkeypatch):
+    relpath, path = legacy_file
+    monkeypatch.setattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/_media/")
+
+    r = media_response(relpath, path, os.stat(path), {}, "GET")
+
+    assert r.status_code == 200
+    assert r.headers["x-accel-redirect"] == (
+        "/_media/uploads/user-1/Caf%C3%A9%20vid%C3%A9o%20100%25%20%3Ffinal%20%E5%8B%95%E7%94%BB.mp4"
+    )
+
+def test_range_response_for_non_ascii_name(legacy_file, monkeypatch):
+    relpath, path = legacy_file
+    monkeypatch.setattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", None)
+
+    r = media_response(relpath, path, os.stat(path), {"range": "bytes=2-5"}, "GET")
+
+    assert r.status_code == 206
+    assert r.headers["content-range"] == "bytes 2-5/10"
+    assert r.headers["content-length"] == "4"
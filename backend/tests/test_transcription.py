@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+from http.server import BaseHTTPRequestHandler
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+import pytest
+
+from app.config import settings
+from app.services import transcription
+from app.services.http_clients import close_clients
+from app.services.transcription import merge_segments, plan_segments
+
+def _srt(*cues: tuple[float, float, str]) -> str:
+    def stamp(t: float) -> str:
+        ms = round(t * 1000)
+        return f"{ms // 3600000:02}:{ms // 60000 % 60:02}:{ms // 1000 % 60:02},{ms % 1000:03}"
+    return "\n".join(f"{i}\n{stamp(a)} --> {stamp(b)}\n{text}\n" for i, (a, b, text) in enumerate(cues, 1))
+
+def test_plan_segments_short_media_is_one_chunk():
+    assert plan_segments(80.0, [], 60, 2.0) == [{"start": 0.0, "end": 80.0, "own_start": 0.0, "own_end": 80.0}]
+
+def test_plan_segments_cuts_at_silences_with_overlap():
+    segments = plan_segments(150.0, [(58.0, 59.0), (100.0, 100.5), (121.0, 122.0)], 60, 2.0)
+    assert [(s["own_start"], s["own_end"]) for s in segments] == [(0.0, 58.5), (58.5, 121.5), (121.5, 150.0)]
+    assert [(s["start"], s["end"]) for s in segments] == [(0.0, 60.5), (56.5, 123.5), (119.5, 150.0)]
+
+def test_plan_segments_without_silence_cuts_at_target():
+    segments = plan_segments(200.0, [], 60, 1.0)
+    assert [s["own_end"] for s in segments] == [60.0, 120.0, 200.0]
+
+SEGMENTS = [
+    {"start": 0.0, "end": 60.5, "own_start": 0.0, "own_end": 58.5},
+    {"start": 56.5, "end": 123.5, "own_start": 58.5, "own_end": 123.5},
+]
+
+def test_merge_segments_shifts_and_keeps_owned_cues():
+    srts = [
+        _srt((1.0, 3.0, "Hello there."), (57.0, 58.0, "Before the cut")),
+        # The same cue heard again in the overlap: its midpoint belongs to chunk 0
+        _srt((0.5, 1.5, "Before the cut"), (10.0, 12.0, "Middle part.")),
+    ]
+    merged = merge_segments(SEGMENTS, srts)
+    assert [(c["start"], c["end"], c["text"]) for c in merged] == [
+        (1.0, 3.0, "Hello there."),
+        (57.0, 58.0, "Before the cut"),
+        (66.5, 68.5, "Middle part."),
+    ]
+
+def test_merge_segments_dedupes_words_heard_by_both_chunks():
+    srts = [
+        _srt((57.0, 58.4, "So we said goodbye")),
+        _srt((1.5, 2.7, "said goodbye,"), (5.0, 6.0, "Next line.")),
+    ]
+    merged = merge_segments(SEGMENTS, srts)
+    assert [c["text"] for c in merged] == ["So we said goodbye", "Next line."]
+    assert merged[0]["start"] == pytest.approx(57.0)
+    assert merged[0]["end"] == pytest.approx(59.2)
+
+def test_merge_segments_never_overlaps_distinct_cues():
+    srts = [_srt((57.0, 58.4, "First thought")), _srt((1.8, 3.0, "Another thought"))]
+    first, second = merge_segments(SEGMENTS, srts)
+    assert second["start"] == pytest.approx(first["end"])
+
+def test_merge_segments_tolerates_missing_srt():
+    assert merge_segments(SEGMENTS, [None, _srt((10.0, 12.0, "Only this."))]) == [
+        {"start": 66.5, "end": 68.5, "text": "Only this."}
+    ]
+
+class _FakeStorage:
+    def __init__(self):
+        self.stored, self.deleted = [], []
+
+    def put_file(self, key, path, content_type):
+        self.stored.append(key)
+
+    def delete(self, key):
+        self.deleted.append(key)
+
+def _fake_transcriber(answers: dict[str, str], calls: list):
+    """n8n's transcriber contract: form fields video_url, language_code; JSON {text, srt} back."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+            url, lang = form["video_url"][0], form["language_code"][0]
+            calls.append((url, lang))
+            srt = answers[url.rsplit("/", 1)[1]]
+            body = json.dumps({"text": "", "srt": srt}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def test_transcribe_segmented_against_fake_transcriber(http_server, monkeypatch, tmp_path):
+    answers = {
+        "part0.opus": _srt((1.0, 3.0, "Hello there."), (57.0, 58.0, "Before the cut")),
+        "part1.opus": _srt((0.5, 1.5, "Before the cut"), (10.0, 12.0, "Middle part.")),
+        "part2.opus": _srt((5.0, 7.0, "The end.")),
+    }
+    calls = []
+    base = http_server(_fake_transcriber(answers, calls))
+    storage = _FakeStorage()
+    spans_seen = []
+
+    def split_audio(src, workdir, spans, fmt):
+        spans_seen.extend(spans)
+        paths = []
+        for i in range(len(spans)):
+            path = os.path.join(workdir, f"part{i}.{fmt}")
+            open(path, "wb").close()
+            paths.append(path)
+        return paths
+
+    async def inline(fn, *args):
+        return fn(*args)
+
+    monkeypatch.setattr(settings, "N8N_TRANSCRIBE_URL", f"{base}/transcribe")
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "TRANSCRIBE_SEGMENT_SECONDS", 60)
+    monkeypatch.setattr(settings, "TRANSCRIBE_SEGMENT_OVERLAP_SECONDS", 2.0)
+    monkeypatch.setattr(settings, "TRANSCRIBE_AUDIO_FORMAT", "opus")
+    monkeypatch.setattr(transcription, "run_in_pool", inline)
+    monkeypatch.setattr(transcription.ffmpeg, "detect_silences", lambda src, db, min_s: [(58.0, 59.0), (121.0, 122.0)])
+    monkeypatch.setattr(transcription.ffmpeg, "split_audio", split_audio)
+    monkeypatch.setattr(transcription, "media_source", lambda url: "/media/audio.opus")
+    monkeypatch.setattr(transcription, "get_storage", lambda: storage)
+    monkeypatch.setattr(transcription, "fetchable_url", lambda url: url)
+
+    async def run():
+        try:
+            v = SimpleNamespace(id=7, media_info={"duration_ms": 150_000})
+            return await transcription.transcribe_segmented(v, "http://api/uploads/audio.opus", "en")
+        finally:
+            await close_clients()
+
+    res = asyncio.run(run())
+
+    assert spans_seen == [(0.0, 60.5), (56.5, 123.5), (119.5, 150.0)]
+    assert sorted(url.rsplit("/", 1)[1] for url, _ in calls) == ["part0.opus", "part1.opus", "part2.opus"]
+    assert all(lang == "en" for _, lang in calls)
+    assert res["text"] == "Hello there. Before the cut Middle part. The end."
+    assert [c[:2] for c in transcription.captions.parse(res["srt"])] == [
+        (1000, 3000), (57000, 58000), (66500, 68500), (124500, 126500)
+    ]
+    # Chunks are unpublished and the scratch directory removed afterwards
+    assert sorted(storage.deleted) == sorted(storage.stored) and len(storage.stored) == 3
+    assert os.listdir(os.path.join(str(tmp_path), ".incoming")) == []
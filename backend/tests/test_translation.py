@@ -0,0 +1,37 @@
+import pytest
+
+from app.services.translation import BatchError, estimate_tokens, parse_batch, plan_batches
+
+def test_plan_batches_covers_all_cues_in_order_within_budget():
+    texts = [f"line number {i} " * (1 + i % 5) for i in range(60)]
+    budget = 60
+    batches = plan_batches(texts, budget)
+    assert batches[0][0] == 0 and batches[-1][1] == len(texts)
+    assert all(a[1] == b[0] for a, b in zip(batches, batches[1:]))
+    for a, b in batches:
+        cost = sum(estimate_tokens(t) for t in texts[a:b])
+        assert cost <= budget or b - a == 1
+
+def test_plan_batches_oversized_cue_gets_its_own_batch():
+    texts = ["short", "x" * 1000, "short"]
+    assert plan_batches(texts, 20) == [(0, 1), (1, 2), (2, 3)]
+
+def test_plan_batches_empty():
+    assert plan_batches([], 100) == []
+
+def test_parse_batch_in_key_order():
+    raw = 'Sure! ```json\n{"2": " deux ", "1": "un", "3": "trois\\nlignes"}\n```'
+    assert parse_batch(raw, 3) == ["un", "deux", "trois\nlignes"]
+
+@pytest.mark.parametrize("raw", [
+    "no json here",
+    '{"1": "un", "2": }',
+    '{"1": "un"}',
+    '{"1": "un", "2": "deux", "3": "trois", "4": "quatre"}',
+    '{"1": "un", "3": "trois", "4": "quatre"}',
+    '{"1": "un", "2": 2, "3": "trois"}',
+    '["un", "deux", "trois"]',
+])
+def test_parse_batch_rejects_wrong_answers(raw):
+    with pytest.raises(BatchError):
+        parse_batch(raw, 3)
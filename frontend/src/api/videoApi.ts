@@ -52,6 +52,37 @@ export function prettyError(err: unknown): string {
   return err instanceof Error ? err.message : String(err);
 }
 
+// ============================================
+// BACKGROUND JOBS
+// ============================================
+
+export interface Job<T = any> {
+  job_id: number;
+  kind: string;
+  video_id?: number;
+  status: "queued" | "running" | "waiting" | "done" | "failed";
+  attempts: number;
+  max_attempts: number;
+  result?: T;
+  error_message?: string;
+}
+
+export async function getJob<T = any>(jobId: number): Promise<Job<T>> {
+  const r = await api.get<Job<T>>(`/jobs/${jobId}`);
+  return r.data;
+}
+
+// Long-running endpoints answer 202 with a job_id; wait for the job and return its result.
+async function resolveJob<T>(data: any, intervalMs = 2000): Promise<T> {
+  if (!data || typeof data.job_id !== "number") return data as T;
+  for (;;) {
+    const job = await getJob<T>(data.job_id);
+    if (job.status === "done") return job.result as T;
+    if (job.status === "failed") throw new Error(job.error_message || "Job failed");
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
 // ============================================
 // VIDEO OPERATIONS
 // ============================================
@@ -102,19 +133,23 @@ export async function deleteVideo(videoId: number): Promise<void> {
 // CAPTIONS & AI
 // ============================================
 
-export async function requestCaptions(videoId: number, languageCode?: string): Promise<CaptionResponse> {
-  const r = await api.post<CaptionResponse>("/video/caption", {
+// force: skip the transcription cache and transcribe again
+export async function requestCaptions(videoId: number, languageCode?: string, force = false): Promise<CaptionResponse> {
+  const r = await api.post("/video/caption", {
     video_id: videoId,
-    language_code: languageCode || "en"
+    language_code: languageCode || "en",
+    force
   });
-  return r.data;
+  return resolveJob<CaptionResponse>(r.data);
 }
 
-export async function generateMetadata(videoId: number): Promise<MetadataResponse> {
-  const r = await api.post<MetadataResponse>("/ai/metadata/generate", {
-    video_id: videoId
+// regenerate: skip the cached answer for an unchanged transcript and ask the model again
+export async function generateMetadata(videoId: number, regenerate = false): Promise<MetadataResponse> {
+  const r = await api.post("/ai/metadata/generate", {
+    video_id: videoId,
+    regenerate
   });
-  return r.data;
+  return resolveJob<MetadataResponse>(r.data);
 }
 
 export async function checkConfidentiality(videoId: number): Promise<ConfidentialityResult> {
@@ -144,8 +179,8 @@ export async function exchangeYouTubeCode(code: string, state: string): Promise<
 }
 
 export async function publishToYouTube(payload: PublishRequest): Promise<PublishResponse> {
-  const r = await api.post<PublishResponse>("/youtube/publish", payload);
-  return r.data;
+  const r = await api.post("/youtube/publish", payload);
+  return resolveJob<PublishResponse>(r.data);
 }
 
 export async function disconnectYouTube(): Promise<void> {
@@ -163,8 +198,10 @@ export interface Language {
 
 export interface TranslationResult {
   ok: boolean;
-  translations: Record<string, { language: string; captions: string }>;
+  // Per target language: its name and how the translation ended
+  translations: Record<string, { language: string; status: "done" | "failed"; error?: string }>;
   languages_added: string[];
+  failed: string[];
   total_languages: number;
   model_used?: string;
 }
@@ -174,15 +211,18 @@ export async function getSupportedLanguages(): Promise<{ languages: Language[] }
   return r.data;
 }
 
+// retranslate: ignore the translation memory and replace its lines with the new answers
 export async function translateCaptions(
   videoId: number,
   targetLanguages: string[],
-  sourceLanguage: string = "en"
+  sourceLanguage: string = "en",
+  retranslate = false
 ): Promise<TranslationResult> {
-  const r = await api.post<TranslationResult>("/ai/captions/translate", {
+  const r = await api.post("/ai/captions/translate", {
     video_id: videoId,
     target_languages: targetLanguages,
-    source_language: sourceLanguage
+    source_language: sourceLanguage,
+    retranslate
   });
-  return r.data;
+  return resolveJob<TranslationResult>(r.data);
 }
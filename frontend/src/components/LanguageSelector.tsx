@@ -84,15 +84,21 @@ export default function LanguageSelector({
     setTranslating(true);
     try {
       const result = await translateCaptions(videoId, toTranslate, "en");
-      toast.push({
-        type: "success",
-        message: `Translated to ${result.languages_added.length} languages!`
-      });
+      if (result.languages_added.length > 0) {
+        toast.push({
+          type: "success",
+          message: `Translated to ${result.languages_added.length} languages!`
+        });
+      }
+      if (result.failed.length > 0) {
+        const names = result.failed.map((code) => result.translations[code]?.language || code);
+        toast.push({ type: "error", message: `Translation failed for ${names.join(", ")}` });
+      }
       onTranslationComplete?.();
     } catch (e: any) {
       toast.push({
         type: "error",
-        message: e.response?.data?.detail || "Translation failed"
+        message: e.response?.data?.detail || e.message || "Translation failed"
       });
     } finally {
       setTranslating(false);
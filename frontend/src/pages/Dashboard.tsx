@@ -103,7 +103,7 @@ export default function Dashboard() {
             {/* Video Preview */}
             <div className="relative aspect-video bg-slate-900 rounded-lg overflow-hidden mb-3">
               <video
-                src={video.storage_path}
+                src={video.playback_url || video.storage_path}
                 className="w-full h-full object-contain"
                 preload="metadata"
               />
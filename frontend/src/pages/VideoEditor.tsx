@@ -159,15 +159,19 @@ export default function VideoEditor() {
     }
   };
 
-  const handleGenerateMetadata = async () => {
-    setBusy("metadata");
+  // regenerate: ask the model again instead of reusing the answer saved for this transcript
+  const handleGenerateMetadata = async (regenerate = false) => {
+    setBusy(regenerate ? "metadata-regenerate" : "metadata");
     try {
-      const result = await generateMetadata(videoId);
+      const result = await generateMetadata(videoId, regenerate);
       if (result.title) setTitle(result.title);
       if (result.description) setDescription(result.description);
       if (result.tags) setTags(result.tags);
       if (result.hashtags) setHashtags(result.hashtags);
-      toast.push({ type: "success", message: "Metadata generated!" });
+      toast.push({
+        type: "success",
+        message: result.cached ? "Metadata restored from the last generation" : "Metadata generated!"
+      });
       refresh();
     } catch (e) {
       toast.push({ type: "error", message: prettyError(e) });
@@ -274,7 +278,7 @@ export default function VideoEditor() {
           {/* Video Preview */}
           <Card>
             <div className="aspect-video bg-slate-900 rounded-lg overflow-hidden mb-3">
-              <video src={video.storage_path} controls className="w-full h-full" />
+              <video src={video.playback_url || video.storage_path} controls className="w-full h-full" />
             </div>
             <div className="flex flex-wrap gap-2">
               <StatusPill status={video.status} />
@@ -301,7 +305,7 @@ export default function VideoEditor() {
             
             <Button
               variant="secondary"
-              onClick={handleGenerateMetadata}
+              onClick={() => handleGenerateMetadata()}
               busy={busy === "metadata"}
               disabled={isProcessing || !captions}
               className="w-full"
@@ -309,6 +313,19 @@ export default function VideoEditor() {
               <Wand2 className="w-4 h-4" />
               Generate Metadata
             </Button>
+
+            {video.ai_summary && (
+              <Button
+                variant="secondary"
+                onClick={() => handleGenerateMetadata(true)}
+                busy={busy === "metadata-regenerate"}
+                disabled={isProcessing || !captions}
+                className="w-full"
+              >
+                <RefreshCw className="w-4 h-4" />
+                Regenerate Metadata
+              </Button>
+            )}
             
             <Button
               variant="secondary"
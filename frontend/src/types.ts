@@ -16,6 +16,8 @@ export interface Video {
   user_id: string;
   original_filename: string;
   storage_path: string;
+  playback_url?: string;
+  renditions?: Record<string, { url: string; width?: number; height: number; size?: number; bit_rate?: number }>;
   file_size?: number;
   mime_type?: string;
   duration_ms?: number;
@@ -69,6 +71,8 @@ export interface ConfidentialityResult {
 export interface CaptionResponse {
   captions_format: "srt" | "text";
   captions: string;
+  cached?: boolean;
+  reused_from_video_id?: number;
 }
 
 export interface MetadataResponse {
@@ -79,6 +83,7 @@ export interface MetadataResponse {
   hashtags?: string;
   thumbnail_prompt?: string;
   model_used?: string;
+  cached?: boolean;
 }
 
 export interface PublishRequest {